@@ -1,17 +1,28 @@
 import os
-import shutil
 import uuid
 import asyncio
-import re
+import json
 import time
+from dataclasses import dataclass, field
 from typing import List, Optional, Literal
 
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from factory.rag_factory import RAGPipeline
+from services.citations import clean_response, CitationStripper
+from services.conversations import conversation_store
+from services.coordination import worker_role
+from services.llm_gateway import llm_gateway, LLMOverloaded, LLMTimeout
+from services.singleflight import coalescer, flight_key
+from services.executor import thread_pool, pool_stats
+from services.jobs import IngestJobManager, JobQueueFull
+from services.loader import SUPPORTED_EXTENSIONS
 from services.logger import log
-import re
+from services.uploads import (UPLOAD_MAX_FILE_BYTES, UPLOAD_MAX_REQUEST_BYTES, StoredUpload, UploadTooLarge,
+                              store_upload)
+from services.vector_store import DEFAULT_NAMESPACE, list_namespaces, loaded_namespaces, validate_namespace
 
 router = APIRouter()
 
@@ -21,8 +32,14 @@ TEMP_DIR = os.path.join(BASE_DIR, "temp")
 os.makedirs(TEMP_DIR, exist_ok=True)
 
 # Constants and globals
-PIPELINE_TTL = 1800  # seconds = 30 minutes
-DEFAULT_INGEST_PATHS = [os.path.join(TEMP_DIR, f) for f in os.listdir(TEMP_DIR) if f.endswith(".pdf")]
+REFRESH_INTERVAL = 3600  # seconds between incremental re-ingests of TEMP_DIR
+
+
+def list_default_ingest_paths() -> List[str]:
+    return sorted(
+        os.path.join(TEMP_DIR, f) for f in os.listdir(TEMP_DIR)
+        if f.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
 
 # Global pipeline instance
 global_pipeline = None  # Shared pipeline for all conversations
@@ -36,93 +53,203 @@ class Message(BaseModel):
 
 class ChatRequest(BaseModel):
     conversation_id: Optional[str] = None
-    messages: List[Message]
+    namespace: Optional[str] = None  # document namespace to search; DEFAULT_NAMESPACE when omitted
+    messages: List[Message]  # only the new messages; earlier turns are kept server-side per conversation_id
 
 class ChatResponse(BaseModel):
     response: str
     source_docs: Optional[List[dict]] = None
+    conversation_id: Optional[str] = None
 
 class IngestPathsRequest(BaseModel):
     file_paths: List[str]
 
 
-def clean_response(text: str) -> str:
-    # Remove all references that look like [anypath.pdf:start-end]
-    cleaned = re.sub(r"\[.*?\.pdf:\d+-\d+\]", "", text)
-    # Optionally remove any empty brackets or remaining square bracketed paths
-    cleaned = re.sub(r"\[.*?\.pdf.*?\]", "", cleaned)
-    return cleaned.strip()
+def run_ingestion(file_paths: List[str], progress=None, namespace: str = DEFAULT_NAMESPACE):
+    RAGPipeline(file_paths, namespace).ingest(progress=progress)
+
+
+# Background ingestion jobs; /ingest only enqueues
+ingest_jobs = IngestJobManager(run_ingestion)
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def resolve_namespace(namespace: Optional[str]) -> str:
+    try:
+        return validate_namespace(namespace or DEFAULT_NAMESPACE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def upload_dir(namespace: str) -> str:
+    """TEMP_DIR for the default namespace (its files are re-ingested on refresh), a subdirectory otherwise."""
+    if namespace == DEFAULT_NAMESPACE:
+        return TEMP_DIR
+    path = os.path.join(TEMP_DIR, "namespaces", namespace)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def llm_http_error(e: Exception) -> HTTPException:
+    """503 (retry later) when the LLM gateway sheds load, 504 when a generation missed its deadline."""
+    if isinstance(e, LLMOverloaded):
+        return HTTPException(status_code=503, detail=f"LLM busy: {e}", headers={"Retry-After": "1"})
+    return HTTPException(status_code=504, detail=str(e))
 async def initialize_global_pipeline():
     """Initialize the global pipeline at application startup or when needed"""
     global global_pipeline, last_init_time
-    
-    if global_pipeline is None or time.time() - last_init_time > 3600:  # Re-init every hour
-        if not DEFAULT_INGEST_PATHS:
+
+    if not worker_role.elect():
+        # Another worker process is the leader and keeps TEMP_DIR ingested into
+        # the shared store; this one only answers from it
+        if global_pipeline is None:
+            global_pipeline = RAGPipeline(await thread_pool.run(list_default_ingest_paths))
+        return
+    if global_pipeline is not None and time.time() - last_init_time <= REFRESH_INTERVAL:
+        return
+    if global_pipeline is not None and pipeline_lock.locked():
+        # A refresh is already running; keep serving the current collection meanwhile
+        return
+
+    async with pipeline_lock:
+        if global_pipeline is not None and time.time() - last_init_time <= REFRESH_INTERVAL:
+            return
+        paths = await thread_pool.run(list_default_ingest_paths)
+        if not paths:
             log.warning("No default documents found for ingestion")
             return
         
         try:
             log.info("Initializing global pipeline...")
-            pipeline = RAGPipeline(DEFAULT_INGEST_PATHS)
-            pipeline.ingest()  # Synchronous ingestion
+            pipeline = global_pipeline or RAGPipeline(paths)
+            pipeline.file_paths = paths
+            # Incremental: only new/changed files are embedded, deleted files are pruned
+            await thread_pool.run(pipeline.ingest, prune=True)
             log.info("Global pipeline initialized and ingested successfully")
             global_pipeline = pipeline
             last_init_time = time.time()
         except Exception as e:
             log.error(f"Failed to initialize global pipeline: {str(e)}")
+            if global_pipeline is not None:
+                # A failed refresh keeps serving the previously ingested collection
+                return
             raise RuntimeError(f"Global pipeline initialization failed: {str(e)}")
 
-async def save_upload_files(files: List[UploadFile]) -> List[str]:
-    saved_paths = []
+async def get_pipeline(namespace: str) -> RAGPipeline:
+    """The pipeline answering from namespace; the default one is (re)ingested from TEMP_DIR as needed."""
+    if namespace != DEFAULT_NAMESPACE:
+        if namespace not in await thread_pool.run(list_namespaces):
+            raise HTTPException(status_code=404, detail=f"Unknown namespace {namespace}")
+        return RAGPipeline([], namespace)
+    await initialize_global_pipeline()
+    if global_pipeline is None:
+        log.error("Global pipeline not available after initialization")
+        raise HTTPException(500, detail="Global pipeline not initialized")
+    return global_pipeline
+
+async def save_upload_files(files: List[UploadFile], namespace: str = DEFAULT_NAMESPACE) -> List[StoredUpload]:
+    """Stream the uploads to disk; identical content resolves to the file already stored (413 past the limits)."""
+    directory = upload_dir(namespace)
+    stored = []
+    remaining = UPLOAD_MAX_REQUEST_BYTES
     for file in files:
-        filename = file.filename
-        dest_path = os.path.join(TEMP_DIR, filename)
-        if os.path.exists(dest_path):
-            name, ext = os.path.splitext(filename)
-            filename = f"{name}_{uuid.uuid4().hex}{ext}"
-            dest_path = os.path.join(TEMP_DIR, filename)
-        with open(dest_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        file.file.close()
-        if not os.path.exists(dest_path):
-            log.error(f"Failed to save file: {dest_path}")
-            raise HTTPException(status_code=500, detail=f"Failed to save file {filename}")
-        log.info(f"Saved uploaded file to: {dest_path}")
-        saved_paths.append(dest_path)
-    return saved_paths
-
-# Initialize global pipeline at startup
-if DEFAULT_INGEST_PATHS:
-    asyncio.create_task(initialize_global_pipeline())
+        try:
+            upload = await store_upload(file, directory, min(UPLOAD_MAX_FILE_BYTES, remaining))
+        except UploadTooLarge as e:
+            limit = "per-file" if remaining >= UPLOAD_MAX_FILE_BYTES else "per-request"
+            log.warning("Upload rejected", filename=file.filename, limit=limit, error=str(e))
+            raise HTTPException(status_code=413, detail=f"Upload exceeds the {limit} size limit: {e}")
+        remaining -= upload.size
+        stored.append(upload)
+    return stored
+
+@dataclass
+class Turn:
+    question: Optional[str]  # None when the conversation holds no user message
+    retrieval_query: Optional[str] = None
+    history: List[dict] = field(default_factory=list)
+    flight_key: Optional[str] = None
+
+def open_turn(conversation_id: str, messages, namespace: str) -> Turn:
+    """Append messages to the stored conversation and prepare the query for its latest question.
+
+    Blocking (conversation files, the cross-process lock, token counting): run it on the thread pool.
+    """
+    conversation = conversation_store.add_messages(conversation_id, messages)
+    question = conversation.latest_question()
+    if question is None:
+        return Turn(None)
+    retrieval_query = conversation.retrieval_query()
+    history = conversation.history()
+    return Turn(question, retrieval_query, history, flight_key(question, retrieval_query, history, namespace))
+
+async def forget_turn(conversation_id: str, messages):
+    """Take back messages no answer came of; shielded, so it completes even when the request was cancelled."""
+    if messages:
+        await asyncio.shield(thread_pool.run(conversation_store.rollback, conversation_id, messages))
+
+def unique_paths(uploads: List[StoredUpload]) -> List[str]:
+    return list(dict.fromkeys(u.path for u in uploads))
 
 # Endpoints
+@router.get("/pools")
+async def pools():
+    """Concurrency limits and current running/waiting counts of the worker pools and the LLM gateway."""
+    return {**pool_stats(), "llm": llm_gateway.stats(), "coalescing": coalescer.stats(),
+            "worker": worker_role.to_dict()}
+
+@router.get("/namespaces")
+async def namespaces():
+    """Namespaces with documents on disk, and those whose indexes are currently loaded in memory."""
+    return {"default": DEFAULT_NAMESPACE, "namespaces": await thread_pool.run(list_namespaces),
+            "loaded": loaded_namespaces()}
+
 @router.post("/upload")
-async def upload(files: List[UploadFile] = File(...)):
-    saved_paths = await save_upload_files(files)
+async def upload(files: List[UploadFile] = File(...), namespace: Optional[str] = Form(None)):
+    uploads = await save_upload_files(files, resolve_namespace(namespace))
+    saved_paths = unique_paths(uploads)
     log.info("Files uploaded", files=saved_paths)
-    return {"saved_files": saved_paths}
+    return {"saved_files": saved_paths, "duplicates": [u.path for u in uploads if u.duplicate]}
 
-@router.post("/ingest")
-async def ingest_uploaded(files: List[UploadFile] = File(...)):
-    """Create a custom pipeline for specific documents"""
+@router.post("/ingest", status_code=202)
+async def ingest_uploaded(files: List[UploadFile] = File(...), namespace: Optional[str] = Form(None)):
+    """Save the uploads and queue a background ingestion job for them into namespace"""
+    namespace = resolve_namespace(namespace)
+    uploads = await save_upload_files(files, namespace)
+    # Re-uploaded content maps to the stored file, which the manifest then skips
+    saved_paths = unique_paths(uploads)
+    if not saved_paths:
+        raise HTTPException(400, detail="No files uploaded for ingestion.")
     try:
-        saved_paths = await save_upload_files(files)
-        if not saved_paths:
-            raise HTTPException(400, detail="No files uploaded for ingestion.")
-        
-        # Create a temporary pipeline just for ingestion
-        pipeline = RAGPipeline(saved_paths)
-        pipeline.ingest()  # Synchronous ingestion
-            
-        log.info("Ingestion completed successfully", files=saved_paths)
-        return {
-            "status": "ingested",
-            "files": saved_paths
-        }
+        job = ingest_jobs.submit(saved_paths, namespace)
+    except JobQueueFull as e:
+        log.warning("Ingestion queue full", error=str(e))
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "status": job.status,
+        "job_id": job.job_id,
+        "namespace": namespace,
+        "files": saved_paths,
+        "duplicates": [u.path for u in uploads if u.duplicate],
+    }
 
-    except Exception as e:
-        log.error("Ingestion error", error=str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+@router.get("/ingest/jobs")
+async def list_ingest_jobs():
+    return {"queued": ingest_jobs.queue_depth(), "jobs": ingest_jobs.list()}
+
+@router.get("/ingest/jobs/{job_id}")
+async def ingest_job_status(job_id: str):
+    job = ingest_jobs.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job {job_id}")
+    return job
+
+@router.delete("/ingest/jobs/{job_id}")
+async def cancel_ingest_job(job_id: str):
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job {job_id}")
+    return job
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
@@ -133,43 +260,137 @@ async def chat(request: ChatRequest):
         log.warning(f"No messages provided in chat request for conversation_id={conversation_id}")
         raise HTTPException(status_code=400, detail="No messages provided in the chat request.")
 
+    namespace = resolve_namespace(request.namespace)
+    added = []  # messages appended to the conversation, taken back if no answer comes of them
+    completed = False
     try:
-        # Ensure global pipeline is ready
-        if global_pipeline is None:
-            await initialize_global_pipeline()
-            
-            if global_pipeline is None:
-                log.error("Global pipeline not available after initialization")
-                raise HTTPException(500, detail="Global pipeline not initialized")
-
-        # Build full conversation prompt
-        full_prompt = ""
-        for msg in request.messages:
-            role = "assistant" if msg.role == "bot" else msg.role
-            full_prompt += f"{role.capitalize()}: {msg.content}\n"
-        log.debug(f"Constructed full prompt for conversation_id={conversation_id}: {full_prompt}")
+        # The default namespace's pipeline is refreshed incrementally once per interval
+        pipeline = await get_pipeline(namespace)
+
+        # Append the new messages to the server-side history; retrieval only sees the latest turn.
+        # Set first: a disconnect while the turn is being stored still takes it back
+        added = request.messages
+        turn = await thread_pool.run(open_turn, conversation_id, request.messages, namespace)
+        question, retrieval_query, history = turn.question, turn.retrieval_query, turn.history
+        if question is None:
+            raise HTTPException(status_code=400, detail="No user message in the conversation.")
+        log.debug(f"Retrieval query for conversation_id={conversation_id}: {retrieval_query}")
 
         # Query the global pipeline
-        log.info(f"Querying pipeline for conversation_id={conversation_id}")
-        answer_obj, docs = global_pipeline.query(full_prompt)
+        log.info(f"Querying pipeline for conversation_id={conversation_id}", history_messages=len(history))
+        # Identical questions already being answered share that generation
+        flight = coalescer.join(
+            turn.flight_key,
+            lambda: pipeline.astream(question, history=history, retrieval_query=retrieval_query),
+        )
+        try:
+            docs = await flight.docs()
+            answer_text = "".join([token async for token in flight.stream()])
+        finally:
+            coalescer.leave(flight)
         log.info(f"Received response from pipeline for conversation_id={conversation_id}")
 
-        if hasattr(answer_obj, "message") and hasattr(answer_obj.message, "content"):
-            answer_text = answer_obj.message.content
-        elif isinstance(answer_obj, str):
-            answer_text = answer_obj
-        else:
-            log.error(f"Unexpected answer object structure for conversation_id={conversation_id}")
-            raise ValueError("Unexpected answer object structure")
-
         clean_text = clean_response(answer_text)
+        await thread_pool.run(conversation_store.add_messages, conversation_id,
+                              [{"role": "bot", "content": clean_text}])
+        completed = True
         log.info(f"Returning cleaned response for conversation_id={conversation_id}")
 
-        return ChatResponse(response=clean_text, source_docs=docs)
+        return ChatResponse(response=clean_text, source_docs=docs, conversation_id=conversation_id)
 
     except HTTPException:
         log.warning(f"HTTPException raised in chat for conversation_id={conversation_id}")
         raise
+    except (LLMOverloaded, LLMTimeout) as e:
+        log.warning(f"LLM unavailable for conversation_id={conversation_id}: {e}")
+        raise llm_http_error(e)
     except Exception as e:
         log.error(f"Chat error (conversation_id={conversation_id}): {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not completed:
+            # Failed, or the client went away (a CancelledError, which the handlers above
+            # don't see): no answer is kept, so neither is the question
+            await forget_turn(conversation_id, added)
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Server-Sent Events: one `sources` event, then `token` events as the LLM generates, then `done`."""
+    conversation_id = request.conversation_id or str(uuid.uuid4())
+    log.info(f"Received streaming chat request for conversation_id={conversation_id}")
+
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="No messages provided in the chat request.")
+
+    namespace = resolve_namespace(request.namespace)
+    added = []  # messages appended to the conversation, taken back if no answer comes of them
+    flight = None
+    streaming = False  # from here on events() owns the flight and the rollback
+    try:
+        pipeline = await get_pipeline(namespace)
+
+        # Set first: a disconnect while the turn is being stored still takes it back
+        added = request.messages
+        turn = await thread_pool.run(open_turn, conversation_id, request.messages, namespace)
+        question, retrieval_query, history = turn.question, turn.retrieval_query, turn.history
+        if question is None:
+            raise HTTPException(status_code=400, detail="No user message in the conversation.")
+        # Identical questions already being answered share that generation; a late
+        # subscriber gets the tokens produced so far, then follows live
+        flight = coalescer.join(
+            turn.flight_key,
+            lambda: pipeline.astream(question, history=history, retrieval_query=retrieval_query),
+        )
+        docs = await flight.docs()
+        streaming = True
+    except HTTPException:
+        log.warning(f"HTTPException raised in chat stream for conversation_id={conversation_id}")
+        raise
+    except (LLMOverloaded, LLMTimeout) as e:
+        log.warning(f"LLM unavailable for conversation_id={conversation_id}: {e}")
+        raise llm_http_error(e)
+    except Exception as e:
+        log.error(f"Chat stream error (conversation_id={conversation_id}): {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not streaming:
+            if flight is not None:
+                coalescer.leave(flight)
+            await forget_turn(conversation_id, added)
+
+    async def events():
+        stripper = CitationStripper()
+        reply = []
+        completed = False
+        try:
+            yield sse_event("sources", {"conversation_id": conversation_id, "source_docs": docs})
+            async for token in flight.stream():
+                text = stripper.feed(token)
+                if text:
+                    reply.append(text)
+                    yield sse_event("token", {"text": text})
+            text = stripper.flush()
+            if text:
+                reply.append(text)
+                yield sse_event("token", {"text": text})
+            await thread_pool.run(conversation_store.add_messages, conversation_id,
+                                  [{"role": "bot", "content": "".join(reply)}])
+            completed = True
+            yield sse_event("done", {"conversation_id": conversation_id})
+            log.info(f"Finished streaming response for conversation_id={conversation_id}")
+        except Exception as e:
+            log.error(f"Chat stream error (conversation_id={conversation_id}): {e}")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            coalescer.leave(flight)  # the last subscriber leaving early cancels the generation
+            if not completed:
+                # Failed, or the client went away mid-stream: the partial reply is
+                # not kept, so neither is the question it answered
+                log.info(f"Streamed response not completed for conversation_id={conversation_id}")
+                await forget_turn(conversation_id, added)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
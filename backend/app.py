@@ -1,14 +1,79 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()  # before the imports below, to report their cost at startup
+
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 import structlog
 from services.logger import configure_logging
-from api.routes import router 
+from services.models import warm_up
+from services.chunker import get_encoder
+from services.vector_store import get_store
+from services.lexical_index import get_lexical_index
+from services.executor import pool_stats, shutdown_pools
+from services.llm import query_batcher
+from services.llm_gateway import llm_gateway
+from services.metrics import IN_PROGRESS, QUEUE_DEPTH, render_metrics
+from services.singleflight import coalescer
+from services.coordination import VERSION_POLL_INTERVAL, coordinate, worker_role
+from services.startup import STARTUP_WARM_UP, cancel_task, startup_state
+from services.uploads import UploadLimitMiddleware
+from api.routes import router, ingest_jobs, initialize_global_pipeline, list_default_ingest_paths
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 # Configure structured logging
 configure_logging()
 log = structlog.get_logger()
 
-app = FastAPI(title="RAG Chatbot")
+# Loaded in this order in the background once the server is up
+WARM_UP_STEPS = [
+    ("embedding_model", warm_up),
+    ("tokenizer", get_encoder),
+    ("vector_store", lambda: get_store().count()),
+    ("lexical_index", get_lexical_index),
+]
+
+
+async def ingest_default_documents():
+    """(Incrementally) ingest the documents already in the temp directory; only the leader worker does."""
+    if list_default_ingest_paths():
+        try:
+            await initialize_global_pipeline()
+        except Exception:
+            pass  # logged there; the first chat request retries
+
+
+async def background_startup():
+    if STARTUP_WARM_UP:
+        await startup_state.warm_up(WARM_UP_STEPS)
+    else:
+        startup_state.mark_ready()
+    if startup_state.ready:
+        await ingest_default_documents()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_state.record("import", IMPORT_SECONDS)
+    startup_task = asyncio.create_task(background_startup())
+    # Leader takeover and index reloads when other worker processes write
+    coordinator_task = asyncio.create_task(coordinate(ingest_default_documents)) if VERSION_POLL_INTERVAL > 0 else None
+    log.info("Application startup complete", import_seconds=startup_state.timings["import"],
+             warm_up=STARTUP_WARM_UP)
+    yield
+    await cancel_task(coordinator_task)
+    await cancel_task(startup_task)
+    await ingest_jobs.shutdown()
+    await llm_gateway.aclose()
+    shutdown_pools()
+    worker_role.resign()
+    log.info("Application shutdown")
+
+
+app = FastAPI(title="RAG Chatbot", lifespan=lifespan)
 
 # CORS (tighten in production)
 app.add_middleware(
@@ -21,11 +86,31 @@ app.add_middleware(
 
 # Include API routes
 app.include_router(router, prefix="/api")
+# Oversized upload requests are cut off with 413 while their body is received
+app.add_middleware(UploadLimitMiddleware, paths=("/api/upload", "/api/ingest"))
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus text exposition; gauges are sampled now, histograms and counters accumulate."""
+    for name, stats in pool_stats().items():
+        QUEUE_DEPTH.set(stats["waiting"], queue=f"{name}_pool")
+        IN_PROGRESS.set(stats["running"], pool=f"{name}_pool")
+    llm = llm_gateway.stats()
+    QUEUE_DEPTH.set(llm["waiting"], queue="llm")
+    IN_PROGRESS.set(llm["inflight"], pool="llm")
+    QUEUE_DEPTH.set(ingest_jobs.queue_depth(), queue="ingest_jobs")
+    QUEUE_DEPTH.set(query_batcher.pending(), queue="query_embed")
+    IN_PROGRESS.set(coalescer.stats()["in_flight"], pool="coalesced_flights")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-@app.on_event("startup")
-def on_startup():
-    log.info("Application startup complete")
+@app.get("/livez", include_in_schema=False)
+def livez():
+    """The process is up and serving HTTP; says nothing about dependencies."""
+    return {"status": "alive"}
 
-@app.on_event("shutdown")
-def on_shutdown():
-    log.info("Application shutdown")
\ No newline at end of file
+@app.get("/readyz", include_in_schema=False)
+def readyz():
+    """200 once warm-up has run ("degraded" if a step failed), 503 (with the phase and timings) before that."""
+    if not startup_state.ready:
+        raise HTTPException(status_code=503, detail=startup_state.to_dict())
+    return startup_state.to_dict()
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""Compare two benchmarks.rag_benchmark result files.
+
+Prints every timing and throughput figure present in both runs with its
+relative change, marking changes beyond --threshold percent as better or
+worse. Run from backend/:
+
+    python -m benchmarks.compare base.json new.json --threshold 10 --fail-on-regression
+
+With --fail-on-regression the exit status is 1 if anything got worse, so the
+comparison can gate CI. Runs are only comparable on the same machine with the
+same benchmark arguments; differing arguments are reported first.
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Optional
+
+# Leaves compared, by how their path ends; everything else (counts, sizes) is context
+HIGHER_IS_BETTER = ("_per_s",)
+LOWER_IS_BETTER_KEYS = ("mean", "p50", "p95", "p99")
+LOWER_IS_BETTER = ("seconds",)
+
+
+def flatten(results: dict) -> Dict[str, float]:
+    """{"ingest.pages_per_s": ..., "query.c4.latency_ms.p95": ..., ...} for the comparable figures."""
+    flat = {}
+
+    def walk(prefix: str, value):
+        if isinstance(value, dict):
+            for key, child in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, child)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and direction(prefix) is not None:
+            flat[prefix] = float(value)
+
+    walk("model_load_seconds", results.get("model_load_seconds"))
+    walk("ingest", results.get("ingest", {}))
+    for level in results.get("query", []):
+        walk(f"query.c{level['concurrency']}", level)
+    return flat
+
+
+def direction(path: str) -> Optional[int]:
+    """+1 if a larger value is better, -1 if smaller is better, None if not compared."""
+    leaf = path.rsplit(".", 1)[-1]
+    if leaf.endswith(HIGHER_IS_BETTER):
+        return 1
+    if leaf in LOWER_IS_BETTER_KEYS or leaf.endswith(LOWER_IS_BETTER):
+        return -1
+    return None
+
+
+def compare(base: dict, new: dict, threshold: float):
+    """[(metric, base value, new value, percent change, verdict)] for metrics in both runs."""
+    base_flat, new_flat = flatten(base), flatten(new)
+    rows = []
+    for metric in sorted(base_flat.keys() & new_flat.keys()):
+        old, current = base_flat[metric], new_flat[metric]
+        change = (current - old) / old * 100 if old else 0.0
+        verdict = ""
+        if abs(change) >= threshold:
+            verdict = "better" if change * direction(metric) > 0 else "WORSE"
+        rows.append((metric, old, current, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change worth flagging")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--only-changed", action="store_true", help="list only flagged metrics")
+    args = parser.parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    base_args, new_args = base.get("meta", {}).get("args", {}), new.get("meta", {}).get("args", {})
+    for key in sorted(base_args.keys() | new_args.keys()):
+        if key not in ("output", "workdir") and base_args.get(key) != new_args.get(key):
+            print(f"note: {key} differs: {base_args.get(key)!r} -> {new_args.get(key)!r}")
+    print(f"base {base.get('meta', {}).get('commit', '?')}  vs  new {new.get('meta', {}).get('commit', '?')}")
+
+    rows = compare(base, new, args.threshold)
+    width = max((len(r[0]) for r in rows), default=10)
+    print(f"{'metric':{width}} {'base':>12} {'new':>12} {'change':>9}")
+    for metric, old, current, change, verdict in rows:
+        if args.only_changed and not verdict:
+            continue
+        print(f"{metric:{width}} {old:>12.3f} {current:>12.3f} {change:>+8.1f}% {verdict}")
+    regressions = [r for r in rows if r[4] == "WORSE"]
+    print(f"{len(regressions)} regressions, {sum(r[4] == 'better' for r in rows)} improvements "
+          f"(threshold {args.threshold}%)")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Synthetic PDF/DOCX/TXT corpus for the ingestion and query benchmarks.
+
+Pages are filler text from a fixed vocabulary with planted facts ("Part
+QX-1042 is rated for 37 bar ...") that the generated questions ask about,
+so retrieval has something real to find. Output is fully determined by the
+seed. PDFs are written directly (one Helvetica text stream per page), so
+nothing beyond python-docx is needed. Run from backend/:
+
+    python -m benchmarks.corpus --out /tmp/corpus --docs 30 --pages 20
+"""
+import argparse
+import json
+import os
+import random
+import textwrap
+from typing import Dict, List
+
+from docx import Document
+
+FORMATS = ("pdf", "docx", "txt")
+VOCABULARY = (
+    "pump valve pressure seal housing flow rate maintenance inspection bearing torque motor sensor "
+    "calibration cycle filter gasket outlet inlet tolerance assembly schedule operator manual warranty "
+    "temperature vibration alignment shaft coupling impeller lubrication replacement interval procedure "
+    "safety shutdown startup clearance nominal rated capacity threshold alarm fault reset controller"
+).split()
+LINE_WIDTH = 90
+LINES_PER_PDF_PAGE = 60
+
+
+def _fact(rng: random.Random, index: int) -> Dict[str, str]:
+    part = f"QX-{1000 + index}"
+    rating = rng.randint(10, 99)
+    interval = rng.choice(("weekly", "monthly", "quarterly", "yearly"))
+    return {
+        "part": part,
+        "text": f"Part {part} is rated for {rating} bar and must be inspected {interval}.",
+        "question": f"What pressure is part {part} rated for?",
+        "answer": f"{rating} bar",
+    }
+
+
+def _page_text(rng: random.Random, words: int, facts: List[Dict[str, str]]) -> str:
+    body = [rng.choice(VOCABULARY) for _ in range(words)]
+    sentences = []
+    for start in range(0, len(body), 12):
+        sentence = " ".join(body[start:start + 12])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+    for fact in facts:
+        sentences.insert(rng.randrange(len(sentences) + 1), fact["text"])
+    return "\n".join(textwrap.wrap(" ".join(sentences), LINE_WIDTH))
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, pages: List[str]):
+    """A minimal PDF 1.4 file with one page per text (split further if a page overflows)."""
+    page_lines = []
+    for text in pages:
+        lines = text.splitlines() or [""]
+        for start in range(0, len(lines), LINES_PER_PDF_PAGE):
+            page_lines.append(lines[start:start + LINES_PER_PDF_PAGE])
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>",
+               3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for i, lines in enumerate(page_lines):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td\n" + "".join(f"({_pdf_escape(l)}) Tj T*\n" for l in lines) + "ET"
+        stream = stream.encode("latin-1", "replace")
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offsets[n] for n in sorted(objects))
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(path: str, pages: List[str]):
+    document = Document()
+    for i, text in enumerate(pages):
+        if i:
+            document.add_page_break()
+        for line in text.splitlines():
+            document.add_paragraph(line)
+    document.save(path)
+
+
+def write_txt(path: str, pages: List[str]):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(pages))
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def generate_corpus(out_dir: str, docs: int = 20, pages: int = 10, words_per_page: int = 300,
+                    formats=FORMATS, facts_per_doc: int = 3, seed: int = 0) -> dict:
+    """Write docs files (formats taken round-robin) and return a description including the questions."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    files, facts = [], []
+    for d in range(docs):
+        fmt = formats[d % len(formats)]
+        doc_facts = [_fact(rng, len(facts) + i) for i in range(facts_per_doc)]
+        placement = [rng.randrange(pages) for _ in doc_facts]
+        texts = [_page_text(rng, words_per_page, [f for f, p in zip(doc_facts, placement) if p == page])
+                 for page in range(pages)]
+        path = os.path.join(out_dir, f"doc-{d:04d}.{fmt}")
+        WRITERS[fmt](path, texts)
+        files.append(path)
+        facts.extend({**f, "path": path} for f in doc_facts)
+    return {
+        "files": files,
+        "docs": docs,
+        "pages_per_doc": pages,
+        "words_per_page": words_per_page,
+        "formats": list(formats),
+        "bytes": sum(os.path.getsize(p) for p in files),
+        "facts": facts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="directory to write the files to")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    corpus = generate_corpus(args.out, args.docs, args.pages, args.words_per_page,
+                             tuple(args.formats.split(",")), seed=args.seed)
+    with open(os.path.join(args.out, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(corpus, f, indent=2)
+    print(f"Wrote {len(corpus['files'])} files ({corpus['bytes'] / 1e6:.1f} MB) and "
+          f"{len(corpus['facts'])} questions to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
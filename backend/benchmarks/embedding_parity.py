@@ -0,0 +1,192 @@
+"""Agreement and speed of the int8 CPU embedding backend against the float model.
+
+Encodes the same synthetic passages (a chunk-like spread of lengths, built
+from the benchmarks.corpus vocabulary) three ways:
+
+    float     SentenceTransformer.encode as shipped, in batches of --batch-size
+    bucketed  the float model through CPUEncoder's length buckets
+    int8      the dynamically quantized model through CPUEncoder (EMBED_BACKEND=int8)
+
+and reports the cosine similarity of each int8 vector to its float one, how
+much the top-k neighbours of each passage agree, the padding efficiency
+(real / padded tokens) of both batching schemes and the speedups. The
+embedding model must be cached locally. Run from backend/:
+
+    python -m benchmarks.embedding_parity --texts 512 --threads 4 --output parity.json
+
+The exit status is 1 if the mean cosine falls below --min-cosine.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.corpus import VOCABULARY
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_passages(count: int, seed: int = 0) -> List[str]:
+    """Passages of roughly 10 to 400 words, most of them short, as chunking produces."""
+    rng = random.Random(seed)
+    passages = []
+    for _ in range(count):
+        words = max(10, min(400, int(rng.lognormvariate(4.3, 0.8))))
+        sentences = []
+        for start in range(0, words, 12):
+            sentence = " ".join(rng.choice(VOCABULARY) for _ in range(min(12, words - start)))
+            sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        passages.append(" ".join(sentences))
+    return passages
+
+
+def best_time(encode: Callable, texts: List[str], repeat: int):
+    """(fastest seconds over repeat runs, vectors of the last run)"""
+    encode(texts[:8])  # first call allocates; keep it out of the timing
+    best, vectors = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        vectors = np.asarray(encode(texts), dtype=np.float32)
+        best = min(best, time.perf_counter() - started)
+    return best, vectors
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def neighbour_agreement(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Mean share of each passage's k nearest passages (by reference) that candidate also ranks top-k."""
+    def top_k(vectors):
+        sims = vectors @ vectors.T
+        np.fill_diagonal(sims, -np.inf)
+        return np.argpartition(-sims, k - 1, axis=1)[:, :k]
+
+    ref, cand = top_k(reference), top_k(candidate)
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(ref, cand)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=None, help="embedding model (default: services.models.EMBED_MODEL)")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=32, help="SentenceTransformer batch size for 'float'")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="padded tokens per bucket (EMBED_BATCH_TOKENS)")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads for all runs (0: default)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per variant; the fastest counts")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    from services.cpu_encoder import (EMBED_BATCH_TOKENS, CPUEncoder, length_buckets, padded_tokens, quantize,
+                                      set_threads)
+    from services.models import EMBED_MODEL
+
+    model_name = args.model or EMBED_MODEL
+    batch_tokens = args.batch_tokens or EMBED_BATCH_TOKENS
+    set_threads(args.threads)
+    texts = make_passages(args.texts, args.seed)
+
+    started = time.perf_counter()
+    float_model = SentenceTransformer(model_name, device="cpu")
+    load_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    int8_model = quantize(float_model)
+    quantize_seconds = time.perf_counter() - started
+    bucketed = CPUEncoder(float_model, batch_tokens=batch_tokens)
+    int8 = CPUEncoder(int8_model, batch_tokens=batch_tokens)
+
+    float_seconds, float_vectors = best_time(
+        lambda t: float_model.encode(t, batch_size=args.batch_size), texts, args.repeat)
+    bucketed_seconds, bucketed_vectors = best_time(bucketed.encode, texts, args.repeat)
+    int8_seconds, int8_vectors = best_time(int8.encode, texts, args.repeat)
+
+    reference, quantized = normalize(float_vectors), normalize(int8_vectors)
+    cosines = np.sum(reference * quantized, axis=1)
+    bucketed_cosines = np.sum(reference * normalize(bucketed_vectors), axis=1)
+
+    lengths = bucketed.token_lengths(texts)
+    by_chars = sorted(range(len(texts)), key=lambda i: -len(texts[i]))  # SentenceTransformer's own order
+    fixed = [by_chars[i:i + args.batch_size] for i in range(0, len(by_chars), args.batch_size)]
+    buckets = length_buckets(lengths, batch_tokens)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "quantized_engine": torch.backends.quantized.engine,
+            "args": vars(args),
+        },
+        "model": model_name,
+        "texts": len(texts),
+        "tokens": int(sum(lengths)),
+        "load_seconds": round(load_seconds, 3),
+        "quantize_seconds": round(quantize_seconds, 3),
+        "cosine": {
+            "mean": round(float(cosines.mean()), 5),
+            "min": round(float(cosines.min()), 5),
+            "p1": round(float(np.percentile(cosines, 1)), 5),
+        },
+        "bucketed_cosine_min": round(float(bucketed_cosines.min()), 5),  # batching alone should not move vectors
+        f"top{args.top_k}_agreement": round(neighbour_agreement(reference, quantized, args.top_k), 4),
+        "padding_efficiency": {
+            "fixed_batches": round(sum(lengths) / padded_tokens(lengths, fixed), 3),
+            "length_buckets": round(sum(lengths) / padded_tokens(lengths, buckets), 3),
+        },
+        "seconds": {
+            "float": round(float_seconds, 3),
+            "bucketed": round(bucketed_seconds, 3),
+            "int8": round(int8_seconds, 3),
+        },
+        "texts_per_s": {
+            "float": round(len(texts) / float_seconds, 1),
+            "bucketed": round(len(texts) / bucketed_seconds, 1),
+            "int8": round(len(texts) / int8_seconds, 1),
+        },
+        "speedup": {
+            "bucketing": round(float_seconds / bucketed_seconds, 2),
+            "int8": round(bucketed_seconds / int8_seconds, 2),
+            "total": round(float_seconds / int8_seconds, 2),
+        },
+    }
+
+    cosine, speedup = results["cosine"], results["speedup"]
+    print(f"{model_name}: {len(texts)} texts, {results['tokens']} tokens, {results['meta']['threads']} threads")
+    print(f"cosine int8 vs float: mean {cosine['mean']}  p1 {cosine['p1']}  min {cosine['min']}  "
+          f"top-{args.top_k} agreement {results[f'top{args.top_k}_agreement']}")
+    print(f"padding efficiency: fixed batches {results['padding_efficiency']['fixed_batches']}  "
+          f"length buckets {results['padding_efficiency']['length_buckets']}")
+    for variant in ("float", "bucketed", "int8"):
+        print(f"{variant:9} {results['seconds'][variant]:>8.3f}s  {results['texts_per_s'][variant]:>8} texts/s")
+    print(f"speedup: bucketing x{speedup['bucketing']}  int8 x{speedup['int8']}  total x{speedup['total']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if cosine["mean"] < args.min_cosine:
+        print(f"Mean cosine {cosine['mean']} is below --min-cosine {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Recall/latency report for the NumpyStore quantization modes.
+
+Builds one index per mode from the same vectors and compares every mode's
+top-k against an exact float32 scan. Run from backend/:
+
+    python -m benchmarks.quantization_report --rows 100000 --queries 200
+    python -m benchmarks.quantization_report --index vector_store/numpy_index
+
+With --index the vectors of an existing NumPy index are used instead of
+synthetic clustered ones (queries are perturbed copies of stored rows).
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from services.numpy_store import NumpyStore
+
+
+def synthetic_vectors(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def index_vectors(path: str) -> np.ndarray:
+    store = NumpyStore(path, quantization="none")
+    live = np.flatnonzero(store._alive[:store.count_rows])
+    return np.asarray(store._vectors[live], dtype=np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.integers(0, len(vectors), count)]
+    queries = picked + 0.3 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def build_store(path: str, vectors: np.ndarray, mode: str) -> NumpyStore:
+    store = NumpyStore(path, quantization=mode)
+    batch = 10000
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        ids = [str(i) for i in range(start, end)]
+        store.add(ids, vectors[start:end], [{"doc_id": "bench"}] * len(ids), [""] * len(ids))
+    return store
+
+
+def code_bytes_per_vector(store: NumpyStore) -> float:
+    if store.quantization == "none":
+        return float(store._vectors.dtype.itemsize * store.dim)
+    per_row = store._codes.shape[1] * store._codes.dtype.itemsize
+    if store.quantization == "int8":
+        per_row += store._scales.dtype.itemsize
+    return float(per_row)
+
+
+def percentile_ms(samples, q) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run(vectors: np.ndarray, queries: np.ndarray, top_k: int, modes, rescore_factors):
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        truth = None
+        for mode in modes:
+            store = build_store(os.path.join(root, mode), vectors, mode)
+            if truth is None:
+                truth = [set(store.search(q, top_k, exact=True)[0].tolist()) for q in queries]
+            for factor in (rescore_factors if mode != "none" else [None]):
+                latencies, recalls = [], []
+                for q, expected in zip(queries, truth):
+                    started = time.perf_counter()
+                    rows, _ = store.search(q, top_k, rescore_factor=factor)
+                    latencies.append(time.perf_counter() - started)
+                    recalls.append(len(expected & set(rows.tolist())) / len(expected))
+                results.append({
+                    "mode": mode,
+                    "rescore_factor": factor,
+                    "recall_at_k": round(float(np.mean(recalls)), 4),
+                    "p50_ms": percentile_ms(latencies, 50),
+                    "p95_ms": percentile_ms(latencies, 95),
+                    "first_pass_bytes_per_vector": code_bytes_per_vector(store),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="existing NumPy index directory to take vectors from")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--modes", default="none,int8,binary")
+    parser.add_argument("--rescore-factors", default="4,10,25")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.index:
+        vectors = index_vectors(args.index)
+    else:
+        vectors = synthetic_vectors(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    modes = args.modes.split(",")
+    if "none" in modes:
+        modes.remove("none")
+    modes.insert(0, "none")  # the float baseline also provides the exact ground truth
+    factors = [int(f) for f in args.rescore_factors.split(",")]
+
+    results = run(vectors, queries, args.top_k, modes, factors)
+    print(f"{len(vectors)} vectors x {vectors.shape[1]} dims, {len(queries)} queries, top_k={args.top_k}")
+    print(f"{'mode':8} {'rescore':>7} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'bytes/vec':>10}")
+    for r in results:
+        factor = "-" if r["rescore_factor"] is None else r["rescore_factor"]
+        print(f"{r['mode']:8} {factor:>7} {r['recall_at_k']:>9.4f} {r['p50_ms']:>8.3f} "
+              f"{r['p95_ms']:>8.3f} {r['first_pass_bytes_per_vector']:>10.0f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": len(vectors), "dim": int(vectors.shape[1]), "top_k": args.top_k, "results": results},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Ingestion throughput and query latency benchmark for the RAG pipeline.
+
+Generates a synthetic corpus (see benchmarks.corpus), ingests it into a
+fresh store in a scratch directory, then answers the corpus questions at
+each concurrency level against a local stub Ollama (tools.stub_ollama).
+Per-stage timings come from the rag_stage_seconds histogram. Everything
+runs offline; with --embedder hash not even the embedding model is needed
+(that measures pipeline overhead rather than model speed). Run from backend/:
+
+    python -m benchmarks.rag_benchmark --docs 30 --pages 10 --concurrency 1,4,8 --output base.json
+    python -m benchmarks.compare base.json new.json
+
+Results are JSON: ingestion pages/s and chunks/s, and for each concurrency
+level end-to-end latency and time-to-first-token percentiles plus p50/p95/p99
+per stage.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.corpus import FORMATS, generate_corpus
+from tools.stub_ollama import make_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words hashing embedder with the SentenceTransformer encode() signature."""
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        if isinstance(texts, str):
+            return self.encode([texts])[0]
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in re.findall(r"\w+", text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if h >> 63 else -1.0
+        return out / np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+
+
+def summarize_ms(samples) -> dict:
+    if not len(samples):
+        return {"count": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    return {
+        "count": int(len(ms)),
+        "mean": round(float(ms.mean()), 3),
+        "p50": round(float(np.percentile(ms, 50)), 3),
+        "p95": round(float(np.percentile(ms, 95)), 3),
+        "p99": round(float(np.percentile(ms, 99)), 3),
+        "max": round(float(ms.max()), 3),
+    }
+
+
+def summarize_stages(samples) -> dict:
+    return {stage: summarize_ms(values) for (stage,), values in sorted(samples.items())}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def run_ingest(files) -> dict:
+    from factory.rag_factory import RAGPipeline
+    from services.metrics import STAGE_SECONDS
+
+    pages, chunks, lock = {}, {}, threading.Lock()
+
+    def progress(path, stage, **counts):
+        with lock:
+            if stage == "parsing":
+                pages[path] = counts["pages"]
+            elif stage == "chunking":
+                chunks[path] = counts["chunks"]
+
+    with STAGE_SECONDS.capture() as samples:
+        started = time.perf_counter()
+        RAGPipeline(files).ingest(progress=progress)
+        seconds = time.perf_counter() - started
+    return {
+        "files": len(files),
+        "pages": sum(pages.values()),
+        "chunks": sum(chunks.values()),
+        "seconds": round(seconds, 3),
+        "pages_per_s": round(sum(pages.values()) / seconds, 2),
+        "chunks_per_s": round(sum(chunks.values()) / seconds, 2),
+        "stages": summarize_stages(samples),
+    }
+
+
+async def run_queries(pipeline, questions, requests: int, concurrency: int) -> dict:
+    from services.metrics import STAGE_SECONDS
+
+    slots = asyncio.Semaphore(concurrency)
+    latencies, ttfts, errors = [], [], []
+
+    async def one(question):
+        async with slots:
+            started = time.perf_counter()
+            try:
+                _, tokens = await pipeline.astream(question)
+                first = True
+                async for _ in tokens:
+                    if first:
+                        ttfts.append(time.perf_counter() - started)
+                        first = False
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    with STAGE_SECONDS.capture() as samples:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(questions[i % len(questions)]) for i in range(requests)))
+        seconds = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "error_types": sorted(set(errors)),
+        "seconds": round(seconds, 3),
+        "requests_per_s": round(len(latencies) / seconds, 2),
+        "latency_ms": summarize_ms(latencies),
+        "ttft_ms": summarize_ms(ttfts),
+        "stages": summarize_stages(samples),
+    }
+
+
+async def run_query_levels(questions, requests: int, levels) -> list:
+    from factory.rag_factory import RAGPipeline
+    from services.llm_gateway import llm_gateway
+
+    pipeline = RAGPipeline([])
+    try:
+        await run_queries(pipeline, questions, 1, 1)  # first query loads models and starts pools
+        return [await run_queries(pipeline, questions, requests, level) for level in levels]
+    finally:
+        await llm_gateway.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=10, help="pages per document")
+    parser.add_argument("--words-per-page", type=int, default=300)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=50, help="queries per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--embedder", choices=("model", "hash"), default="model",
+                        help="the real embedding model (must be cached locally) or a hashing stub")
+    parser.add_argument("--embed-backend", choices=("torch", "int8"), default="torch",
+                        help="EMBED_BACKEND for --embedder model (see benchmarks.embedding_parity)")
+    parser.add_argument("--vector-backend", default="numpy", help="VECTOR_BACKEND for the run")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache on")
+    parser.add_argument("--llm-tokens", type=int, default=64, help="stub LLM tokens per answer")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005)
+    parser.add_argument("--llm-first-token-delay", type=float, default=0.05)
+    parser.add_argument("--workdir", help="keep the corpus and store here instead of a temporary directory")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    llm = make_server(port=0, tokens=args.llm_tokens, token_delay=args.llm_token_delay,
+                      first_token_delay=args.llm_first_token_delay)
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+
+    # Settings are read when the services modules are imported, so they are
+    # imported only after the environment below is in place; relative state
+    # directories (vector store, caches, manifest) land in the work directory.
+    os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{llm.server_address[1]}"
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ["EMBED_BACKEND"] = args.embed_backend
+    os.environ["ANSWER_CACHE"] = "1" if args.answer_cache else "0"
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    corpus = generate_corpus(os.path.join(workdir, "corpus"), args.docs, args.pages, args.words_per_page,
+                             tuple(args.formats.split(",")), seed=args.seed)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        from services.executor import shutdown_pools
+        from services.models import EMBED_MODEL, register_model, warm_up
+
+        started = time.perf_counter()
+        if args.embedder == "hash":
+            register_model(EMBED_MODEL, HashEmbedder())
+        warm_up()
+        model_seconds = time.perf_counter() - started
+        try:
+            ingest = run_ingest(corpus["files"])
+            questions = [fact["question"] for fact in corpus["facts"]]
+            queries = asyncio.run(run_query_levels(questions, args.requests, levels))
+        finally:
+            shutdown_pools()
+    finally:
+        os.chdir(cwd)
+        llm.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "corpus": {k: corpus[k] for k in ("docs", "pages_per_doc", "words_per_page", "formats", "bytes")},
+        "model_load_seconds": round(model_seconds, 3),
+        "ingest": ingest,
+        "query": queries,
+    }
+    print(f"ingest: {ingest['files']} files, {ingest['pages']} pages, {ingest['chunks']} chunks in "
+          f"{ingest['seconds']}s ({ingest['pages_per_s']} pages/s, {ingest['chunks_per_s']} chunks/s)")
+    for level in queries:
+        latency, ttft = level["latency_ms"], level["ttft_ms"]
+        print(f"query c={level['concurrency']:<3} {level['requests_per_s']:>7} req/s  "
+              f"p50 {latency.get('p50', '-')} ms  p95 {latency.get('p95', '-')} ms  "
+              f"ttft p50 {ttft.get('p50', '-')} ms  errors {level['errors']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
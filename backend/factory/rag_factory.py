@@ -1,66 +1,266 @@
-from services.loader import load_files
-from services.chunker import chunk_text
+import os
+from services.loader import iter_pages, PARALLEL_PDF_LOADING
+from services.chunker import iter_chunks
 from services.embedder import embed_chunks
-from services.vector_store import add_embeddings, query_embeddings
-from services.llm import generate_answer, embed_query
+from services.vector_store import (DEFAULT_NAMESPACE, add_embeddings, bump_collection_version, collection_is_empty,
+                                   collection_version, delete_document, get_embeddings, query_embeddings,
+                                   validate_namespace)
+from services.answer_cache import get_answer_cache, ANSWER_CACHE_ENABLED
+from services.citations import clean_response
+from services.reranker import rerank, RERANK_MODE, RERANK_CANDIDATES
+from services.executor import process_pool, search_pool, thread_pool
+from services.lexical_index import get_lexical_index, reciprocal_rank_fusion
+from services.stages import run_stages
+from services.manifest import ingest_lock, load_manifest, update_manifest, plan_ingest
+from services.metrics import StopWatch, observe_stage, record_cache, stage_timer
+from services.llm import astream_answer, embed_query
 from services.logger import log
-import sys
-sys.path.append("..")  # Add appropriate path at runtime
-from services.vector_store import collection_is_empty
-
-
-# class RAGPipeline:
-#     def __init__(self, file_paths):
-#         self.texts = load_files(file_paths)
-#         self.doc_ids = file_paths
-
-#     def ingest(self):
-#         # optional clear
-#         # from services.vector_store import clear_collection
-#         # clear_collection()
-#         for text, doc_id in zip(self.texts, self.doc_ids):
-#             chunks = chunk_text(text, doc_id)
-#             vectors = embed_chunks(chunks)
-#             add_embeddings(vectors)
-#         log.info("Ingestion complete")
-
-#     # def query(self, query_text: str):
-#     #     q_emb = embed_query(query_text)
-#     #     results = query_embeddings(q_emb)
-#     #     docs = []
-#     #     for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
-#     #         docs.append({'document': doc, 'metadata': meta})
-#     #     answer = generate_answer(docs, query_text)
-#     #     return answer, docs
-#     def query(self, query_text: str):
-#         q_emb = embed_query(query_text)
-#         results = query_embeddings(q_emb)
-#         docs = [{'document': d, 'metadata': m} for d, m in zip(results['documents'][0], results['metadatas'][0])]
-#         answer_obj = generate_answer(docs, query_text)
-
-#         # Extract string from answer_obj here
-#         answer_text = answer_obj.message.content if hasattr(answer_obj, "message") else str(answer_obj)
-
-#         return answer_text, docs
+
+# Streaming ingestion: chunks per embedding / vector-store batch, and batches
+# buffered between stages. Peak memory is roughly proportional to their product.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+
+# Hybrid retrieval: dense and BM25 candidates are fused with reciprocal-rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))  # per retriever, before fusion
 
 
 class RAGPipeline:
-    def __init__(self, file_paths):
+    """Ingestion into and answering from one namespace (see services.vector_store)."""
+
+    def __init__(self, file_paths, namespace: str = DEFAULT_NAMESPACE):
         self.file_paths = file_paths
-        self.texts = None  # Delay loading until ingest
-
-    def ingest(self):
-        self.texts = load_files(self.file_paths)
-        for text, doc_id in zip(self.texts, self.file_paths):
-            chunks = chunk_text(text, doc_id)
-            vectors = embed_chunks(chunks)
-            add_embeddings(vectors)
-        log.info("Ingestion complete")
-
-    def query(self, query_text: str):
-        q_emb = embed_query(query_text)
-        results = query_embeddings(q_emb)
-        docs = [{'document': d, 'metadata': m} for d, m in zip(results['documents'][0], results['metadatas'][0])]
-        answer_obj = generate_answer(docs, query_text)
-        answer_text = answer_obj.message.content if hasattr(answer_obj, "message") else str(answer_obj)
-        return answer_text, docs
\ No newline at end of file
+        self.namespace = validate_namespace(namespace)
+
+    def ingest(self, prune: bool = False, progress=None):
+        """Ingest new or changed files only; with prune, drop documents no longer in file_paths.
+
+        progress(path, stage, **counts) is called as each file moves through the
+        parsing -> chunking -> embedding -> writing -> written stages (possibly
+        from several threads); it may raise to abort.
+        """
+        report = progress or (lambda path, stage, **counts: None)
+        # One ingestion per namespace at a time, in any worker process: two runs over the
+        # same file would add its chunks twice, and one's cleanup would delete the other's
+        with ingest_lock(self.namespace):
+            if collection_is_empty(self.namespace):
+                update_manifest(reset=True, namespace=self.namespace)
+                get_lexical_index(self.namespace).clear()
+            manifest = load_manifest(self.namespace)
+            to_ingest, to_remove, unchanged = plan_ingest(manifest, self.file_paths, prune)
+            for doc_id in to_remove:
+                self._delete_document(doc_id)
+            update_manifest(unchanged, removed=to_remove, namespace=self.namespace)
+            for path in unchanged:
+                report(path, "skipped")
+
+            paths = list(to_ingest)
+            self._ingest_streaming(paths, to_ingest, report)
+            log.info("Ingestion complete", namespace=self.namespace, ingested=len(paths), removed=len(to_remove),
+                     unchanged=len(unchanged))
+
+    def _ingest_streaming(self, paths, entries, report):
+        """page -> chunk batch -> embedding batch -> vector-store batch, each stage on its own thread.
+
+        Stages are joined by queues of INGEST_QUEUE_SIZE items and work in
+        batches of INGEST_BATCH_SIZE chunks, so memory does not grow with the
+        number or size of the files.
+        """
+        # PDF parsing is pure-Python CPU work: spread page ranges across the process pool
+        pages = iter_pages(paths, process_pool if PARALLEL_PDF_LOADING else None)
+
+        def chunk(items):
+            items = iter(items)
+            for path, result in items:
+                parsed = {"pages": 0, "page_errors": 0}
+                # Only time spent chunking, not waiting for pages or for the embed stage
+                clock = StopWatch()
+
+                def texts(result=result, path=path, parsed=parsed, clock=clock):
+                    while result is not None:
+                        _, text, error = result
+                        parsed["pages"] += 1
+                        parsed["page_errors"] += bool(error)
+                        report(path, "parsing", **parsed)
+                        yield text
+                        clock.pause()
+                        _, result = next(items)
+                        clock.resume()
+
+                count, batch, total_tokens = 0, [], 0
+                for c in iter_chunks(texts(), path):
+                    batch.append(c)
+                    total_tokens = c.metadata["end"]
+                    if len(batch) == INGEST_BATCH_SIZE:
+                        clock.pause()
+                        yield "chunks", path, count, batch
+                        clock.resume()
+                        count, batch = count + len(batch), []
+                        report(path, "chunking", chunks=count)
+                clock.pause()
+                observe_stage("chunking", clock.elapsed)
+                if batch:
+                    yield "chunks", path, count, batch
+                    count += len(batch)
+                report(path, "chunking", chunks=count)
+                log.info("Generated chunks", doc_id=path, chunks=count, total_tokens=total_tokens, **parsed)
+                yield "end", path, count
+
+        def embed(items):
+            for item in items:
+                if item[0] == "chunks":
+                    _, path, start_index, batch = item
+                    with stage_timer("embed_batch"):
+                        vectors = embed_chunks(batch, start_index)
+                    report(path, "embedding", chunks_embedded=start_index + len(vectors))
+                    item = ("vectors", path, vectors)
+                yield item
+
+        written = {}  # vectors already stored for documents that are not finished yet
+
+        def store(item):
+            if item[0] == "vectors":
+                _, path, vectors = item
+                if vectors:
+                    with stage_timer("vector_add"):
+                        add_embeddings(vectors, namespace=self.namespace)
+                    with stage_timer("lexical_add"):
+                        get_lexical_index(self.namespace).add(vectors)
+                written[path] = written.get(path, 0) + len(vectors)
+                report(path, "writing", vectors_written=written[path])
+            else:
+                _, path, count = item
+                written.pop(path, None)
+                update_manifest({path: {**entries[path], "chunks": count}}, namespace=self.namespace)
+                if count:
+                    # Once per document rather than per batch: caches keyed on the version start over
+                    bump_collection_version(self.namespace)
+                report(path, "written", vectors_written=count)
+
+        try:
+            run_stages(pages, [chunk, embed], store, queue_size=INGEST_QUEUE_SIZE, name="ingest")
+        except BaseException:
+            # Don't leave half-written documents behind; they are not in the manifest yet
+            for path in written:
+                self._delete_document(path)
+            raise
+
+    def _delete_document(self, doc_id: str):
+        delete_document(doc_id, namespace=self.namespace)
+        get_lexical_index(self.namespace).delete_document(doc_id)
+
+    def _dense_search(self, q_emb, top_k: int, include_embeddings: bool = False):
+        with stage_timer("vector_search"):
+            results = query_embeddings(q_emb, top_k, include_embeddings=include_embeddings,
+                                       namespace=self.namespace)
+        docs = [
+            {'id': i, 'document': d, 'metadata': m}
+            for i, d, m in zip(results['ids'][0], results['documents'][0], results['metadatas'][0])
+        ]
+        if include_embeddings:
+            for doc, emb in zip(docs, results['embeddings'][0]):
+                doc['embedding'] = emb
+        return docs
+
+    def _lexical_search(self, query_text: str, top_k: int):
+        with stage_timer("lexical_search"):
+            return get_lexical_index(self.namespace).search(query_text, top_k)
+
+    def retrieve(self, query_text: str, q_emb=None):
+        reranking = RERANK_MODE != "none"
+        pool_size = max(RETRIEVAL_TOP_K, RERANK_CANDIDATES) if reranking else RETRIEVAL_TOP_K
+        if not HYBRID_SEARCH:
+            if q_emb is None:
+                q_emb = embed_query(query_text)
+            docs = self._dense_search(q_emb, pool_size, include_embeddings=reranking)
+            relevance = None
+        else:
+            # BM25 runs while the query is embedded and searched densely
+            lexical = search_pool.submit(self._lexical_search, query_text, HYBRID_CANDIDATES)
+            if q_emb is None:
+                q_emb = embed_query(query_text)
+            dense = self._dense_search(q_emb, HYBRID_CANDIDATES, include_embeddings=reranking)
+            docs = reciprocal_rank_fusion([dense, lexical.result()], pool_size)
+            # Rank by the fused score so lexical-only matches keep their place
+            top_score = docs[0]['fusion_score'] if docs else 1.0
+            relevance = [d['fusion_score'] / top_score for d in docs]
+        if reranking:
+            with stage_timer("rerank"):
+                docs, relevance = self._with_embeddings(docs, relevance)
+                docs = rerank(q_emb, docs, RETRIEVAL_TOP_K, relevance=relevance)
+        return [{'document': d['document'], 'metadata': d['metadata']} for d in docs[:RETRIEVAL_TOP_K]]
+
+    def _with_embeddings(self, docs, relevance=None):
+        """docs (and their relevance) with vectors: lexical-only candidates get theirs from the vector store.
+
+        A chunk deleted since the lexical search has none left and is dropped.
+        """
+        missing = [d['id'] for d in docs if d.get('embedding') is None]
+        if not missing:
+            return docs, relevance
+        stored = get_embeddings(missing, namespace=self.namespace)
+        keep = [i for i, d in enumerate(docs) if d.get('embedding') is not None or d['id'] in stored]
+        for i in keep:
+            if docs[i].get('embedding') is None:
+                docs[i]['embedding'] = stored[docs[i]['id']]
+        return [docs[i] for i in keep], None if relevance is None else [relevance[i] for i in keep]
+
+    def prepare(self, query_text: str, retrieval_query: str = None, history=None):
+        """Embed the retrieval query, then return (version, q_emb, cached answer or None, docs).
+
+        Everything before generation; blocking, so async callers run it on the thread pool.
+        The answer cache is only consulted for a question without history.
+        """
+        retrieval_query = retrieval_query or query_text
+        version = collection_version(self.namespace)
+        q_emb = embed_query(retrieval_query)
+        if ANSWER_CACHE_ENABLED and not history:
+            cached = get_answer_cache(self.namespace).get(q_emb)
+            record_cache("answer", cached is not None)
+            if cached is not None:
+                return version, q_emb, cached, cached.docs
+        return version, q_emb, None, self.retrieve(retrieval_query, q_emb)
+
+    def _remember(self, q_emb, retrieval_query, answer_text, docs, version, history=None):
+        # The answer also depends on the history, which the cache key (the query embedding) doesn't cover
+        if ANSWER_CACHE_ENABLED and not history:
+            get_answer_cache(self.namespace).put(q_emb, retrieval_query, clean_response(answer_text), docs,
+                                                 version)
+
+    async def astream(self, query_text: str, history=None, retrieval_query: str = None):
+        """Answer query_text: (docs, async iterator over answer tokens).
+
+        Retrieval runs on the thread pool, generation goes through the LLM
+        gateway. Retrieval and the answer cache use retrieval_query when given;
+        history holds earlier chat messages for the LLM (see Conversation.history).
+        Waits for the first token before returning, so an overloaded or timed-out
+        LLM raises here, before the caller has started its response.
+        """
+        version, q_emb, cached, docs = await thread_pool.run(self.prepare, query_text, retrieval_query, history)
+        if cached is not None:
+            async def cached_tokens():
+                yield cached.answer
+            return docs, cached_tokens()
+
+        parts = astream_answer(docs, query_text, history=history)
+        try:
+            first = await parts.__anext__()
+        except StopAsyncIteration:
+            first = ""
+
+        async def tokens():
+            pieces = [first]
+            try:
+                yield first
+                async for token in parts:
+                    pieces.append(token)
+                    yield token
+            finally:
+                await parts.aclose()
+            # Only a generation that ran to the end is worth caching
+            await thread_pool.run(self._remember, q_emb, retrieval_query or query_text, "".join(pieces), docs,
+                                  version, history)
+
+        return docs, tokens()
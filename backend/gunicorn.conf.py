@@ -0,0 +1,51 @@
+"""gunicorn settings for serving the API from several worker processes.
+
+Run from backend/:
+
+    VECTOR_BACKEND=numpy gunicorn -c gunicorn.conf.py app:app
+
+The app and the embedding model are loaded once in the master process before
+the workers are forked, so the model weights are shared copy-on-write rather
+than loaded per worker. The numpy vector index is memory-mapped, so workers
+share its pages through the page cache. One worker is elected leader and
+re-ingests the temp directory; writes from any worker are serialized by lock
+files, and the others reload what changed (see services.coordination).
+Chroma does not pick up other processes' writes, so more than one worker
+requires VECTOR_BACKEND=numpy; the master refuses to start otherwise.
+"""
+import gc
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+# Load the models in the master (PRELOAD_MODELS=0 leaves it to each worker's warm-up)
+preload_models = os.getenv("PRELOAD_MODELS", "1") == "1"
+
+
+def on_starting(server):
+    """Runs in the master before it starts; a RuntimeError here stops gunicorn with the message."""
+    from services.vector_store import VECTOR_BACKEND
+
+    if server.num_workers > 1 and VECTOR_BACKEND != "numpy":
+        raise RuntimeError(f"VECTOR_BACKEND={VECTOR_BACKEND} with {server.num_workers} workers: only the numpy "
+                           "backend picks up writes made by other workers; set VECTOR_BACKEND=numpy "
+                           "or WEB_CONCURRENCY=1")
+
+
+def when_ready(server):
+    """Runs in the master once the app is imported, before any worker is forked."""
+    if preload_models:
+        from services.chunker import get_encoder
+        from services.models import preload
+
+        preload()
+        get_encoder()
+        server.log.info("Preloaded the embedding model and tokenizer")
+    # Keep the garbage collector from touching (and so un-sharing) the pages
+    # of everything loaded so far
+    gc.collect()
+    gc.freeze()
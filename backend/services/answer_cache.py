@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import structlog
+
+from services.vector_store import DEFAULT_NAMESPACE, NamespaceLRU, collection_version
+
+log = structlog.get_logger()
+
+# Answers to earlier questions, looked up by cosine similarity of the
+# retrieval query embedding. Entries expire after ANSWER_CACHE_TTL seconds,
+# the least recently used are dropped beyond ANSWER_CACHE_MAX_ENTRIES, and the
+# whole cache is discarded whenever the collection version changes. Each
+# namespace has its own cache, so answers never cross namespaces. Only
+# questions asked without chat history are cached (see RAGPipeline.prepare),
+# since the history shapes the answer but not the key.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    docs: List[dict]
+    created_at: float
+
+
+class AnswerCache:
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD, ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES, namespace: str = DEFAULT_NAMESPACE):
+        self.namespace = namespace
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, CachedAnswer]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None  # stacked keys, rebuilt lazily after changes
+        self._keys: List[int] = []
+        self._next_key = 0
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _check_version(self):
+        version = collection_version(self.namespace)
+        if version != self._version:
+            if self._entries:
+                log.info("Collection changed, clearing answer cache", entries=len(self._entries))
+            self._entries.clear()
+            self._matrix = None
+            self._version = version
+
+    def _expire(self, now: float):
+        while self._entries:
+            key, (_, entry) = next(iter(self._entries.items()))
+            if now - entry.created_at <= self.ttl:
+                break
+            del self._entries[key]
+            self._matrix = None
+
+    def get(self, embedding) -> Optional[CachedAnswer]:
+        """The cached answer whose query is most similar to embedding, if above the threshold."""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+            now = time.time()
+            self._expire(now)
+            if not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k][0] for k in self._keys])
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            key = self._keys[best]
+            entry = self._entries.get(key)
+            if scores[best] < self.threshold or entry is None or now - entry[1].created_at > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        log.info("Answer cache hit", similarity=round(float(scores[best]), 4), cached_query=entry[1].query[:80])
+        return entry[1]
+
+    def put(self, embedding, query: str, answer: str, docs: List[dict], version: str):
+        """Store an answer produced from the collection as of version (see collection_version)."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version()
+            if version != self._version:
+                return  # the collection changed while this answer was being generated
+            self._entries[self._next_key] = (vector, CachedAnswer(query, answer, docs, time.time()))
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_caches = NamespaceLRU(lambda namespace: AnswerCache(namespace=namespace), kind="answer_cache")
+
+
+def get_answer_cache(namespace: str = DEFAULT_NAMESPACE) -> AnswerCache:
+    return _caches.get(namespace)
@@ -0,0 +1,82 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List
+
+import structlog
+
+log = structlog.get_logger()
+
+
+class MicroBatcher:
+    """Gathers concurrent single-item calls into one batch_fn call.
+
+    A batch is dispatched when max_batch_size items are waiting or max_wait_ms
+    has passed since the first one arrived; each caller gets its own result.
+    """
+
+    def __init__(self, batch_fn: Callable[[List], List], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._reset()
+
+    def _reset(self):
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _ensure_thread(self):
+        if self._pid != os.getpid():
+            # Forked (e.g. a gunicorn worker from a preloaded master): the
+            # parent's thread does not exist here and its queue may hold a
+            # lock taken at fork time, so start over
+            self._reset()
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        """Blocking: returns batch_fn's result for this item."""
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((item, future))
+        return future.result()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise ValueError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                log.error("Micro-batch failed", batcher=self.name, size=len(items), error=str(e))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            log.debug("Micro-batch dispatched", batcher=self.name, size=len(items))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
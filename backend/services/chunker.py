@@ -1,37 +1,66 @@
-from typing import List
+import functools
+from typing import Iterable, Iterator, List
 from dataclasses import dataclass
-import tiktoken
 import structlog
 
 log = structlog.get_logger()
 
 # Use an encoder matching the LLM's tokenizer (e.g. OpenAI/Ollama)
-ENCODER = tiktoken.get_encoding("cl100k_base")
+ENCODING_NAME = "cl100k_base"
 MAX_TOKENS = 200
 OVERLAP = 50
 
+@functools.lru_cache(maxsize=None)
+def get_encoder():
+    """The tokenizer, loaded on first use (tiktoken may fetch its BPE file) rather than at import."""
+    import tiktoken
+
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
 @dataclass
 class Chunk:
     text: str
     metadata: dict
 
 
-def chunk_text(text: str, doc_id: str) -> List[Chunk]:
-    tokens = ENCODER.encode(text)
-    chunks = []
+def iter_chunks(texts: Iterable[str], doc_id: str, separator: str = "\n") -> Iterator[Chunk]:
+    """Chunk a stream of texts (e.g. pages) joined by separator without holding the whole document.
+
+    Windows and token offsets are the same as chunk_text over the joined text,
+    except that tokenization restarts at each text boundary.
+    """
+    buffer: List[int] = []  # tokens from absolute position `offset` onwards
+    offset = 0
     start = 0
-    total = len(tokens)
-    log.info("Chunking text", doc_id=doc_id, total_tokens=total)
+    total = 0
+    encoder = get_encoder()
+    for i, text in enumerate(texts):
+        buffer.extend(encoder.encode(text if i == 0 else separator + text))
+        total = offset + len(buffer)
+        # Windows that end before the buffered tokens do are final: emit and drop them
+        while start + MAX_TOKENS <= total:
+            yield _window(buffer, offset, start, start + MAX_TOKENS, doc_id)
+            start += MAX_TOKENS - OVERLAP
+            del buffer[:start - offset]
+            offset = start
     while start < total:
         end = min(start + MAX_TOKENS, total)
-        chunk_tokens = tokens[start:end]
-        chunk_str = ENCODER.decode(chunk_tokens)
-        chunks.append(
-            Chunk(
-                text=chunk_str,
-                metadata={"doc_id": doc_id, "start": start, "end": end},
-            )
-        )
+        yield _window(buffer, offset, start, end, doc_id)
         start += MAX_TOKENS - OVERLAP
-    log.info("Generated chunks", doc_id=doc_id, chunks=len(chunks))
-    return chunks
\ No newline at end of file
+
+
+def _window(buffer: List[int], offset: int, start: int, end: int, doc_id: str) -> Chunk:
+    return Chunk(
+        text=get_encoder().decode(buffer[start - offset:end - offset]),
+        metadata={"doc_id": doc_id, "start": start, "end": end},
+    )
+
+
+def chunk_text(text: str, doc_id: str) -> List[Chunk]:
+    log.info("Chunking text", doc_id=doc_id)
+    chunks = list(iter_chunks([text], doc_id))
+    # The last window ends at the last token, so no second pass over the text
+    total = chunks[-1].metadata["end"] if chunks else 0
+    log.info("Generated chunks", doc_id=doc_id, chunks=len(chunks), total_tokens=total)
+    return chunks
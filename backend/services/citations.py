@@ -0,0 +1,73 @@
+import re
+
+# Citations the model is told to emit, e.g. [path/to/file.pdf:10-50]. Both
+# patterns stay inside a single bracket pair so surrounding text survives.
+SPAN_CITATION_RE = re.compile(r"\[[^\[\]\n]*?\.pdf:\d+-\d+\]")
+PDF_BRACKET_RE = re.compile(r"\[[^\[\]\n]*?\.pdf[^\[\]\n]*?\]")
+
+
+def clean_response(text: str) -> str:
+    # Remove all references that look like [anypath.pdf:start-end]
+    cleaned = SPAN_CITATION_RE.sub("", text)
+    # Optionally remove any empty brackets or remaining square bracketed paths
+    cleaned = PDF_BRACKET_RE.sub("", cleaned)
+    return cleaned.strip()
+
+
+class CitationStripper:
+    """Incremental clean_response for streamed tokens.
+
+    Text outside square brackets is passed through immediately; a bracketed
+    segment is held back until it closes and dropped if it is a PDF citation.
+    """
+
+    MAX_PENDING = 512  # an unclosed "[" longer than this is not a citation
+
+    def __init__(self):
+        self._pending = ""
+        self._held = ""
+        self._started = False
+
+    def _emit(self, text: str) -> str:
+        if not self._started:
+            # Same as the .strip() of clean_response: drop leading whitespace and
+            # hold trailing whitespace back until more text follows it
+            text = text.lstrip()
+            self._started = bool(text)
+        text = self._held + text
+        stripped = text.rstrip()
+        self._held = text[len(stripped):]
+        return stripped
+
+    def feed(self, text: str) -> str:
+        self._pending += text
+        out = []
+        while self._pending:
+            start = self._pending.find("[")
+            if start == -1:
+                out.append(self._pending)
+                self._pending = ""
+                break
+            out.append(self._pending[:start])
+            end = self._pending.find("]", start)
+            if end == -1:
+                if len(self._pending) - start > self.MAX_PENDING:
+                    out.append(self._pending[start:])
+                    self._pending = ""
+                else:
+                    self._pending = self._pending[start:]
+                break
+            inner = self._pending.rfind("[", start, end)
+            if inner > start:
+                # Only the innermost bracket pair can be a citation
+                out.append(self._pending[start:inner])
+                start = inner
+            segment = self._pending[start:end + 1]
+            if not PDF_BRACKET_RE.fullmatch(segment):
+                out.append(segment)
+            self._pending = self._pending[end + 1:]
+        return self._emit("".join(out))
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return self._emit(text)
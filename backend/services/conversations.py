@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import structlog
+
+from services.chunker import get_encoder
+from services.file_lock import InterProcessLock
+from services.vector_store import DB_DIR
+
+log = structlog.get_logger()
+
+# Server-side chat history, so clients only send the new message plus their
+# conversation_id. Each conversation keeps its most recent messages within
+# HISTORY_TOKEN_BUDGET; older turns are folded into a short running summary of
+# the questions asked. Conversations are saved to CONVERSATIONS_DIR (one JSON
+# file each), so a follow-up can land on any worker process; each process
+# keeps the ones it used recently in memory, up to CONVERSATION_STORE_MAX_BYTES,
+# and re-reads a file another process has changed. Idle conversations expire
+# after CONVERSATION_TTL.
+CONVERSATIONS_DIR = os.getenv("CONVERSATIONS_DIR", os.path.join(DB_DIR, "conversations"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "200"))
+SUMMARY_LINE_TOKENS = 40  # per folded question
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+CONVERSATION_STORE_MAX_BYTES = int(os.getenv("CONVERSATION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Retrieval query built from the latest turn: a short follow-up ("and its price?")
+# borrows the previous question, and the result is capped at this many tokens
+FOLLOW_UP_MAX_TOKENS = 8
+RETRIEVAL_QUERY_MAX_TOKENS = int(os.getenv("RETRIEVAL_QUERY_MAX_TOKENS", "128"))
+MESSAGE_OVERHEAD_BYTES = 200  # rough per-message bookkeeping cost in the memory bound
+EXPIRE_INTERVAL = 60  # seconds between sweeps of expired conversation files
+
+
+def count_tokens(text: str) -> int:
+    return len(get_encoder().encode(text))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoder = get_encoder()
+    tokens = encoder.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+
+@dataclass
+class StoredMessage:
+    role: str  # "user" or "bot"
+    content: str
+    tokens: int
+
+
+@dataclass
+class Conversation:
+    conversation_id: str
+    messages: List[StoredMessage] = field(default_factory=list)
+    summary: List[str] = field(default_factory=list)  # folded older questions, oldest first
+    summary_tokens: int = 0
+    last_active: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return {
+            "conversation_id": self.conversation_id,
+            "messages": [[m.role, m.content, m.tokens] for m in self.messages],
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
+            "last_active": self.last_active,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "Conversation":
+        return cls(state["conversation_id"], [StoredMessage(*m) for m in state["messages"]], state["summary"],
+                   state["summary_tokens"], state["last_active"])
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(m.tokens for m in self.messages)
+
+    @property
+    def size_bytes(self) -> int:
+        texts = [m.content for m in self.messages] + self.summary
+        return sum(len(t) + MESSAGE_OVERHEAD_BYTES for t in texts)
+
+    def _fold_oldest(self):
+        message = self.messages.pop(0)
+        if message.role != "user":
+            return  # answers are not kept in the summary, only what was asked
+        line = truncate_tokens(" ".join(message.content.split()), SUMMARY_LINE_TOKENS)
+        self.summary.append(line)
+        self.summary_tokens += count_tokens(line)
+        while self.summary_tokens > SUMMARY_TOKEN_BUDGET and len(self.summary) > 1:
+            self.summary_tokens -= count_tokens(self.summary.pop(0))
+
+    def add(self, role: str, content: str):
+        self.messages.append(StoredMessage(role, content, count_tokens(content)))
+        # The newest message always stays, even if it alone exceeds the budget
+        while self.history_tokens > HISTORY_TOKEN_BUDGET and len(self.messages) > 1:
+            self._fold_oldest()
+        self.last_active = time.time()
+
+    def latest_question(self) -> Optional[str]:
+        for message in reversed(self.messages):
+            if message.role == "user":
+                return message.content
+        return None
+
+    def retrieval_query(self) -> Optional[str]:
+        """The latest question, prefixed with the previous one when it is a short follow-up."""
+        questions = [m for m in self.messages if m.role == "user"]
+        if not questions:
+            return None
+        latest = questions[-1]
+        query = latest.content
+        if latest.tokens <= FOLLOW_UP_MAX_TOKENS:
+            previous = questions[-2].content if len(questions) > 1 else (self.summary[-1] if self.summary else "")
+            if previous:
+                query = f"{previous}\n{query}"
+        return truncate_tokens(query, RETRIEVAL_QUERY_MAX_TOKENS)
+
+    def history(self) -> List[Dict[str, str]]:
+        """Chat messages for the LLM before the latest question, summary first."""
+        messages = self.messages
+        if messages and messages[-1].role == "user":
+            messages = messages[:-1]
+        history = []
+        if self.summary:
+            history.append({
+                "role": "system",
+                "content": "Earlier in this conversation the user asked:\n" + "\n".join(f"- {s}" for s in self.summary),
+            })
+        for m in messages:
+            history.append({"role": "assistant" if m.role == "bot" else m.role, "content": m.content})
+        return history
+
+
+class ConversationStore:
+    """Conversations saved under state_dir and shared by every worker process, with an in-memory cache."""
+
+    def __init__(self, ttl: float = CONVERSATION_TTL, max_bytes: int = CONVERSATION_STORE_MAX_BYTES,
+                 state_dir: str = CONVERSATIONS_DIR):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Held (by any worker process) while a conversation is read, updated and written
+        self._write_lock = InterProcessLock(os.path.join(state_dir, "write.lock"))
+        # Cached conversations and the mtime of the file they were read from, least recently used first
+        self._conversations: "OrderedDict[str, Tuple[Conversation, int]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._last_expired = 0.0
+
+    def _path(self, conversation_id: str) -> str:
+        # Ids come from clients, so the file is named after a digest of the id
+        return os.path.join(self.state_dir, hashlib.sha256(conversation_id.encode("utf-8")).hexdigest()[:32] + ".json")
+
+    def _touch(self, conversation: Conversation, mtime: int):
+        conversation_id = conversation.conversation_id
+        self._conversations[conversation_id] = (conversation, mtime)
+        self._conversations.move_to_end(conversation_id)
+        size = conversation.size_bytes
+        self._total_bytes += size - self._sizes.get(conversation_id, 0)
+        self._sizes[conversation_id] = size
+
+    def _drop(self, conversation_id: str):
+        self._conversations.pop(conversation_id, None)
+        self._total_bytes -= self._sizes.pop(conversation_id, 0)
+
+    def _evict(self):
+        """Trim the cache to max_bytes and, every EXPIRE_INTERVAL, delete conversation files idle past the ttl."""
+        while self._conversations and self._total_bytes > self.max_bytes:
+            self._drop(next(iter(self._conversations)))
+        now = time.time()
+        if now - self._last_expired < EXPIRE_INTERVAL:
+            return
+        self._last_expired = now
+        cutoff = now - self.ttl
+        expired = 0
+        for name in os.listdir(self.state_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                if os.path.getmtime(os.path.join(self.state_dir, name)) < cutoff:
+                    os.remove(os.path.join(self.state_dir, name))
+                    expired += 1
+            except FileNotFoundError:
+                pass
+        if expired:
+            log.info("Expired conversations", count=expired)
+
+    def _load(self, conversation_id: str) -> Optional[Conversation]:
+        """The conversation as last saved by any process, from the cache while its file is unchanged."""
+        path = self._path(conversation_id)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            self._drop(conversation_id)
+            return None
+        cached = self._conversations.get(conversation_id)
+        if cached is not None and cached[1] == mtime:
+            conversation = cached[0]
+        else:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    conversation = Conversation.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.warning("Unreadable conversation, starting fresh", conversation_id=conversation_id, error=str(e))
+                self._drop(conversation_id)
+                return None
+        if conversation.last_active < time.time() - self.ttl:
+            self._drop(conversation_id)
+            return None
+        self._touch(conversation, mtime)
+        return conversation
+
+    def _save(self, conversation: Conversation):
+        path = self._path(conversation.conversation_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(conversation.to_dict(), f)
+        os.replace(tmp_path, path)
+        self._touch(conversation, os.stat(path).st_mtime_ns)
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        with self._lock:
+            return self._load(conversation_id)
+
+    def add_messages(self, conversation_id: str, messages) -> Conversation:
+        """Append messages ({"role", "content"} dicts or objects) to a conversation, creating it if needed."""
+        with self._write_lock, self._lock:
+            conversation = self._load(conversation_id) or Conversation(conversation_id)
+            for message in messages:
+                if isinstance(message, dict):
+                    conversation.add(message["role"], message["content"])
+                else:
+                    conversation.add(message.role, message.content)
+            self._save(conversation)
+            self._evict()
+            return conversation
+
+    def rollback(self, conversation_id: str, messages):
+        """Remove messages added by add_messages (e.g. when no answer could be generated for them).
+
+        Only removed while they are still the latest in the conversation; older
+        turns already folded into the summary to make room for them stay folded.
+        """
+        added = [(m["role"], m["content"]) if isinstance(m, dict) else (m.role, m.content) for m in messages]
+        with self._write_lock, self._lock:
+            conversation = self._load(conversation_id)
+            if conversation is None or not added:
+                return
+            latest = [(m.role, m.content) for m in conversation.messages[-len(added):]]
+            if latest != added:
+                return
+            del conversation.messages[-len(added):]
+            if conversation.messages or conversation.summary:
+                self._save(conversation)
+            else:
+                os.remove(self._path(conversation_id))
+                self._drop(conversation_id)
+
+    def stats(self) -> dict:
+        return {"cached_conversations": len(self._conversations), "cached_bytes": self._total_bytes}
+
+
+conversation_store = ConversationStore()
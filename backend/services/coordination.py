@@ -0,0 +1,114 @@
+import asyncio
+import fcntl
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import structlog
+
+from services.executor import thread_pool
+from services.lexical_index import get_lexical_index
+from services.vector_store import DB_DIR, collection_version, get_store, loaded_namespaces
+
+log = structlog.get_logger()
+
+# Several server processes (gunicorn workers, see gunicorn.conf.py) can serve
+# from the same DB_DIR. Writes to the shared files are serialized by lock
+# files (services.file_lock), whichever worker makes them. Ingestion jobs run
+# on the worker that received them; a whole ingestion holds its namespace's
+# ingest lock (services.manifest.ingest_lock), so jobs and the leader's
+# refresh of the same namespace run one after another. One worker, the
+# leader, holds LEADER_LOCK_PATH and is the only one that re-ingests the
+# default namespace from TEMP_DIR; if it exits the kernel drops its lock and
+# another worker takes over (and catches up on TEMP_DIR) at its next poll.
+# Every VERSION_POLL_INTERVAL seconds each worker also compares the
+# collection_version of the namespaces it has loaded with what it saw last,
+# and reloads the indexes that another worker changed, so the next query
+# doesn't pay for the reload.
+# VERSION_POLL_INTERVAL=0 turns the polling off (a single worker needs none).
+LEADER_LOCK_PATH = os.path.join(DB_DIR, "leader.lock")
+VERSION_POLL_INTERVAL = float(os.getenv("VERSION_POLL_INTERVAL", "1"))
+
+
+class WorkerRole:
+    """Leader election over a non-blocking flock held for the life of the process."""
+
+    def __init__(self, path: str = LEADER_LOCK_PATH):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def elect(self) -> bool:
+        """Become the leader if no other process is; True if this process is the leader."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        log.info("Elected leader worker", pid=os.getpid())
+        return True
+
+    def resign(self):
+        if self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def leader_pid(self) -> Optional[int]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
+    def to_dict(self) -> dict:
+        return {"pid": os.getpid(), "role": "leader" if self.is_leader else "follower",
+                "leader_pid": self.leader_pid()}
+
+
+class VersionWatcher:
+    """Reloads the stores and lexical indexes of loaded namespaces whose collection_version changed."""
+
+    def __init__(self):
+        self._seen: Dict[str, str] = {}
+
+    def poll(self) -> List[str]:
+        changed = []
+        for namespace in loaded_namespaces():
+            version = collection_version(namespace)
+            previous = self._seen.get(namespace)
+            self._seen[namespace] = version
+            if previous is None or previous == version:
+                continue
+            get_store(namespace).refresh()
+            get_lexical_index(namespace).refresh()
+            changed.append(namespace)
+        return changed
+
+
+worker_role = WorkerRole()
+version_watcher = VersionWatcher()
+
+
+async def coordinate(on_elected: Callable[[], Awaitable[None]], interval: float = VERSION_POLL_INTERVAL):
+    """Background loop of every worker: take over as leader if there is none, then poll versions."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not worker_role.is_leader and worker_role.elect():
+                await on_elected()
+            changed = await thread_pool.run(version_watcher.poll)
+            if changed:
+                log.info("Collection changed, indexes refreshed", namespaces=changed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error("Worker coordination failed", error=str(e))
@@ -0,0 +1,105 @@
+import os
+from typing import List
+
+import numpy as np
+import structlog
+
+log = structlog.get_logger()
+
+# CPU embedding backend (EMBED_BACKEND=int8, see services.models). The
+# model's nn.Linear layers, which do most of a transformer's arithmetic, are
+# swapped for dynamically quantized int8 ones: weights are stored as int8 and
+# activations are quantized per batch on the fly, so no calibration data is
+# needed. Inputs are sorted by token length and cut into buckets of at most
+# EMBED_BATCH_TOKENS padded tokens (and EMBED_MAX_BATCH texts), so short
+# chunks go in large batches; a bucket is also closed once less than
+# EMBED_BUCKET_MIN_FILL of it would be real tokens rather than padding.
+# EMBED_THREADS sets torch's intra-op threads (0 keeps torch's default, one
+# per core; lower it when several workers share the machine). Check the
+# agreement with the float model first: python -m benchmarks.embedding_parity
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8192"))
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "128"))
+EMBED_BUCKET_MIN_FILL = float(os.getenv("EMBED_BUCKET_MIN_FILL", "0.9"))
+
+
+def length_buckets(lengths: List[int], batch_tokens: int = EMBED_BATCH_TOKENS, max_batch: int = EMBED_MAX_BATCH,
+                   min_fill: float = EMBED_BUCKET_MIN_FILL) -> List[List[int]]:
+    """Indexes of lengths, shortest first, grouped so no group pads past batch_tokens or below min_fill."""
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    buckets, current, real = [], [], 0
+    for i in order:
+        # Sorted ascending, so lengths[i] is what the whole group pads to
+        padded = (len(current) + 1) * lengths[i]
+        if current and (len(current) == max_batch or padded > batch_tokens
+                        or real + lengths[i] < min_fill * padded):
+            buckets.append(current)
+            current, real = [], 0
+        current.append(i)
+        real += lengths[i]
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def padded_tokens(lengths: List[int], buckets: List[List[int]]) -> int:
+    return sum(len(bucket) * max(lengths[i] for i in bucket) for bucket in buckets)
+
+
+class CPUEncoder:
+    """SentenceTransformer.encode() stand-in that runs the model on CPU in length buckets.
+
+    batch_size is ignored in favour of the token budget; the output matches
+    SentenceTransformer.encode (one float32 row per text, a single row for a str).
+    """
+
+    def __init__(self, model, batch_tokens: int = EMBED_BATCH_TOKENS, max_batch: int = EMBED_MAX_BATCH):
+        self.model = model.eval()
+        self.batch_tokens = batch_tokens
+        self.max_batch = max_batch
+        self.dim = model.get_sentence_embedding_dimension()
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        encoded = self.model.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def encode(self, sentences, batch_size=None, show_progress_bar=False, normalize_embeddings=False, **kwargs):
+        import torch
+
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        if texts:
+            lengths = self.token_lengths(texts)
+            buckets = length_buckets(lengths, self.batch_tokens, self.max_batch)
+            log.debug("Encoding in length buckets", texts=len(texts), buckets=len(buckets),
+                      padding_efficiency=round(sum(lengths) / padded_tokens(lengths, buckets), 3))
+            with torch.inference_mode():
+                for bucket in buckets:
+                    features = self.model.tokenize([texts[i] for i in bucket])
+                    out[bucket] = self.model(features)["sentence_embedding"].float().numpy()
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+def set_threads(threads: int = EMBED_THREADS):
+    import torch
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+
+
+def quantize(model):
+    """Copy of a SentenceTransformer with its nn.Linear layers dynamically quantized to int8."""
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model.to("cpu").eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def load_int8(name: str) -> CPUEncoder:
+    from sentence_transformers import SentenceTransformer
+
+    set_threads()
+    return CPUEncoder(quantize(SentenceTransformer(name, device="cpu")))
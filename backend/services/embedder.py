@@ -1,14 +1,13 @@
-import ollama
 from typing import List
+import numpy as np
 from services.chunker import Chunk
 import structlog
-from sentence_transformers import SentenceTransformer
-model = SentenceTransformer("all-mpnet-base-v2")
+from services.models import EMBED_MODEL, cache_name, get_model
+from services.embedding_cache import get_cache
+from services.metrics import record_cache
 
 log = structlog.get_logger()
-client = ollama.Client()            # Updated import for ollama-sdk
 # EMBED_MODEL = "nomic-embed-text"
-EMBED_MODEL = "all-mpnet-base-v2"  # New model name for embeddings
 # def embed_chunks(chunks: List[Chunk]) -> List[dict]:
 #     texts = [c.text for c in chunks]
 #     log.info("Creating embeddings batch", model=EMBED_MODEL, batch_size=len(texts))
@@ -45,11 +44,31 @@ EMBED_MODEL = "all-mpnet-base-v2"  # New model name for embeddings
 #         })
 #     return results
 
-def embed_chunks(chunks: List[Chunk]) -> List[dict]:
+def encode_cached(texts: List[str]) -> List[List[float]]:
+    """Encode texts, sending only embedding-cache misses to the model."""
+    if not texts:
+        return []
+    cache = get_cache(cache_name(EMBED_MODEL))
+    vectors = cache.get_many(texts)
+    misses = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    log.info("Embedding cache lookup", model=EMBED_MODEL, hits=len(texts) - len(misses), misses=len(misses))
+    record_cache("embedding", True, len(texts) - len(misses))
+    record_cache("embedding", False, len(misses))
+    encoded = {}
+    if misses:
+        new_vectors = get_model(EMBED_MODEL).encode(misses, show_progress_bar=True)
+        encoded = dict(zip(misses, new_vectors))
+        cache.put_many(misses, new_vectors)
+    else:
+        cache.flush()
+    return np.vstack([v if v is not None else encoded[t] for t, v in zip(texts, vectors)]).tolist()
+
+def embed_chunks(chunks: List[Chunk], start_index: int = 0) -> List[dict]:
+    """start_index numbers the ids when a document is embedded in several batches."""
     texts = [c.text for c in chunks]
-    embeddings = model.encode(texts, show_progress_bar=True).tolist()
+    embeddings = encode_cached(texts)
     results = []
-    for idx, (chunk, emb) in enumerate(zip(chunks, embeddings)):
+    for idx, (chunk, emb) in enumerate(zip(chunks, embeddings), start_index):
         results.append({
             "id": f"{chunk.metadata['doc_id']}-{idx}",
             "embedding": emb,
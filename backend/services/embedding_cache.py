@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import structlog
+
+from services.file_lock import InterProcessLock
+from services.vector_store import DB_DIR
+
+log = structlog.get_logger()
+
+# Chunk embeddings are cached on disk per model, keyed by the SHA-256 of the
+# chunk text. Vectors live in a memory-mapped .npy matrix; index.json maps
+# each key to its row and a last-used tick for LRU eviction. Worker processes
+# share the files and first reload the index if another process rewrote it:
+# writes hold write.lock exclusively, lookups hold it shared, so lookups from
+# several processes run side by side but a row is never read through a stale
+# map while a writer reuses it. Rows freed by eviction are only reused once
+# the index without them has been saved. Lookups only note their hits in this
+# process; the hits become last-used ticks under the exclusive lock, after
+# reloading the index, when this process next writes (put_many or flush), so
+# ticks are never raced on and a reload cannot drop them.
+CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(DB_DIR, "embedding_cache"))
+MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "200000"))
+CACHE_DTYPE = np.dtype(os.getenv("EMBED_CACHE_DTYPE", "float32"))
+INITIAL_CAPACITY = 1024
+EVICT_FRACTION = 0.1  # share of entries dropped when the cache is full
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, root: str = CACHE_DIR, max_entries: int = MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.dir = os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        self.vectors_path = os.path.join(self.dir, "vectors.npy")
+        self.index_path = os.path.join(self.dir, "index.json")
+        self._lock = threading.Lock()
+        self._write_lock = InterProcessLock(os.path.join(self.dir, "write.lock"))
+        self._read_lock = InterProcessLock(os.path.join(self.dir, "write.lock"), shared=True)
+        self._index_mtime = None
+        self._vectors = None
+        self._rows: Dict[str, List[int]] = {}  # key -> [row, last_used_tick]
+        self._free: List[int] = []
+        self._tick = 0
+        self._hits: "OrderedDict[str, None]" = OrderedDict()  # keys hit since the last write, oldest first
+        self._load()
+
+    def _load(self):
+        os.makedirs(self.dir, exist_ok=True)
+        self._vectors, self._rows, self._free, self._tick = None, {}, [], 0
+        self._index_mtime = self._stat_index()
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.index_path)):
+            return
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                state = json.load(f)
+            self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+            self._rows = state["rows"]
+            self._free = state["free"]
+            self._tick = state["tick"]
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("Discarding unreadable embedding cache", path=self.dir, error=str(e))
+            self._vectors, self._rows, self._free, self._tick = None, {}, [], 0
+
+    def _stat_index(self):
+        try:
+            return os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _sync(self):
+        """Reload if another process rewrote the index since we last read or wrote it."""
+        if self._stat_index() != self._index_mtime:
+            self._load()
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"rows": self._rows, "free": self._free, "tick": self._tick}, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = self._stat_index()
+
+    def _merge_hits(self) -> bool:
+        """Turn this process's hits into last-used ticks; under the write lock, after _sync. True if any."""
+        merged = False
+        for key in self._hits:
+            entry = self._rows.get(key)
+            if entry is not None:
+                self._tick += 1
+                entry[1] = self._tick
+                merged = True
+        self._hits.clear()
+        return merged
+
+    def _grow(self, dim: int, needed: int):
+        old = self._vectors
+        used = 0 if old is None else old.shape[0]
+        capacity = max(INITIAL_CAPACITY, used)
+        while capacity < used + needed and capacity < self.max_entries:
+            capacity *= 2
+        capacity = min(capacity, self.max_entries)
+        if capacity <= used:
+            return
+        tmp_path = f"{self.vectors_path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=CACHE_DTYPE, shape=(capacity, dim))
+        if old is not None:
+            grown[:used] = old
+            del old
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.vectors_path)
+        self._vectors = np.load(self.vectors_path, mmap_mode="r+")
+        self._free.extend(range(used, capacity))
+
+    def _evict(self, needed: int):
+        count = max(needed - len(self._free), int(self.max_entries * EVICT_FRACTION))
+        oldest = sorted(self._rows.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self._rows[key]
+            self._free.append(row)
+        log.info("Evicted embedding cache entries", model=self.model_name, evicted=len(oldest))
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        results: List[Optional[np.ndarray]] = []
+        with self._read_lock, self._lock:
+            self._sync()
+            for text in texts:
+                key = text_key(text)
+                entry = self._rows.get(key)
+                if entry is None or self._vectors is None:
+                    results.append(None)
+                    continue
+                self._hits.pop(key, None)
+                self._hits[key] = None
+                # A copy: the row may be reused for another text once the lock is released
+                results.append(np.array(self._vectors[entry[0]], dtype=np.float32, copy=True))
+        return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors)
+        if len(texts) == 0:
+            return
+        with self._write_lock, self._lock:
+            self._sync()
+            self._merge_hits()
+            new = {}
+            for text, vec in zip(texts, vectors):
+                key = text_key(text)
+                if key not in self._rows:
+                    new[key] = vec
+            if new:
+                needed = min(len(new), self.max_entries)
+                if len(self._free) < needed:
+                    self._grow(vectors.shape[1], needed - len(self._free))
+                if len(self._free) < needed:
+                    self._evict(needed)
+                    self._save_index()
+                for key, vec in list(new.items())[:needed]:
+                    row = self._free.pop()
+                    self._vectors[row] = vec
+                    self._tick += 1
+                    self._rows[key] = [row, self._tick]
+                self._vectors.flush()
+            self._save_index()
+
+    def flush(self):
+        """Persist the hits since the last write as LRU ticks."""
+        if not self._hits:
+            return
+        with self._write_lock, self._lock:
+            self._sync()
+            if self._merge_hits():
+                self._save_index()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(model_name: str) -> EmbeddingCache:
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            cache = _caches[model_name] = EmbeddingCache(model_name)
+        return cache
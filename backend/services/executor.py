@@ -0,0 +1,157 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import structlog
+
+log = structlog.get_logger()
+
+# Blocking work (LLM calls, embedding, vector store I/O) runs on the thread
+# pool; pure-Python CPU work (PDF parsing) runs on the process pool. Each
+# pool caps how many tasks may run at once and reports how many are queued.
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "8"))
+THREAD_POOL_CONCURRENCY = int(os.getenv("THREAD_POOL_CONCURRENCY", str(THREAD_POOL_SIZE)))
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", str(max(1, (os.cpu_count() or 2) - 1))))
+PROCESS_POOL_CONCURRENCY = int(os.getenv("PROCESS_POOL_CONCURRENCY", str(PROCESS_POOL_SIZE)))
+# Short retrieval side-tasks (lexical search) started from inside thread-pool
+# work; a separate pool so they can never wait behind their own caller.
+SEARCH_POOL_SIZE = int(os.getenv("SEARCH_POOL_SIZE", "4"))
+
+
+class WorkerPool:
+    def __init__(self, name: str, factory: Callable[[int], Executor], max_workers: int, max_concurrency: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self._factory = factory
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Synchronous submit() callers block on _slots, run() callers await _async_slots;
+        # each pool here is driven from one side only
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._counter_lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self._factory(self.max_workers)
+                    log.info("Started worker pool", pool=self.name, workers=self.max_workers)
+        return self._executor
+
+    def _count(self, waiting: int = 0, running: int = 0):
+        with self._counter_lock:
+            self.waiting += waiting
+            self.running += running
+
+    def _acquire(self):
+        self._count(waiting=1)
+        self._slots.acquire()
+        self._count(waiting=-1, running=1)
+
+    def _release(self, _future=None):
+        self._count(running=-1)
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Submit from synchronous code; blocks while the pool is at its concurrency limit."""
+        self._acquire()
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def map(self, fn, items) -> list:
+        futures = [self.submit(fn, item) for item in items]
+        return [f.result() for f in futures]
+
+    def _loop_slots(self) -> asyncio.Semaphore:
+        # Async callers wait on the event loop instead of on a thread semaphore
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_slots = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_slots
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn on the pool without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        slots = self._loop_slots()
+        self._count(waiting=1)
+        try:
+            await slots.acquire()
+        finally:
+            self._count(waiting=-1)
+        self._count(running=1)
+        try:
+            future = self.executor.submit(functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            self._count(running=-1)
+            slots.release()
+            raise
+
+        def release(_future):
+            # The slot is only freed once fn is done, even if the caller was cancelled meanwhile
+            self._count(running=-1)
+            try:
+                loop.call_soon_threadsafe(slots.release)
+            except RuntimeError:
+                pass  # the loop is closed; nothing waits on its semaphore any more
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "waiting": self.waiting,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+thread_pool = WorkerPool(
+    "thread",
+    lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="rag-worker"),
+    THREAD_POOL_SIZE,
+    THREAD_POOL_CONCURRENCY,
+)
+# "spawn" keeps children from inheriting torch/tokenizer thread state of the server process
+process_pool = WorkerPool(
+    "process",
+    lambda n: ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn")),
+    PROCESS_POOL_SIZE,
+    PROCESS_POOL_CONCURRENCY,
+)
+search_pool = WorkerPool(
+    "search",
+    lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="rag-search"),
+    SEARCH_POOL_SIZE,
+    SEARCH_POOL_SIZE,
+)
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    return {pool.name: pool.stats() for pool in (thread_pool, process_pool, search_pool)}
+
+
+def shutdown_pools():
+    for pool in (thread_pool, process_pool, search_pool):
+        pool.shutdown()
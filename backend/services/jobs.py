@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+
+import structlog
+
+from services.executor import thread_pool
+from services.vector_store import DB_DIR, DEFAULT_NAMESPACE
+
+log = structlog.get_logger()
+
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("INGEST_MAX_QUEUED_JOBS", "100"))
+JOB_RETENTION = 3600  # seconds a finished job stays queryable
+# Job state is mirrored to JOBS_DIR/<job_id>.json, so every worker process can
+# report on (and cancel) a job that another one is running. The running
+# worker writes progress at most every JOB_STATE_INTERVAL seconds and picks up
+# a <job_id>.cancel marker left by another worker at the same time.
+JOBS_DIR = os.getenv("INGEST_JOBS_DIR", os.path.join(DB_DIR, "ingest_jobs"))
+JOB_STATE_INTERVAL = 0.5
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+# Pipeline stages overlap, so a file's stage only ever moves forward
+STAGE_ORDER = ("queued", "parsing", "chunking", "embedding", "writing", "written", "skipped")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class FileProgress:
+    stage: str = "queued"
+    pages: int = 0
+    page_errors: int = 0
+    chunks: int = 0
+    chunks_embedded: int = 0
+    vectors_written: int = 0
+
+
+@dataclass
+class IngestJob:
+    files: List[str]
+    namespace: str = DEFAULT_NAMESPACE
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict[str, FileProgress] = field(default_factory=dict)
+    worker_pid: int = field(default_factory=os.getpid)
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def __post_init__(self):
+        self.progress = {path: FileProgress() for path in self.files}
+
+    def report(self, path: str, stage: str, **counts):
+        """Progress callback for RAGPipeline.ingest; doubles as the cancellation checkpoint."""
+        file_progress = self.progress.setdefault(path, FileProgress())
+        if STAGE_ORDER.index(stage) > STAGE_ORDER.index(file_progress.stage):
+            file_progress.stage = stage
+        for name, value in counts.items():
+            setattr(file_progress, name, value)
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.job_id)
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "namespace": self.namespace,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "worker_pid": self.worker_pid,
+            "files": {path: asdict(p) for path, p in self.progress.items()},
+        }
+
+
+def _worker_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return False  # not one of our jobs, so left over from an earlier process with this pid
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class IngestJobManager:
+    """Runs ingestion jobs on a fixed number of background workers.
+
+    ingest_fn(files, progress, namespace) does the actual (blocking) work on the thread pool.
+    Jobs run in the process they were submitted to; the others see them through state_dir.
+    """
+
+    def __init__(self, ingest_fn: Callable, workers: int = INGEST_JOB_WORKERS, max_queued: int = MAX_QUEUED_JOBS,
+                 state_dir: str = JOBS_DIR):
+        self.ingest_fn = ingest_fn
+        self.workers = workers
+        self.max_queued = max_queued
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.jobs: Dict[str, IngestJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queued)
+            self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+            log.info("Started ingestion workers", workers=self.workers)
+
+    def submit(self, files: List[str], namespace: str = DEFAULT_NAMESPACE) -> IngestJob:
+        self._ensure_workers()
+        self._expire()
+        job = IngestJob(files=files, namespace=namespace)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull(f"{self.max_queued} ingestion jobs already queued")
+        self.jobs[job.job_id] = job
+        self._save(job)
+        log.info("Queued ingestion job", job_id=job.job_id, namespace=namespace, files=files)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        """to_dict() of a job submitted to any worker process, None if unknown or expired."""
+        job = self.jobs.get(job_id)
+        return job.to_dict() if job is not None else self._load_state(job_id)
+
+    def list(self) -> List[dict]:
+        states = {job_id: job.to_dict() for job_id, job in self.jobs.items()}
+        for name in sorted(os.listdir(self.state_dir)):
+            job_id = name[:-len(".json")]
+            if name.endswith(".json") and job_id not in states:
+                state = self._load_state(job_id)
+                if state is not None:
+                    states[job_id] = state
+        return sorted(states.values(), key=lambda state: state["created_at"])
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            # Running in another worker: leave it a marker to find at its next progress report
+            state = self._load_state(job_id)
+            if state is not None and state["status"] not in FINISHED_STATES:
+                open(self._state_path(job_id, ".cancel"), "a").close()
+                log.info("Cancellation requested", job_id=job_id, worker_pid=state["worker_pid"])
+            return state
+        if job.status not in FINISHED_STATES:
+            job.cancel_event.set()
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+            log.info("Cancellation requested", job_id=job_id)
+        return job.to_dict()
+
+    def queue_depth(self) -> int:
+        return 0 if self._queue is None else self._queue.qsize()
+
+    def _finish(self, job: IngestJob, status: str, error: str = None):
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        self._save(job)
+
+    def _expire(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self.jobs[job_id]
+        for name in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff and name[:32] not in self.jobs:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # -- shared state --------------------------------------------------------
+
+    def _state_path(self, job_id: str, suffix: str = ".json") -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            raise ValueError(f"Invalid job id {job_id!r}")
+        return os.path.join(self.state_dir, job_id + suffix)
+
+    def _save(self, job: IngestJob):
+        path = self._state_path(job.job_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _load_state(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                state = json.load(f)
+        except (ValueError, OSError):
+            return None
+        if state["status"] not in FINISHED_STATES and not _worker_alive(state["worker_pid"]):
+            state.update(status="failed", error="The worker running the job exited")
+        return state
+
+    def _cancel_requested(self, job: IngestJob) -> bool:
+        return os.path.exists(self._state_path(job.job_id, ".cancel"))
+
+    def _reporter(self, job: IngestJob) -> Callable:
+        """job.report, also writing the job's state (and checking for a cancel marker) now and then."""
+        lock = threading.Lock()
+        last_saved = [time.monotonic()]
+
+        def report(path: str, stage: str, **counts):
+            now = time.monotonic()
+            if now - last_saved[0] >= JOB_STATE_INTERVAL and lock.acquire(blocking=False):
+                try:
+                    last_saved[0] = now
+                    if self._cancel_requested(job):
+                        job.cancel_event.set()
+                    self._save(job)
+                finally:
+                    lock.release()
+            job.report(path, stage, **counts)
+
+        return report
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.status != "queued":
+                    continue
+                if self._cancel_requested(job):
+                    raise JobCancelled(job.job_id)
+                job.status = "running"
+                job.started_at = time.time()
+                self._save(job)
+                log.info("Ingestion job started", job_id=job.job_id, worker=worker_id)
+                await thread_pool.run(self.ingest_fn, job.files, self._reporter(job), job.namespace)
+                self._finish(job, "completed")
+                log.info("Ingestion job completed", job_id=job.job_id,
+                         seconds=round(job.finished_at - job.started_at, 2))
+            except JobCancelled:
+                self._finish(job, "cancelled")
+                log.info("Ingestion job cancelled", job_id=job.job_id)
+            except Exception as e:
+                self._finish(job, "failed", str(e))
+                log.error("Ingestion job failed", job_id=job.job_id, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self):
+        for job in self.jobs.values():
+            if job.status not in FINISHED_STATES:
+                job.cancel_event.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
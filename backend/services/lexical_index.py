@@ -0,0 +1,344 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import structlog
+
+from services.file_lock import InterProcessLock
+from services.vector_store import DB_DIR, DEFAULT_NAMESPACE, NamespaceLRU, namespace_dir
+
+log = structlog.get_logger()
+
+# BM25 inverted index over the same chunks that go into the vector store.
+# Postings live in memory; the chunk texts stay on disk in an append-only
+# operations log that is replayed on start-up:
+#
+#   {"op": "add", "id", "doc_id", "terms": {term: tf}, "document", "metadata"}
+#   {"op": "delete", "doc_id"}
+#
+# Writers (in any process) hold ops.lock and replay what others appended
+# first; readers tail the log to pick up changes. Once most of it is dead
+# (deleted or replaced chunks) it is rewritten with only the live chunks.
+# Chunk texts are read through the log file we replayed, held open, so the
+# offsets stay valid while another process swaps in a compacted log.
+#
+# A query scores its terms' postings as NumPy arrays (cached per term until
+# the term's postings change) outside the lock, so searches run in parallel
+# with each other. Terms found in more than LEXICAL_MAX_DF of the chunks are
+# skipped: they add little to BM25 but would scan most of the index.
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(DB_DIR, "lexical_index"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_MIN_DEAD = 1024  # rewrite the log once this many chunks are dead and they outnumber live ones
+RRF_K = 60  # reciprocal-rank fusion damping constant
+LEXICAL_MAX_DF = float(os.getenv("LEXICAL_MAX_DF", "0.5"))
+TERM_CACHE_SIZE = 4096  # query terms whose postings are kept as arrays
+
+# Words, plus identifiers such as "AB-1234" or "v2.3.1" kept whole
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._/:-][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms; compound identifiers also yield their parts."""
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class LexicalIndex:
+    def __init__(self, path: str = LEXICAL_INDEX_DIR):
+        self.path = path
+        self.log_path = os.path.join(path, "ops.jsonl")
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._write_lock = InterProcessLock(os.path.join(path, "ops.lock"))
+        self._epoch = 0  # bumped whenever slots are renumbered
+        self._reset()
+        self.refresh()
+
+    def _reset(self):
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {slot: tf}
+        self._slots: Dict[int, Tuple[str, str, int, int, List[str]]] = {}  # slot -> (id, doc_id, length, offset, terms)
+        self._slot_by_id: Dict[str, int] = {}
+        self._slots_by_doc: Dict[str, List[int]] = {}
+        self._lengths = np.zeros(1024, dtype=np.float32)  # slot -> chunk length in terms
+        self._term_arrays: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()  # term -> (slots, tfs)
+        self._epoch += 1
+        self._next_slot = 0
+        self._total_length = 0
+        self._dead = 0
+        self._log_offset = 0
+        self._log_inode = None
+        if getattr(self, "_log_file", None) is not None:
+            self._log_file.close()  # only read under self._lock, like the slots it belongs to
+        self._log_file = None
+
+    # -- in-memory postings --------------------------------------------------
+
+    def _apply_add(self, op: dict, offset: int):
+        if op["id"] in self._slot_by_id:
+            self._drop_slot(self._slot_by_id[op["id"]])
+        slot = self._next_slot
+        self._next_slot += 1
+        terms = op["terms"]
+        length = sum(terms.values())
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[slot] = tf
+            self._term_arrays.pop(term, None)
+        if slot >= len(self._lengths):
+            # A new array, not a resize: searches may still be reading the old one
+            lengths = np.zeros(2 * len(self._lengths), dtype=np.float32)
+            lengths[:len(self._lengths)] = self._lengths
+            self._lengths = lengths
+        self._lengths[slot] = length
+        self._slots[slot] = (op["id"], op["doc_id"], length, offset, list(terms))
+        self._slot_by_id[op["id"]] = slot
+        self._slots_by_doc.setdefault(op["doc_id"], []).append(slot)
+        self._total_length += length
+
+    def _drop_slot(self, slot: int):
+        id_, doc_id, length, _, terms = self._slots.pop(slot)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[slot]
+            self._term_arrays.pop(term, None)
+            if not postings:
+                del self._postings[term]
+        del self._slot_by_id[id_]
+        doc_slots = self._slots_by_doc.get(doc_id)
+        if doc_slots is not None and slot in doc_slots:
+            doc_slots.remove(slot)
+        self._total_length -= length
+        self._dead += 1
+
+    def _apply_delete(self, doc_id: str):
+        for slot in self._slots_by_doc.pop(doc_id, []):
+            if slot in self._slots:
+                self._drop_slot(slot)
+
+    def _apply(self, op: dict, offset: int):
+        if op["op"] == "add":
+            self._apply_add(op, offset)
+        elif op["op"] == "delete":
+            self._apply_delete(op["doc_id"])
+
+    # -- log -----------------------------------------------------------------
+
+    def refresh(self):
+        """Replay log entries written since we last looked (by us or another process)."""
+        with self._lock:
+            try:
+                stat = os.stat(self.log_path)
+            except FileNotFoundError:
+                if self._log_inode is not None:
+                    self._reset()
+                return
+            if stat.st_ino != self._log_inode or stat.st_size < self._log_offset:
+                if self._log_inode is not None:
+                    log.info("Reloading lexical index", path=self.path)
+                self._reset()
+                if not self._open_log():
+                    return
+            if stat.st_size == self._log_offset:
+                return
+            f = self._log_file
+            f.seek(self._log_offset)
+            offset = self._log_offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # a writer is mid-append; pick it up next time
+                self._apply(json.loads(line), offset)
+                offset += len(line)
+            self._log_offset = offset
+
+    def _open_log(self) -> bool:
+        """Open the log for reading; False if it is gone. Its inode is the one opened, even if replaced meanwhile."""
+        try:
+            self._log_file = open(self.log_path, "rb")
+        except FileNotFoundError:
+            return False
+        self._log_inode = os.fstat(self._log_file.fileno()).st_ino
+        return True
+
+    def _append(self, ops: List[dict]):
+        with open(self.log_path, "ab") as f:
+            offset = f.tell()
+            lines = [json.dumps(op).encode("utf-8") + b"\n" for op in ops]
+            f.write(b"".join(lines))
+        if self._log_file is None:
+            self._open_log()
+        for op, line in zip(ops, lines):
+            self._apply(op, offset)
+            offset += len(line)
+        self._log_offset = offset
+
+    def add(self, vectors: List[Dict]):
+        """Index chunks in the add_embeddings format ({"id", "metadata", "text", ...})."""
+        ops = [{
+            "op": "add",
+            "id": v["id"],
+            "doc_id": v["metadata"].get("doc_id"),
+            "terms": dict(Counter(tokenize(v["text"]))),
+            "document": v["text"],
+            "metadata": v["metadata"],
+        } for v in vectors]
+        if not ops:
+            return
+        with self._write_lock, self._lock:
+            self.refresh()
+            self._append(ops)
+
+    def delete_document(self, doc_id: str):
+        with self._write_lock, self._lock:
+            self.refresh()
+            if doc_id not in self._slots_by_doc:
+                return
+            self._append([{"op": "delete", "doc_id": doc_id}])
+            if self._dead >= COMPACT_MIN_DEAD and self._dead > len(self._slots):
+                self.compact()
+
+    def compact(self):
+        """Rewrite the log with only the live chunks."""
+        with self._write_lock, self._lock:
+            self.refresh()
+            ops = self._read_ops(sorted(self._slots))
+            tmp_path = f"{self.log_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                for op in ops:
+                    f.write(json.dumps(op).encode("utf-8") + b"\n")
+            os.replace(tmp_path, self.log_path)
+            log.info("Compacted lexical index", live=len(ops), dropped=self._dead)
+            self._reset()
+            self.refresh()
+
+    def clear(self):
+        with self._write_lock, self._lock:
+            try:
+                os.remove(self.log_path)
+            except FileNotFoundError:
+                pass
+            self._reset()
+
+    def _read_ops(self, slots: List[int]) -> List[dict]:
+        ops = []
+        for slot in slots:
+            self._log_file.seek(self._slots[slot][3])
+            ops.append(json.loads(self._log_file.readline()))
+        return ops
+
+    # -- search --------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _query_postings(self, terms, n: int) -> List[Tuple[float, np.ndarray, np.ndarray]]:
+        """(idf, slots, tfs) of the query terms to score; the arrays are never modified once built."""
+        found = sorted((len(self._postings[term]), term) for term in terms if term in self._postings)
+        # If every term is that common, the rarest still ranks something
+        selected = [(df, term) for df, term in found if df <= LEXICAL_MAX_DF * n] or found[:1]
+        postings = []
+        for df, term in selected:
+            arrays = self._term_arrays.get(term)
+            if arrays is None:
+                term_postings = self._postings[term]
+                arrays = self._term_arrays[term] = (
+                    np.fromiter(term_postings.keys(), dtype=np.int64, count=df),
+                    np.fromiter(term_postings.values(), dtype=np.float32, count=df),
+                )
+                while len(self._term_arrays) > TERM_CACHE_SIZE:
+                    self._term_arrays.popitem(last=False)
+            else:
+                self._term_arrays.move_to_end(term)
+            postings.append((math.log(1 + (n - df + 0.5) / (df + 0.5)), *arrays))
+        return postings
+
+    def _results(self, best: List[Tuple[int, float]]) -> List[Dict]:
+        # Chunks deleted since scoring are left out
+        best = [(slot, score) for slot, score in best if slot in self._slots]
+        ops = self._read_ops([slot for slot, _ in best])
+        return [
+            {"id": op["id"], "document": op["document"], "metadata": op["metadata"], "score": score}
+            for op, (_, score) in zip(ops, best)
+        ]
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """BM25 top_k as [{"id", "document", "metadata", "score"}], best first."""
+        terms = set(tokenize(query))
+        for hold_lock in (False, True):
+            with self._lock:
+                self.refresh()
+                n = len(self._slots)
+                if not n:
+                    return []
+                epoch = self._epoch
+                postings = self._query_postings(terms, n)
+                lengths, avg_length = self._lengths, self._total_length / n
+                if hold_lock:
+                    # The slots were renumbered while we scored; this time keep them still
+                    return self._results(bm25_top(postings, lengths, avg_length, top_k))
+            best = bm25_top(postings, lengths, avg_length, top_k)
+            with self._lock:
+                if self._epoch == epoch:
+                    return self._results(best)
+
+
+def bm25_top(postings: List[Tuple[float, np.ndarray, np.ndarray]], lengths: np.ndarray, avg_length: float,
+             top_k: int) -> List[Tuple[int, float]]:
+    """The top_k (slot, BM25 score) pairs, best first, summed over the (idf, slots, tfs) of each term."""
+    if not postings or top_k <= 0:
+        return []
+    slots = np.concatenate([term_slots for _, term_slots, _ in postings])
+    weights = []
+    for idf, term_slots, tfs in postings:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[term_slots] / avg_length)
+        weights.append(idf * tfs * (BM25_K1 + 1) / (tfs + norm))
+    scores = np.bincount(slots, weights=np.concatenate(weights))
+    matched = np.flatnonzero(scores)
+    k = min(top_k, len(matched))
+    if k == 0:
+        return []
+    best = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+    best = best[np.lexsort((best, -scores[best]))]  # ties: the earlier indexed chunk first
+    return [(int(slot), float(scores[slot])) for slot in best]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], top_k: int, k: int = RRF_K) -> List[Dict]:
+    """Merge ranked result lists (dicts with an "id") by summing 1 / (k + rank).
+
+    Fields of the same id are merged across lists (earlier lists win), and the
+    fused score is stored as "fusion_score".
+    """
+    scores: Dict[str, float] = {}
+    items: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item["id"]] = scores.get(item["id"], 0.0) + 1.0 / (k + rank)
+            items[item["id"]] = {**item, **items.get(item["id"], {})}
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [{**items[id_], "fusion_score": scores[id_]} for id_ in best]
+
+
+def _open_index(namespace: str) -> LexicalIndex:
+    if namespace == DEFAULT_NAMESPACE:
+        index = LexicalIndex()
+    else:
+        index = LexicalIndex(os.path.join(namespace_dir(namespace), "lexical_index"))
+    log.info("Opened lexical index", namespace=namespace, chunks=len(index))
+    return index
+
+
+_indexes = NamespaceLRU(_open_index, kind="lexical_index")
+
+
+def get_lexical_index(namespace: str = DEFAULT_NAMESPACE) -> LexicalIndex:
+    return _indexes.get(namespace)
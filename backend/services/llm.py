@@ -21,26 +21,42 @@
 
 
 
-from sentence_transformers import SentenceTransformer
+import os
 from services.prompt import build_prompt
 from services.logger import log
-import ollama  # still used for LLM chat
+from services.models import EMBED_MODEL, get_model
+from services.batcher import MicroBatcher
+from services.llm_gateway import llm_gateway
+from services.metrics import stage_timer
 
 LLM_MODEL = "llama3"                      # You can keep using Ollama for chat
-EMBED_MODEL = "all-mpnet-base-v2"         # New model name for embeddings
 
-# Load the embedding model once
-embedding_model = SentenceTransformer(EMBED_MODEL)
+# Concurrent query embeddings are encoded together in one forward pass
+QUERY_EMBED_BATCH_SIZE = int(os.getenv("QUERY_EMBED_BATCH_SIZE", "32"))
+QUERY_EMBED_BATCH_WAIT_MS = float(os.getenv("QUERY_EMBED_BATCH_WAIT_MS", "5"))
+
+
+def _encode_queries(texts: list[str]) -> list[list[float]]:
+    log.info("Embedding query batch", model=EMBED_MODEL, batch_size=len(texts))
+    return get_model(EMBED_MODEL).encode(texts).tolist()
+
+
+query_batcher = MicroBatcher(_encode_queries, QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_BATCH_WAIT_MS, name="query-embed")
 
 def embed_query(text: str) -> list[float]:
-    log.info("Embedding query using all-mpnet-base-v2")
-    return embedding_model.encode(text).tolist()
+    with stage_timer("query_embed"):
+        return query_batcher.submit(text)
 
-def generate_answer(chunks: list, query: str, stream: bool = False):
+def build_messages(chunks: list, query: str, history: list = None) -> list[dict]:
+    """history: earlier {"role", "content"} chat messages, placed between the system prompt and the query."""
     prompt = build_prompt(chunks, query)
-    log.info("Sending prompt to LLM", model=LLM_MODEL)
-    messages = [
+    log.info("Sending prompt to LLM", model=LLM_MODEL, history_messages=len(history or []))
+    return [
         {"role": "system", "content": prompt},
+        *(history or []),
         {"role": "user", "content": query}
     ]
-    return ollama.chat(model=LLM_MODEL, messages=messages, stream=stream)
+
+def astream_answer(chunks: list, query: str, history: list = None):
+    """Async iterator over answer tokens."""
+    return llm_gateway.stream_chat(LLM_MODEL, build_messages(chunks, query, history))
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+import structlog
+
+from services.metrics import observe_stage
+
+log = structlog.get_logger()
+
+# Async access to the Ollama chat API from the event loop. One pooled HTTP
+# client is shared by all requests; at most LLM_MAX_INFLIGHT generations run
+# at once, at most LLM_MAX_WAITING more may wait for a slot, and anything
+# beyond that is rejected immediately (LLMOverloaded -> HTTP 503) instead of
+# queueing on the Ollama host. Every call has a deadline (LLMTimeout -> 504).
+# Time-to-first-token and total generation time are measured from the call,
+# so they include any wait for a slot (reported separately as llm_queue_wait).
+OLLAMA_BASE_URL = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "4"))
+LLM_MAX_WAITING = int(os.getenv("LLM_MAX_WAITING", "16"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "120"))  # seconds, whole generation incl. waiting
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", str(LLM_MAX_INFLIGHT)))
+
+
+class LLMOverloaded(Exception):
+    pass
+
+
+class LLMTimeout(Exception):
+    pass
+
+
+class LLMGateway:
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, max_inflight: int = LLM_MAX_INFLIGHT,
+                 max_waiting: int = LLM_MAX_WAITING, deadline: float = LLM_DEADLINE):
+        self.base_url = base_url
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.deadline = deadline
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.inflight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=LLM_POOL_CONNECTIONS,
+                                    max_keepalive_connections=LLM_POOL_CONNECTIONS),
+                timeout=httpx.Timeout(None, connect=LLM_CONNECT_TIMEOUT),
+            )
+            self._slots = asyncio.Semaphore(self.max_inflight)
+            log.info("Started LLM gateway", base_url=self.base_url, max_inflight=self.max_inflight,
+                     max_waiting=self.max_waiting)
+        return self._client
+
+    async def _acquire(self, expires_at: float):
+        client = self.client
+        started = time.perf_counter()
+        # Counted here rather than via the semaphore, which only updates once the waiter runs
+        if self.inflight + self.waiting >= self.max_inflight + self.max_waiting:
+            self.rejected += 1
+            raise LLMOverloaded(f"{self.inflight} generations running and {self.waiting} waiting")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, expires_at - time.monotonic()))
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LLMTimeout("Deadline passed while waiting for a free LLM slot")
+        finally:
+            self.waiting -= 1
+        observe_stage("llm_queue_wait", time.perf_counter() - started)
+        self.inflight += 1
+        return client
+
+    def _release(self):
+        self.inflight -= 1
+        self._slots.release()
+
+    async def stream_chat(self, model: str, messages: List[Dict[str, str]],
+                          deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Answer tokens as Ollama streams them (NDJSON lines of /api/chat)."""
+        started = time.perf_counter()
+        expires_at = time.monotonic() + (deadline or self.deadline)
+        client = await self._acquire(expires_at)
+        first_token = True
+        try:
+            request = client.build_request("POST", "/api/chat",
+                                           json={"model": model, "messages": messages, "stream": True})
+            response = await asyncio.wait_for(client.send(request, stream=True),
+                                              timeout=max(0.0, expires_at - time.monotonic()))
+            try:
+                response.raise_for_status()
+                lines = response.aiter_lines()
+                while True:
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(),
+                                                      timeout=max(0.0, expires_at - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    if not line:
+                        continue
+                    part = json.loads(line)
+                    if part.get("error"):
+                        raise RuntimeError(part["error"])
+                    content = part.get("message", {}).get("content")
+                    if content:
+                        if first_token:
+                            observe_stage("llm_ttft", time.perf_counter() - started)
+                            first_token = False
+                        yield content
+                    if part.get("done"):
+                        break
+                observe_stage("llm_generation", time.perf_counter() - started)
+            finally:
+                await response.aclose()
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise LLMTimeout(f"LLM generation exceeded its {deadline or self.deadline}s deadline")
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_inflight": self.max_inflight,
+            "max_waiting": self.max_waiting,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+llm_gateway = LLMGateway()
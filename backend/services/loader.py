@@ -1,37 +1,120 @@
 import os
-from typing import List
-from docx import Document
+import time
+from collections import deque
+from typing import Iterator, List, Optional, Tuple
 import structlog
-import pdfplumber
+from services.metrics import observe_stage
 log = structlog.get_logger()
 
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+# Large PDFs are split into page ranges of this size for parallel extraction
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "20"))
+PARALLEL_PDF_LOADING = os.getenv("PARALLEL_PDF_LOADING", "1") == "1"
+
+# (page number, text, error or None)
+PageResult = Tuple[int, str, Optional[str]]
+
+
+def _extract_pdf_pages(path: str, start: int = 0, end: Optional[int] = None) -> List[PageResult]:
+    """Extract pages [start, end); a failing page yields empty text and an error instead of aborting."""
+    import pdfplumber  # imported where used: parsing runs in pool workers, not at server import
+
+    results = []
+    with pdfplumber.open(path) as pdf:
+        for i, page in enumerate(pdf.pages[start:end], start):
+            try:
+                results.append((i, page.extract_text() or "", None))
+            except Exception as e:
+                log.warning("PDF page extraction failed", path=path, page=i, error=str(e))
+                results.append((i, "", str(e)))
+    return results
+
+def _pdf_page_count(path: str) -> int:
+    import pdfplumber
 
-def _load_pdf(path: str) -> str:
     with pdfplumber.open(path) as pdf:
-        text_pages = []
-        for i, page in enumerate(pdf.pages):
-            page_text = page.extract_text() or ""
-            text_pages.append(page_text)
-    return "\n".join(text_pages)
-
-def load_files(paths: List[str]) -> List[str]:
-    texts = []
+        return len(pdf.pages)
+
+def _check_file(path: str) -> str:
+    if not os.path.isfile(path):
+        log.error("File not found", path=path)
+        raise FileNotFoundError(f"File not found: {path}")
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        log.error("Unsupported file type", path=path, ext=ext)
+        raise ValueError(f"Unsupported file type: {ext}")
+    return ext
+
+def _load_whole(path: str) -> List[PageResult]:
+    """DOCX and TXT files are extracted as a single page."""
+    if os.path.splitext(path)[1].lower() == ".docx":
+        text = _load_docx(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    return [(0, text, None)]
+
+
+def _page_tasks(paths: List[str]) -> Iterator[tuple]:
+    """(path, fn, args) extraction tasks: PDFs split into page ranges, other files whole."""
     for path in paths:
-        if not os.path.isfile(path):
-            log.error("File not found", path=path)
-            raise FileNotFoundError(f"File not found: {path}")
-        ext = os.path.splitext(path)[1].lower()
-        if ext == ".pdf":
-            texts.append(_load_pdf(path))
-        elif ext == ".docx":
-            texts.append(_load_docx(path))
-        elif ext == ".txt":
-            with open(path, encoding="utf-8") as f:
-                texts.append(f.read())
-        else:
-            log.error("Unsupported file type", path=path, ext=ext)
-            raise ValueError(f"Unsupported file type: {ext}")
-    return texts
+        if _check_file(path) != ".pdf":
+            yield path, _load_whole, (path,)
+            continue
+        count = _pdf_page_count(path)
+        for start in range(0, count, PDF_PAGES_PER_TASK):
+            yield path, _extract_pdf_pages, (path, start, min(start + PDF_PAGES_PER_TASK, count))
+        if count == 0:
+            yield path, _extract_pdf_pages, (path, 0, 0)
+
+
+def _timed(fn, *args) -> Tuple[float, list]:
+    """(seconds, fn(*args)); timed where it runs, so pool workers can report it back."""
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+
+def _pooled_results(tasks: Iterator[tuple], pool, max_inflight: int) -> Iterator[tuple]:
+    inflight = deque()
+    try:
+        for path, fn, args in tasks:
+            inflight.append((path, pool.submit(_timed, fn, *args)))
+            if len(inflight) >= max_inflight:
+                path, future = inflight.popleft()
+                yield path, future.result()
+        while inflight:
+            path, future = inflight.popleft()
+            yield path, future.result()
+    finally:
+        for _, future in inflight:
+            future.cancel()
+
+
+def iter_pages(paths: List[str], pool=None, max_inflight: int = None) -> Iterator[Tuple[str, Optional[PageResult]]]:
+    """Yield (path, (page, text, error)) in document and page order, then (path, None) after each file.
+
+    With a pool (a services.executor.WorkerPool) page ranges are extracted in
+    parallel, with at most max_inflight ranges submitted but not yet consumed,
+    so a slow consumer bounds how much extracted text piles up.
+    """
+    if pool is None:
+        results = ((path, _timed(fn, *args)) for path, fn, args in _page_tasks(paths))
+    else:
+        results = _pooled_results(_page_tasks(paths), pool, max_inflight or 2 * pool.max_concurrency)
+    current = None
+    try:
+        for path, (seconds, page_results) in results:
+            observe_stage("pdf_load" if path.lower().endswith(".pdf") else "file_load", seconds)
+            if current is not None and path != current:
+                yield current, None
+            current = path
+            for result in page_results:
+                yield path, result
+        if current is not None:
+            yield current, None
+    finally:
+        results.close()
 
 
 # def _load_pdf(path: str) -> str:
@@ -51,6 +134,8 @@ def load_files(paths: List[str]) -> List[str]:
 
 
 def _load_docx(path: str) -> str:
+    from docx import Document
+
     try:
         doc = Document(path)
         return "\n".join(p.text for p in doc.paragraphs)
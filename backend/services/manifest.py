@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import structlog
+
+from services.file_lock import InterProcessLock
+from services.vector_store import DB_DIR, DEFAULT_NAMESPACE, namespace_dir
+
+log = structlog.get_logger()
+
+# Per-file content hashes of everything currently in the vector store, so
+# re-ingestion only touches files that were added, changed or removed. One
+# manifest per namespace; MANIFEST_PATH is the default namespace's.
+MANIFEST_PATH = os.path.join(DB_DIR, "ingest_manifest.json")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Concurrent ingestions (from any worker process) read-modify-write a
+# manifest through update_manifest, under a lock file next to it. A whole
+# ingestion also holds the namespace's ingest.lock (see ingest_lock), so jobs
+# and the leader's refresh of TEMP_DIR never work on the same namespace at once.
+_locks: Dict[str, InterProcessLock] = {}
+_locks_guard = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(namespace: str = DEFAULT_NAMESPACE) -> str:
+    if namespace == DEFAULT_NAMESPACE:
+        return MANIFEST_PATH
+    return os.path.join(namespace_dir(namespace), "ingest_manifest.json")
+
+
+def load_manifest(namespace: str = DEFAULT_NAMESPACE) -> Dict[str, dict]:
+    path = manifest_path(namespace)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning("Unreadable ingest manifest, starting fresh", path=path, error=str(e))
+        return {}
+
+
+def save_manifest(manifest: Dict[str, dict], namespace: str = DEFAULT_NAMESPACE):
+    path = manifest_path(namespace)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _lock(path: str) -> InterProcessLock:
+    with _locks_guard:
+        return _locks.setdefault(path, InterProcessLock(path))
+
+
+def _manifest_lock(namespace: str) -> InterProcessLock:
+    return _lock(f"{manifest_path(namespace)}.lock")
+
+
+def ingest_lock(namespace: str = DEFAULT_NAMESPACE) -> InterProcessLock:
+    """Held for the whole of an ingestion into namespace, by whichever worker process runs it."""
+    return _lock(os.path.join(namespace_dir(namespace), "ingest.lock"))
+
+
+def update_manifest(entries: Dict[str, dict] = None, removed: Iterable[str] = (), reset: bool = False,
+                    namespace: str = DEFAULT_NAMESPACE):
+    with _manifest_lock(namespace):
+        manifest = {} if reset else load_manifest(namespace)
+        for doc_id in removed:
+            manifest.pop(doc_id, None)
+        manifest.update(entries or {})
+        save_manifest(manifest, namespace)
+
+
+def file_entry(path: str, previous: dict = None) -> dict:
+    """Describe a file for the manifest, reusing the previous hash when size and mtime are unchanged."""
+    stat = os.stat(path)
+    if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+        return dict(previous)
+    return {"sha256": file_hash(path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def plan_ingest(manifest: Dict[str, dict], paths: List[str], prune: bool = False) -> Tuple[Dict[str, dict], List[str], Dict[str, dict]]:
+    """Return (files to (re)ingest with their new entries, doc_ids whose chunks must be removed,
+    refreshed entries of unchanged files)."""
+    to_ingest = {}
+    to_remove = []
+    unchanged = {}
+    for path in paths:
+        previous = manifest.get(path)
+        entry = file_entry(path, previous)
+        if previous and previous.get("sha256") == entry["sha256"]:
+            # Content unchanged; remember a touched mtime so the next run skips hashing.
+            unchanged[path] = {**previous, "size": entry["size"], "mtime": entry["mtime"]}
+            continue
+        if previous:
+            to_remove.append(path)
+        to_ingest[path] = entry
+    if prune:
+        wanted = set(paths)
+        to_remove.extend(doc_id for doc_id in manifest if doc_id not in wanted)
+    return to_ingest, to_remove, unchanged
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from typing import Dict
+
+import structlog
+
+log = structlog.get_logger()
+
+EMBED_MODEL = "all-mpnet-base-v2"
+# "torch": the SentenceTransformer model as published (float32). "int8": the
+# same model with int8 dynamically quantized linear layers, run on CPU in
+# length buckets (services/cpu_encoder.py). The backends' vectors differ
+# slightly, so each keeps its own embedding cache (see cache_name).
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_BACKENDS = ("torch", "int8")
+
+# Process-wide registry: every embedding model is loaded once, on first use,
+# and shared by ingestion, query embedding and reranking.
+_models: Dict[str, object] = {}
+_lock = threading.Lock()
+
+
+def get_model(name: str = EMBED_MODEL):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        model = _models.get(name)
+        if model is None:
+            start = time.perf_counter()
+            model = _models[name] = _load(name)
+            log.info("Loaded embedding model", model=name, backend=EMBED_BACKEND,
+                     seconds=round(time.perf_counter() - start, 2))
+    return model
+
+
+def _load(name: str):
+    if EMBED_BACKEND == "torch":
+        from sentence_transformers import SentenceTransformer
+
+        return SentenceTransformer(name)
+    if EMBED_BACKEND == "int8":
+        from services.cpu_encoder import load_int8
+
+        return load_int8(name)
+    raise ValueError(f"Unknown EMBED_BACKEND: {EMBED_BACKEND} (expected one of {', '.join(EMBED_BACKENDS)})")
+
+
+def cache_name(name: str = EMBED_MODEL) -> str:
+    """Name under which the vectors this process computes with name are cached."""
+    return name if EMBED_BACKEND == "torch" else f"{name}-{EMBED_BACKEND}"
+
+
+def register_model(name: str, model):
+    """Use an already constructed model (anything with a SentenceTransformer-style encode) for name."""
+    with _lock:
+        _models[name] = model
+
+
+def preload(*names: str):
+    """Load the given models (default: EMBED_MODEL) without running them.
+
+    For a server process that forks its workers afterwards (gunicorn
+    preload_app): the weights are then shared copy-on-write instead of being
+    loaded once per worker, and no inference thread pool exists before the fork.
+    """
+    for name in names or (EMBED_MODEL,):
+        get_model(name)
+
+
+def warm_up(*names: str):
+    """Load the given models (default: EMBED_MODEL) and run one encode so the first request is not slow."""
+    if EMBED_BACKEND == "int8":
+        from services.cpu_encoder import set_threads
+
+        set_threads()  # per process: a worker forked after preload() may not keep the setting
+    for name in names or (EMBED_MODEL,):
+        start = time.perf_counter()
+        get_model(name).encode(["warm-up"])
+        log.info("Embedding model warmed up", model=name, seconds=round(time.perf_counter() - start, 2))
@@ -0,0 +1,552 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List
+
+import numpy as np
+import structlog
+
+from services.file_lock import InterProcessLock
+from services.vector_store import VectorStore
+
+log = structlog.get_logger()
+
+# In-process vector index: L2-normalized embeddings in a memory-mapped matrix,
+# searched with one matmul plus argpartition. Several worker processes can map
+# the same files (sharing their pages); header.json tells them when to remap.
+# Writes from any process hold write.lock and start from the latest header.
+# Within a generation, a process catching up only reads the records appended
+# since it last looked and drops the rows deleted meanwhile from its id maps.
+#
+#   vectors.npy   (capacity, dim) float32/float16 rows
+#   offsets.npy   (capacity,) int64 byte offset of each row's record in records.jsonl
+#   alive.npy     (capacity,) bool, False for deleted rows
+#   records.jsonl one {"id", "metadata", "document"} line per row, append-only
+#   header.json   {"count", "dim", "dtype", "quantization", "version", "generation"};
+#                 rewritten last on every change
+#
+# Compaction writes a new generation of the data files (vectors.<n>.npy,
+# records.<n>.jsonl, ...) next to the current one and switches to it by
+# rewriting the header, so other processes keep reading the old generation
+# until they see the new header. Each process holds its records file open, so
+# the old generation can be removed right after the switch.
+#
+# With quantization enabled the first pass scans compact codes instead of the
+# full vectors, and only the best RESCORE_FACTOR * top_k candidates are
+# re-scored exactly against vectors.npy:
+#
+#   codes.npy     (capacity, dim) int8, or sign bits for "binary" packed into
+#                 (capacity, ceil(dim / 64) * 8) uint8 so rows view as uint64 words
+#   scales.npy    (capacity,) float32 per-row dequantization scale ("int8" only)
+INDEX_DTYPE = np.dtype(os.getenv("NUMPY_INDEX_DTYPE", "float32"))
+QUANTIZATION = os.getenv("NUMPY_INDEX_QUANTIZATION", "none")  # "none", "int8" or "binary"
+QUANTIZATION_MODES = ("none", "int8", "binary")
+RESCORE_FACTOR = int(os.getenv("NUMPY_INDEX_RESCORE_FACTOR", "10"))
+INITIAL_CAPACITY = 1024
+SEARCH_BLOCK_ROWS = 65536  # rows scored per matmul, bounds the float32 scratch memory
+CODE_BLOCK_ROWS = 1024  # int8 rows widened to float32 per matmul; small enough to stay in cache
+COMPACT_MIN_DEAD = 1024  # compact once at least this many rows are dead and they outnumber live ones
+
+# Set bits per byte value, for Hamming distances where np.bitwise_count (NumPy 2) is missing
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_DATA_FILE = re.compile(r"(vectors|offsets|alive|codes|scales|records)(\.\d+)?\.(npy|jsonl)$")
+DATA_FILES = ("vectors.npy", "offsets.npy", "alive.npy", "codes.npy", "scales.npy", "records.jsonl")
+
+
+def quantize_int8(matrix: np.ndarray):
+    """Per-row symmetric int8 codes and the scales that map them back."""
+    scales = np.maximum(np.abs(matrix).max(axis=1), 1e-12) / 127.0
+    codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def binary_code_width(dim: int) -> int:
+    return (dim + 63) // 64 * 8
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    """One sign bit per dimension, zero-padded to whole 64-bit words."""
+    packed = np.packbits(matrix > 0, axis=1)
+    width = binary_code_width(matrix.shape[1])
+    return np.pad(packed, ((0, 0), (0, width - packed.shape[1])))
+
+
+def hamming_similarity(codes: np.ndarray, query_bits: np.ndarray, dim: int) -> np.ndarray:
+    """Number of matching sign bits between each row of codes and the query."""
+    if hasattr(np, "bitwise_count"):
+        words = np.ascontiguousarray(codes).view(np.uint64)
+        differing = np.bitwise_count(words ^ query_bits.view(np.uint64)).sum(axis=1, dtype=np.int32)
+    else:
+        differing = _POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+    return (dim - differing).astype(np.float32)
+
+
+class NumpyStore(VectorStore):
+    def __init__(self, path: str, dtype: np.dtype = INDEX_DTYPE, quantization: str = QUANTIZATION):
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {quantization}")
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.quantization = quantization
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._read_lock = threading.Lock()  # seek + readline on the shared records file
+        self._write_lock = InterProcessLock(self._file("write.lock"))
+        self._header_mtime = None
+        self.generation = 0
+        self._load()
+        if self._codes_missing:
+            self._build_codes()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _data_file(self, name: str, generation: int = None) -> str:
+        """Path of a data file (see DATA_FILES) in the given generation, the current one by default."""
+        generation = self.generation if generation is None else generation
+        if not generation:
+            return self._file(name)
+        stem, ext = os.path.splitext(name)
+        return self._file(f"{stem}.{generation}{ext}")
+
+    # -- loading -------------------------------------------------------------
+
+    def _read_header(self) -> dict:
+        try:
+            with open(self._file("header.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"count": 0, "dim": None, "dtype": self.dtype.name, "quantization": self.quantization, "version": 0}
+
+    def _map(self, header: dict) -> bool:
+        """Map the files of header's generation; False if a compaction removed them meanwhile."""
+        generation = header.get("generation", 0)
+        try:
+            if header["dim"] is not None:
+                vectors = np.load(self._data_file("vectors.npy", generation), mmap_mode="r+")
+                offsets = np.load(self._data_file("offsets.npy", generation), mmap_mode="r+")
+                alive = np.load(self._data_file("alive.npy", generation), mmap_mode="r+")
+                records_file = open(self._data_file("records.jsonl", generation), "rb")
+            else:
+                vectors = offsets = alive = records_file = None
+        except FileNotFoundError:
+            return False
+        self.count_rows = header["count"]
+        self.dim = header["dim"]
+        self.version = header["version"]
+        self.generation = generation
+        if header["dim"] is not None:
+            self.dtype = np.dtype(header["dtype"])
+        self._vectors, self._offsets, self._alive = vectors, offsets, alive
+        # Not closed here: a query may still be reading the previous one
+        self._records_file = records_file
+        return True
+
+    def _load(self):
+        header = self._read_header()
+        while not self._map(header):
+            previous, header = header, self._read_header()
+            if header == previous:
+                raise FileNotFoundError(f"Data files of generation {header.get('generation', 0)} "
+                                        f"are missing from {self.path}")
+        self._header_quantization = header.get("quantization", "none")
+        self._codes = self._scales = None
+        # Codes in another mode are rebuilt by _build_codes under write.lock;
+        # until then searches scan the full vectors
+        self._codes_missing = False
+        if header["dim"] is not None and self.quantization != "none":
+            if header.get("quantization", "none") == self.quantization:
+                self._codes = np.load(self._data_file("codes.npy"), mmap_mode="r+")
+                if self.quantization == "int8":
+                    self._scales = np.load(self._data_file("scales.npy"), mmap_mode="r+")
+            else:
+                self._codes_missing = True
+        self._row_ids: List[str] = []
+        self._rows_by_id: Dict[str, int] = {}
+        self._rows_by_doc: Dict[str, List[int]] = {}
+        if self.count_rows:
+            for row, record in enumerate(self._records(range(self.count_rows))):
+                self._row_ids.append(record["id"])
+                if self._alive[row]:
+                    self._index_row(row, record)
+        self._sync_alive()
+        try:
+            self._header_mtime = os.stat(self._file("header.json")).st_mtime_ns
+        except FileNotFoundError:
+            self._header_mtime = None
+
+    def _code_shape(self, capacity: int) -> tuple:
+        if self.quantization == "binary":
+            return (capacity, binary_code_width(self.dim))
+        return (capacity, self.dim)
+
+    def _write_codes(self, start: int, matrix: np.ndarray):
+        if self.quantization == "int8":
+            codes, scales = quantize_int8(matrix)
+            self._codes[start:start + len(matrix)] = codes
+            self._scales[start:start + len(matrix)] = scales
+            self._scales.flush()
+        else:
+            self._codes[start:start + len(matrix)] = quantize_binary(matrix)
+        self._codes.flush()
+
+    def _build_codes(self):
+        """Quantize an index that was written without (or with other) codes."""
+        with self._write_lock, self._lock:
+            # Another process may have built them while we waited for the lock
+            if self._read_header()["version"] != self.version:
+                self._load()
+            if not self._codes_missing:
+                return
+            capacity = self._vectors.shape[0]
+            log.info("Building quantized codes", path=self.path, mode=self.quantization, rows=self.count_rows)
+            code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+            codes = self._resize("codes.npy", code_dtype, self._code_shape(capacity), None)
+            scales = self._resize("scales.npy", np.float32, (capacity,), None) if self.quantization == "int8" else None
+            self._codes, self._scales = codes, scales
+            for start in range(0, self.count_rows, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, self.count_rows)
+                self._write_codes(start, np.asarray(self._vectors[start:end], dtype=np.float32))
+            self._codes_missing = False
+            self._write_header()
+
+    def _index_row(self, row: int, record: dict):
+        self._rows_by_id[record["id"]] = row
+        self._rows_by_doc.setdefault(record["metadata"].get("doc_id"), []).append(row)
+
+    def _unindex_rows(self, rows):
+        """Drop rows another process deleted from the id maps."""
+        dead_by_doc: Dict[str, set] = {}
+        for row, record in zip(rows, self._records(rows)):
+            if self._rows_by_id.get(record["id"]) == row:
+                del self._rows_by_id[record["id"]]
+            dead_by_doc.setdefault(record["metadata"].get("doc_id"), set()).add(row)
+        for doc_id, dead in dead_by_doc.items():
+            remaining = [row for row in self._rows_by_doc.get(doc_id, []) if row not in dead]
+            if remaining:
+                self._rows_by_doc[doc_id] = remaining
+            else:
+                self._rows_by_doc.pop(doc_id, None)
+
+    def _sync_alive(self):
+        """Remember which rows the id maps reflect as alive, to find later deletions."""
+        if self._alive is None:
+            self._synced_alive = np.zeros(0, dtype=np.bool_)
+        else:
+            self._synced_alive = np.array(self._alive[:self.count_rows])
+
+    def _catch_up(self) -> bool:
+        """Apply rows appended and deleted since the last load; False when only a full reload will do."""
+        header = self._read_header()
+        if (self.dim is None or header["dim"] != self.dim or header.get("generation", 0) != self.generation
+                or header["count"] < self.count_rows
+                or header.get("quantization", "none") != self._header_quantization):
+            return False
+        old_count, old_records_file = self.count_rows, self._records_file
+        # Remapped every time: growing the index replaces the files
+        if not self._map(header):
+            return False
+        if os.fstat(self._records_file.fileno()).st_ino != os.fstat(old_records_file.fileno()).st_ino:
+            return False  # cleared and written afresh meanwhile
+        if self._codes is not None:
+            self._codes = np.load(self._data_file("codes.npy"), mmap_mode="r+")
+            if self.quantization == "int8":
+                self._scales = np.load(self._data_file("scales.npy"), mmap_mode="r+")
+        alive = np.asarray(self._alive[:self.count_rows])
+        died = np.flatnonzero(self._synced_alive & ~alive[:old_count])
+        if len(died):
+            self._unindex_rows([int(row) for row in died])
+        if self.count_rows > old_count:
+            for row, record in enumerate(self._records(range(old_count, self.count_rows)), old_count):
+                self._row_ids.append(record["id"])
+                if alive[row]:
+                    self._index_row(row, record)
+        self._synced_alive = np.array(alive)
+        return True
+
+    def refresh(self):
+        """Pick up changes another process made to the index since we last looked.
+
+        Appends and deletions within the current generation are applied
+        incrementally; a compaction, clear or change of codes reloads it all.
+        """
+        try:
+            mtime = os.stat(self._file("header.json")).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._header_mtime:
+            with self._lock:
+                if mtime != self._header_mtime:
+                    if not self._catch_up():
+                        log.info("Reloading numpy vector index", path=self.path)
+                        self._load()
+                    # As seen before reading the header: a change made meanwhile is picked up next time
+                    self._header_mtime = mtime
+        if self._codes_missing:
+            self._build_codes()
+
+    def _records(self, rows, offsets=None, records_file=None) -> List[dict]:
+        """Records of rows, read through the given offsets and records file (by default the current ones)."""
+        if offsets is None:
+            offsets, records_file = self._offsets, self._records_file
+        records = []
+        with self._read_lock:
+            for row in rows:
+                records_file.seek(int(offsets[row]))
+                records.append(json.loads(records_file.readline()))
+        return records
+
+    # -- writing -------------------------------------------------------------
+
+    def _write_header(self):
+        self.version += 1
+        tmp_path = self._file("header.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"count": self.count_rows, "dim": self.dim, "dtype": self.dtype.name,
+                       "quantization": self.quantization, "version": self.version,
+                       "generation": self.generation}, f)
+        os.replace(tmp_path, self._file("header.json"))
+        self._header_mtime = os.stat(self._file("header.json")).st_mtime_ns
+
+    def _resize(self, name: str, dtype, shape: tuple, old):
+        path = self._data_file(name)
+        tmp_path = f"{path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+        if old is not None:
+            grown[:len(old)] = old
+        grown.flush()
+        del grown
+        # Replacing (not rewriting) the file keeps other processes' old mappings valid
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r+")
+
+    @staticmethod
+    def _capacity_for(needed: int, capacity: int = 0) -> int:
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        return new_capacity
+
+    def _ensure_capacity(self, needed: int):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = self._capacity_for(needed, capacity)
+        self._vectors = self._resize("vectors.npy", self.dtype, (new_capacity, self.dim), self._vectors)
+        self._offsets = self._resize("offsets.npy", np.int64, (new_capacity,), self._offsets)
+        self._alive = self._resize("alive.npy", np.bool_, (new_capacity,), self._alive)
+        if self.quantization != "none":
+            code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+            self._codes = self._resize("codes.npy", code_dtype, self._code_shape(new_capacity), self._codes)
+            if self.quantization == "int8":
+                self._scales = self._resize("scales.npy", np.float32, (new_capacity,), self._scales)
+
+    def add(self, ids, embeddings, metadatas, documents):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+        with self._write_lock, self._lock:
+            self.refresh()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            start = self.count_rows
+            self._ensure_capacity(start + len(ids))
+            # Same id again replaces the old row
+            replaced = [self._rows_by_id[i] for i in ids if i in self._rows_by_id]
+            self._alive[replaced] = False
+            with open(self._data_file("records.jsonl"), "ab") as f:
+                for row, (id_, meta, doc) in enumerate(zip(ids, metadatas, documents), start):
+                    self._offsets[row] = f.tell()
+                    record = {"id": id_, "metadata": meta, "document": doc}
+                    f.write(json.dumps(record).encode("utf-8") + b"\n")
+                    self._row_ids.append(id_)
+                    self._index_row(row, record)
+            if self._records_file is None:
+                self._records_file = open(self._data_file("records.jsonl"), "rb")
+            end = start + len(ids)
+            self._vectors[start:end] = matrix
+            if self.quantization != "none":
+                self._write_codes(start, matrix)
+            self._alive[start:end] = True
+            for arr in (self._vectors, self._offsets, self._alive):
+                arr.flush()
+            self.count_rows = end
+            self._sync_alive()
+            self._write_header()
+
+    def delete_document(self, doc_id):
+        with self._write_lock, self._lock:
+            self.refresh()
+            rows = self._rows_by_doc.pop(doc_id, [])
+            if not rows:
+                return
+            self._alive[rows] = False
+            self._alive.flush()
+            for row in rows:
+                if self._rows_by_id.get(self._row_ids[row]) == row:
+                    del self._rows_by_id[self._row_ids[row]]
+            self._sync_alive()
+            self._write_header()
+            dead = self.count_rows - len(self._rows_by_id)
+            if dead >= COMPACT_MIN_DEAD and dead > len(self._rows_by_id):
+                self.compact()
+
+    def compact(self):
+        """Rewrite the index without deleted rows, as a new generation of the data files."""
+        with self._write_lock, self._lock:
+            self.refresh()
+            if self.dim is None:
+                return
+            live = np.flatnonzero(self._alive[:self.count_rows])
+            log.info("Compacting numpy vector index", live=len(live), dropped=self.count_rows - len(live))
+            old_generation, generation = self.generation, self.generation + 1
+            self._remove_generation(generation)  # leftovers of a compaction that died half-way
+            capacity = self._capacity_for(len(live))
+            offsets = np.lib.format.open_memmap(self._data_file("offsets.npy", generation), mode="w+",
+                                                dtype=np.int64, shape=(capacity,))
+            with open(self._data_file("records.jsonl", generation), "wb") as f:
+                for row, record in enumerate(self._records(live)):
+                    offsets[row] = f.tell()
+                    f.write(json.dumps(record).encode("utf-8") + b"\n")
+            vectors = np.lib.format.open_memmap(self._data_file("vectors.npy", generation), mode="w+",
+                                                dtype=self.dtype, shape=(capacity, self.dim))
+            alive = np.lib.format.open_memmap(self._data_file("alive.npy", generation), mode="w+",
+                                              dtype=np.bool_, shape=(capacity,))
+            for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                rows = live[start:start + SEARCH_BLOCK_ROWS]
+                vectors[start:start + len(rows)] = self._vectors[rows]
+            alive[:len(live)] = True
+            self.generation, self.count_rows = generation, len(live)
+            self._vectors, self._offsets, self._alive = vectors, offsets, alive
+            if self.quantization != "none":
+                code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+                self._codes = np.lib.format.open_memmap(self._data_file("codes.npy"), mode="w+",
+                                                        dtype=code_dtype, shape=self._code_shape(capacity))
+                if self.quantization == "int8":
+                    self._scales = np.lib.format.open_memmap(self._data_file("scales.npy"), mode="w+",
+                                                             dtype=np.float32, shape=(capacity,))
+                for start in range(0, len(live), SEARCH_BLOCK_ROWS):
+                    end = min(start + SEARCH_BLOCK_ROWS, len(live))
+                    self._write_codes(start, np.asarray(vectors[start:end], dtype=np.float32))
+            for arr in (vectors, offsets, alive):
+                arr.flush()
+            # Other processes switch to the new files only once they see this header
+            self._write_header()
+            self._load()
+            self._remove_generation(old_generation)
+
+    def _remove_generation(self, generation: int):
+        for name in DATA_FILES:
+            try:
+                os.remove(self._data_file(name, generation))
+            except FileNotFoundError:
+                pass
+
+    # -- reading -------------------------------------------------------------
+
+    def count(self):
+        self.refresh()
+        return len(self._rows_by_id)
+
+    def _first_pass_scores(self, q: np.ndarray, count: int, codes, scales) -> np.ndarray:
+        """Approximate similarity of every row to q, computed from the quantized codes."""
+        scores = np.empty(count, dtype=np.float32)
+        if self.quantization == "binary":
+            query_bits = quantize_binary(q[None, :])[0]
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, count)
+                scores[start:end] = hamming_similarity(codes[start:end], query_bits, self.dim)
+        else:
+            for start in range(0, count, CODE_BLOCK_ROWS):
+                end = min(start + CODE_BLOCK_ROWS, count)
+                scores[start:end] = (codes[start:end].astype(np.float32) @ q) * scales[start:end]
+        return scores
+
+    def search(self, query_emb, top_k: int, exact: bool = False, rescore_factor: int = None):
+        """Row numbers and cosine similarities of the top_k live rows, best first.
+
+        With quantization enabled, rescore_factor (default RESCORE_FACTOR) * top_k
+        candidates come from the codes and are re-ranked on the full-precision
+        vectors, unless exact=True forces a full float scan.
+        """
+        self.refresh()
+        with self._lock:
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            alive, count = self._alive, self.count_rows
+        return self._search(query_emb, top_k, exact, vectors, codes, scales, alive, count, rescore_factor)
+
+    def _search(self, query_emb, top_k, exact, vectors, codes, scales, alive, count, rescore_factor=None):
+        if not count:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        live = alive[:count]
+        k = min(top_k, int(np.count_nonzero(live)))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = np.asarray(query_emb, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+
+        if self.quantization == "none" or codes is None or exact:
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, count)
+                scores[start:end] = vectors[start:end].astype(np.float32, copy=False) @ q
+            scores[~live] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return top, scores[top]
+
+        approx = self._first_pass_scores(q, count, codes, scales)
+        approx[~live] = -np.inf
+        n_candidates = min(k * (rescore_factor or RESCORE_FACTOR), int(np.count_nonzero(live)))
+        candidates = np.sort(np.argpartition(-approx, n_candidates - 1)[:n_candidates])
+        exact_scores = vectors[candidates].astype(np.float32, copy=False) @ q
+        best = np.argsort(-exact_scores)[:k]
+        return candidates[best], exact_scores[best]
+
+    def query(self, query_emb, top_k, include_embeddings=False):
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        if include_embeddings:
+            empty["embeddings"] = [[]]
+        self.refresh()
+        # One consistent set of files for the search and the record lookups,
+        # even if another thread reloads the index in between
+        with self._lock:
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            alive, count = self._alive, self.count_rows
+            offsets, records_file = self._offsets, self._records_file
+        top, scores = self._search(query_emb, top_k, False, vectors, codes, scales, alive, count)
+        if not len(top):
+            return empty
+        records = self._records(top, offsets, records_file)
+        results = {
+            "ids": [[r["id"] for r in records]],
+            "documents": [[r["document"] for r in records]],
+            "metadatas": [[r["metadata"] for r in records]],
+            # cosine distance (1 - cosine); ChromaStore's collections use Chroma's default
+            # squared L2, so the two backends' distances are not on the same scale
+            "distances": [[float(1.0 - score) for score in scores]],
+        }
+        if include_embeddings:
+            results["embeddings"] = [np.asarray(vectors[top], dtype=np.float32).tolist()]
+        return results
+
+    def get_embeddings(self, ids):
+        self.refresh()
+        with self._lock:
+            rows = {id_: self._rows_by_id[id_] for id_ in ids if id_ in self._rows_by_id}
+            vectors = self._vectors
+        return {id_: np.asarray(vectors[row], dtype=np.float32).tolist() for id_, row in rows.items()}
+
+    def _clear_files(self):
+        for name in os.listdir(self.path):
+            if name == "header.json" or _DATA_FILE.match(name):
+                try:
+                    os.remove(self._file(name))
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        with self._write_lock, self._lock:
+            self._clear_files()
+            self._load()
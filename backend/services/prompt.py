@@ -1,5 +1,10 @@
+import os
+from typing import List
+
 from jinja2 import Template
 
+from services.chunker import get_encoder
+
 
 # '''
 # You are a helpful AI assistant. Use the provided document chunks to answer.
@@ -9,15 +14,19 @@ from jinja2 import Template
 # Question: {{ query }}
 # Answer succinctly and cite chunk metadata.
 # '''
+
+# Retrieved chunks are packed into at most PROMPT_CONTEXT_TOKENS tokens (as
+# counted by the chunker's encoder), best-ranked first. Overlapping or adjacent
+# chunks of the same document are merged into one span so their shared
+# OVERLAP tokens are sent once.
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "2000"))
+MIN_PARTIAL_TOKENS = 32  # a span cut to fit the budget must keep at least this much text
+
 SYSTEM_TEMPLATE ='''
 You are a helpful AI assistant that answers user questions based only on the provided document chunks.
 
 Chunks:
-{% for c in chunks %}
-- Document ID: {{ c.metadata.doc_id }}, Span: {{ c.metadata.start }}-{{ c.metadata.end }}
-  Content: {{ c.text | truncate(300, True, '...') }}
-{% endfor %}
-
+{{ context }}
 Instructions:
 - Use ONLY the information from the chunks to answer the question.
 - Cite each fact by referencing the document ID and span in square brackets, e.g. [doc123:10-50].
@@ -30,6 +39,91 @@ Question: {{ query }}
 Answer succinctly and cite chunk metadata.
 '''
 
-def build_prompt(chunks: list[dict], query: str) -> str:
-    tpl = Template(SYSTEM_TEMPLATE)
-    return tpl.render(chunks=chunks, query=query)
\ No newline at end of file
+CHUNK_TEMPLATE = '''- Document ID: {{ doc_id }}, Span: {{ start }}-{{ end }}
+  Content: {{ text }}
+'''
+
+# Compiled once; Template() parses and compiles the source on every call
+_system_template = Template(SYSTEM_TEMPLATE)
+_chunk_template = Template(CHUNK_TEMPLATE, keep_trailing_newline=True)
+
+
+def _chunk_text(chunk: dict) -> str:
+    # Retrieved docs carry "document"; Chunk-like dicts carry "text"
+    return chunk.get("document") or chunk.get("text") or ""
+
+
+def merge_spans(chunks: List[dict]) -> List[dict]:
+    """Merge overlapping or adjacent chunks of the same doc_id into spans.
+
+    Returns {"doc_id", "start", "end", "tokens", "rank"} dicts ordered by the
+    best retrieval rank among each span's chunks. start/end are the chunker's
+    token offsets; chunks without them are kept as they are.
+    """
+    encoder = get_encoder()
+    spans = []
+    by_doc = {}
+    for rank, chunk in enumerate(chunks):
+        meta = chunk.get("metadata") or {}
+        span = {
+            "doc_id": meta.get("doc_id"),
+            "start": meta.get("start"),
+            "end": meta.get("end"),
+            "tokens": encoder.encode(_chunk_text(chunk)),
+            "rank": rank,
+        }
+        if isinstance(span["start"], int) and isinstance(span["end"], int):
+            by_doc.setdefault(span["doc_id"], []).append(span)
+        else:
+            spans.append(span)
+
+    for doc_spans in by_doc.values():
+        doc_spans.sort(key=lambda sp: sp["start"])
+        current = doc_spans[0]
+        for span in doc_spans[1:]:
+            overlap = current["end"] - span["start"]
+            # Re-encoding decoded text almost always reproduces the chunker's tokens;
+            # when it does not, the offsets can't be trusted for splicing
+            exact = (len(current["tokens"]) == current["end"] - current["start"]
+                     and len(span["tokens"]) == span["end"] - span["start"])
+            if overlap >= 0 and exact:
+                if span["end"] > current["end"]:
+                    current["tokens"] = current["tokens"] + span["tokens"][overlap:]
+                    current["end"] = span["end"]
+                current["rank"] = min(current["rank"], span["rank"])
+            else:
+                spans.append(current)
+                current = span
+        spans.append(current)
+
+    spans.sort(key=lambda sp: sp["rank"])
+    return spans
+
+
+def pack_context(chunks: List[dict], budget: int = PROMPT_CONTEXT_TOKENS) -> str:
+    """Render merged spans, best first, until the token budget is used up."""
+    encoder = get_encoder()
+    entries = []
+    remaining = budget
+    for span in merge_spans(chunks):
+        fields = {"doc_id": span["doc_id"], "start": span["start"], "end": span["end"]}
+        entry = _chunk_template.render(text=encoder.decode(span["tokens"]), **fields)
+        cost = len(encoder.encode(entry))
+        if cost > remaining:
+            # Cut the span's text to what is left after its header
+            keep = remaining - (cost - len(span["tokens"])) - 1  # 1 for the "..." marker
+            if keep < MIN_PARTIAL_TOKENS:
+                continue
+            if isinstance(span["start"], int):
+                fields["end"] = span["start"] + keep
+            entry = _chunk_template.render(text=encoder.decode(span["tokens"][:keep]) + "...", **fields)
+            cost = len(encoder.encode(entry))
+            if cost > remaining:
+                continue
+        entries.append(entry)
+        remaining -= cost
+    return "".join(entries)
+
+
+def build_prompt(chunks: list[dict], query: str, budget: int = PROMPT_CONTEXT_TOKENS) -> str:
+    return _system_template.render(context=pack_context(chunks, budget), query=query)
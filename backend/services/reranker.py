@@ -0,0 +1,73 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+import structlog
+
+log = structlog.get_logger()
+
+# Reranking over embeddings the vector store already holds, so no candidate
+# is re-encoded: "mmr" (the default) picks them by Maximal Marginal Relevance
+# (relevance traded against similarity to the chunks already picked),
+# "cosine" re-sorts the candidates by similarity to the query, "none" keeps
+# retrieval order. MMR widens retrieval to RERANK_CANDIDATES and mostly drops
+# near-duplicates (overlapping chunk windows, the same passage found by both
+# retrievers); MMR_LAMBDA keeps relevance the dominant term.
+RERANK_MODE = os.getenv("RERANK_MODE", "mmr")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1.0 = pure relevance, 0.0 = pure diversity
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def cosine_scores(query_emb, embeddings) -> np.ndarray:
+    """Cosine similarity of the query to every row, in one matrix-vector product."""
+    return normalize_rows(embeddings) @ normalize_rows(query_emb)
+
+
+def mmr(query_emb, embeddings, top_k: int, lambda_: float = MMR_LAMBDA,
+        relevance: Optional[np.ndarray] = None) -> List[int]:
+    """Indices of top_k rows chosen by Maximal Marginal Relevance.
+
+    relevance defaults to cosine similarity to the query; pass other scores
+    (scaled to [0, 1]) to rank by, e.g., fused hybrid ranks instead.
+    """
+    matrix = normalize_rows(embeddings)
+    if relevance is None:
+        relevance = matrix @ normalize_rows(query_emb)
+    relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = matrix @ matrix.T  # candidate pool is small, so the full Gram matrix is cheap
+    n = len(matrix)
+    top_k = min(top_k, n)
+    selected: List[int] = []
+    # Highest similarity of each candidate to anything already selected
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(top_k):
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = lambda_ * relevance - (1 - lambda_) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+    return selected
+
+
+def rerank(query_emb, candidates: List[dict], top_k: int, mode: str = RERANK_MODE,
+           relevance: Optional[List[float]] = None) -> List[dict]:
+    """Reorder candidates (dicts with an "embedding") and keep top_k."""
+    if not candidates or mode == "none":
+        return candidates[:top_k]
+    embeddings = np.asarray([c["embedding"] for c in candidates], dtype=np.float32)
+    if mode == "cosine":
+        order = np.argsort(-cosine_scores(query_emb, embeddings))[:top_k]
+    elif mode == "mmr":
+        order = mmr(query_emb, embeddings, top_k,
+                    relevance=None if relevance is None else np.asarray(relevance, dtype=np.float32))
+    else:
+        raise ValueError(f"Unknown RERANK_MODE: {mode}")
+    return [candidates[i] for i in order]
@@ -0,0 +1,144 @@
+import asyncio
+import hashlib
+import json
+import re
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from services.metrics import record_cache
+from services.vector_store import DEFAULT_NAMESPACE, collection_version
+
+log = structlog.get_logger()
+
+# Identical questions that arrive while the first one is still being answered
+# share its execution: one retrieval and one LLM generation whose tokens are
+# broadcast to every caller. Callers that attach late get the tokens produced
+# so far replayed, then follow live. The key covers the normalized question,
+# retrieval query and history plus the namespace and its collection version,
+# so only requests that would get the same answer are merged.
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower().rstrip("?!. ")
+
+
+def flight_key(question: str, retrieval_query: Optional[str], history: Optional[List[dict]],
+               namespace: str = DEFAULT_NAMESPACE) -> str:
+    payload = json.dumps([
+        normalize_query(question),
+        normalize_query(retrieval_query or question),
+        [(m["role"], m["content"]) for m in history or []],
+        namespace,
+        collection_version(namespace),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Flight:
+    """One in-progress answer; the leader task fills it, any number of subscribers read it."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.subscribers = 0
+        self.tokens: List[str] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self._docs: "asyncio.Future[list]" = asyncio.get_running_loop().create_future()
+        self._changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _finish(self, error: Optional[BaseException] = None):
+        self.finished = True
+        self.error = error
+        if not self._docs.done():
+            if error is not None:
+                self._docs.set_exception(error)
+                self._docs.exception()  # subscribers may all be gone; don't log it as unretrieved
+            else:
+                self._docs.set_result([])
+        self._notify()
+
+    async def docs(self) -> list:
+        """Source docs, available once retrieval is done (raises the leader's error)."""
+        return await asyncio.shield(self._docs)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """All answer tokens from the start, then new ones as they are generated."""
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.tokens):
+                yield self.tokens[position]
+                position += 1
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def _lead(self, flight: Flight, start: Callable[[], Awaitable[Tuple[list, AsyncIterator[str]]]]):
+        tokens = None
+        try:
+            docs, tokens = await start()
+            if not flight._docs.done():
+                flight._docs.set_result(docs)
+            async for token in tokens:
+                flight.tokens.append(token)
+                flight._notify()
+            flight._finish()
+        except asyncio.CancelledError:
+            flight._finish(RuntimeError("Generation cancelled"))
+            raise
+        except Exception as e:
+            flight._finish(e)
+        finally:
+            if tokens is not None:
+                await tokens.aclose()
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def join(self, key: str, start: Callable[[], Awaitable[Tuple[list, AsyncIterator[str]]]]) -> Flight:
+        """Attach to the flight for key, starting it with start() if none is running.
+
+        Every join must be paired with leave(); the generation is cancelled
+        once nobody is listening any more.
+        """
+        flight = self._flights.get(key)
+        record_cache("singleflight", flight is not None)
+        if flight is None:
+            flight = self._flights[key] = Flight(key)
+            flight.task = asyncio.create_task(self._lead(flight, start))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            log.info("Coalesced identical in-flight query", subscribers=flight.subscribers + 1,
+                     tokens_so_far=len(flight.tokens))
+        flight.subscribers += 1
+        return flight
+
+    def leave(self, flight: Flight):
+        flight.subscribers -= 1
+        if flight.subscribers <= 0 and not flight.finished:
+            # Nobody is listening: free the LLM slot rather than finish an unread answer
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            flight._finish(RuntimeError("Generation cancelled"))
+            flight.task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+
+coalescer = SingleFlight()
@@ -0,0 +1,89 @@
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+import structlog
+
+log = structlog.get_logger()
+
+_END = object()
+POLL_INTERVAL = 0.1  # seconds between checks of the stop flag while blocked on a queue
+
+
+class _Stopped(Exception):
+    pass
+
+
+def _put(q: queue.Queue, item, stop: threading.Event):
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            q.put(item, timeout=POLL_INTERVAL)
+            return
+        except queue.Full:
+            continue
+
+
+def _drain(q: queue.Queue, stop: threading.Event) -> Iterator:
+    while True:
+        if stop.is_set():
+            raise _Stopped()
+        try:
+            item = q.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def run_stages(source: Iterable, stages: List[Callable[[Iterator], Iterator]],
+               sink: Callable[[object], None], queue_size: int = 4, name: str = "pipeline"):
+    """Run source -> stage_1 -> ... -> stage_n -> sink with each step on its own thread.
+
+    Steps are connected by queues holding at most queue_size items, so memory
+    stays bounded while all steps overlap. The sink runs on the calling
+    thread. The first exception raised anywhere stops every step and is
+    re-raised here.
+    """
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def step(label, items, outbox):
+        try:
+            for item in items:
+                _put(outbox, item, stop)
+            _put(outbox, _END, stop)
+        except _Stopped:
+            pass
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+            log.error("Pipeline stage failed", pipeline=name, stage=label, error=str(e))
+        finally:
+            close = getattr(items, "close", None)
+            if close is not None:
+                close()  # run generator cleanup (e.g. cancel pending futures) on this thread
+
+    threads = [threading.Thread(target=step, args=("source", source, queues[0]), name=f"{name}-source", daemon=True)]
+    for i, stage in enumerate(stages):
+        label = getattr(stage, "__name__", f"stage{i}")
+        items = stage(_drain(queues[i], stop))
+        threads.append(threading.Thread(target=step, args=(label, items, queues[i + 1]), name=f"{name}-{label}", daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        for item in _drain(queues[-1], stop):
+            sink(item)
+    except _Stopped:
+        pass
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
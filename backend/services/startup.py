@@ -0,0 +1,105 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import structlog
+
+from services.executor import thread_pool
+from services.metrics import STARTUP_SECONDS
+
+log = structlog.get_logger()
+
+# Nothing heavy happens at import: models, the tokenizer and the stores are
+# opened on first use. Once the server is up, warm-up opens them in the
+# background in a fixed order so the first request doesn't pay for it.
+# /livez answers as soon as the process serves HTTP; /readyz only once
+# warm-up has finished, so a load balancer can hold traffic until then.
+# With STARTUP_WARM_UP=0 the service is ready immediately and everything
+# loads on first use instead. A failing step is retried up to
+# WARM_UP_RETRIES times, waiting WARM_UP_BACKOFF seconds (doubling) between
+# attempts; if it still fails, warm-up carries on and the service becomes
+# ready as "degraded", leaving that step to load on first use.
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "1") == "1"
+WARM_UP_RETRIES = int(os.getenv("WARM_UP_RETRIES", "3"))
+WARM_UP_BACKOFF = float(os.getenv("WARM_UP_BACKOFF", "2"))
+
+
+class StartupState:
+    def __init__(self):
+        self.phase = "starting"
+        self.ready = False
+        self.error: Optional[str] = None
+        self.failed_steps: List[str] = []
+        self.timings: Dict[str, float] = {}
+        self.started_at = time.time()
+
+    def record(self, phase: str, seconds: float):
+        self.timings[phase] = round(seconds, 3)
+        STARTUP_SECONDS.set(seconds, phase=phase)
+
+    async def _run_step(self, name: str, fn: Callable[[], object], retries: int, backoff: float) -> bool:
+        """Run one step, retrying with exponential backoff; False if every attempt failed."""
+        for attempt in range(retries + 1):
+            step_started = time.perf_counter()
+            try:
+                await thread_pool.run(fn)
+            except Exception as e:
+                if attempt == retries:
+                    self.error = "; ".join(filter(None, [self.error, f"{name}: {e}"]))
+                    log.error("Warm-up step failed, leaving it to first use", step=name, attempts=attempt + 1,
+                              error=str(e))
+                    return False
+                delay = backoff * 2 ** attempt
+                log.warning("Warm-up step failed, retrying", step=name, attempt=attempt + 1, retry_in=delay,
+                            error=str(e))
+                await asyncio.sleep(delay)
+                continue
+            self.record(name, time.perf_counter() - step_started)
+            log.info("Warm-up step done", step=name, seconds=self.timings[name])
+            return True
+        return False
+
+    async def warm_up(self, steps: List[Tuple[str, Callable[[], object]]], retries: int = WARM_UP_RETRIES,
+                      backoff: float = WARM_UP_BACKOFF):
+        """Run each blocking (name, fn) step on the thread pool, then mark the service ready."""
+        started = time.perf_counter()
+        for name, fn in steps:
+            self.phase = name
+            if not await self._run_step(name, fn, retries, backoff):
+                self.failed_steps.append(name)
+        self.record("warm_up", time.perf_counter() - started)
+        self.mark_ready()
+
+    @property
+    def degraded(self) -> bool:
+        return bool(self.failed_steps)
+
+    def mark_ready(self):
+        self.phase = "degraded" if self.degraded else "ready"
+        self.ready = True
+        if self.degraded:
+            log.warning("Service ready, degraded", failed_steps=self.failed_steps, timings=self.timings)
+        else:
+            log.info("Service ready", timings=self.timings)
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.phase,
+            "error": self.error,
+            "failed_steps": self.failed_steps,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "timings": self.timings,
+        }
+
+
+startup_state = StartupState()
+
+
+async def cancel_task(task: Optional[asyncio.Task]):
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
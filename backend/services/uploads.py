@@ -0,0 +1,231 @@
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import structlog
+
+from services.executor import thread_pool
+from services.file_lock import InterProcessLock
+from services.loader import SUPPORTED_EXTENSIONS
+from services.manifest import HASH_BLOCK_SIZE, file_hash
+
+log = structlog.get_logger()
+
+# Uploads are copied to disk in UPLOAD_CHUNK_SIZE pieces off the event loop,
+# hashed (sha256) as they go. Each upload directory keeps an index of content
+# hash -> stored file, so a byte-identical re-upload resolves to the file
+# already stored (and, through the ingest manifest, to the vectors already
+# made from it) instead of a new copy. A file larger than
+# UPLOAD_MAX_FILE_BYTES is rejected with 413, and UploadLimitMiddleware cuts
+# off a request body at UPLOAD_MAX_REQUEST_BYTES while it is being received,
+# before it is spooled in full.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(HASH_BLOCK_SIZE)))
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+UPLOAD_INDEX_NAME = ".upload_index.json"
+
+# Held (by any worker process) while the index is read, updated and written
+_index_locks: Dict[str, InterProcessLock] = {}
+_index_locks_guard = threading.Lock()
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    sha256: str
+    size: int
+    duplicate: bool  # identical content was already stored; path is that earlier file
+
+
+def _index_lock(directory: str) -> InterProcessLock:
+    path = os.path.join(os.path.abspath(directory), f"{UPLOAD_INDEX_NAME}.lock")
+    with _index_locks_guard:
+        return _index_locks.setdefault(path, InterProcessLock(path))
+
+
+def _index_path(directory: str) -> str:
+    return os.path.join(directory, UPLOAD_INDEX_NAME)
+
+
+def _save_index(directory: str, index: Dict[str, dict]):
+    tmp_path = f"{_index_path(directory)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, _index_path(directory))
+
+
+def _load_index(directory: str) -> Dict[str, dict]:
+    """sha256 -> {"path", "size", ...}; built by hashing the stored files if there is no index yet."""
+    try:
+        with open(_index_path(directory), encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path) and name.lower().endswith(SUPPORTED_EXTENSIONS):
+                index.setdefault(file_hash(path), {"path": path, "size": os.path.getsize(path)})
+        if index:
+            log.info("Built upload index from existing files", directory=directory, files=len(index))
+            _save_index(directory, index)
+    except (OSError, ValueError) as e:
+        log.warning("Unreadable upload index, starting fresh", directory=directory, error=str(e))
+        index = {}
+    return index
+
+
+def _move_new(tmp_path: str, dest_path: str):
+    """Move tmp_path to dest_path, raising FileExistsError rather than overwrite, whoever else writes there."""
+    try:
+        os.link(tmp_path, dest_path)
+    except FileExistsError:
+        raise
+    except OSError:
+        # No hard links on this filesystem (some container volumes, FAT/SMB mounts):
+        # claim the name with an exclusive create, then move the upload over it
+        os.close(os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        os.replace(tmp_path, dest_path)
+    else:
+        os.remove(tmp_path)
+
+
+def _finish_upload(directory: str, tmp_path: str, filename: str, sha256: str, size: int) -> StoredUpload:
+    """Move a fully received upload into place, or drop it if identical content is already stored."""
+    with _index_lock(directory):
+        index = _load_index(directory)
+        known = index.get(sha256)
+        if known and os.path.isfile(known["path"]) and os.path.getsize(known["path"]) == size:
+            os.remove(tmp_path)
+            return StoredUpload(known["path"], sha256, size, duplicate=True)
+        # Same name, different content: keep both, the new one named after its content
+        name, ext = os.path.splitext(filename)
+        candidates = itertools.chain([filename, f"{name}_{sha256[:12]}{ext}"],
+                                     (f"{name}_{sha256[:12]}_{n}{ext}" for n in itertools.count(2)))
+        for candidate in candidates:
+            dest_path = os.path.join(directory, candidate)
+            try:
+                _move_new(tmp_path, dest_path)
+                break
+            except FileExistsError:
+                continue
+        index[sha256] = {"path": dest_path, "size": size, "filename": filename, "uploaded_at": time.time()}
+        _save_index(directory, index)
+        return StoredUpload(dest_path, sha256, size, duplicate=False)
+
+
+def _store_file(source, directory: str, filename: str, max_bytes: int) -> StoredUpload:
+    """Copy the binary file object source into directory while hashing it, then finish the upload."""
+    tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{filename} is larger than {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+        return _finish_upload(directory, tmp_path, filename, digest.hexdigest(), size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+async def store_upload(file, directory: str, max_bytes: int = UPLOAD_MAX_FILE_BYTES) -> StoredUpload:
+    """Copy an UploadFile into directory while hashing it; raises UploadTooLarge past max_bytes."""
+    filename = os.path.basename(file.filename or "") or f"upload-{uuid.uuid4().hex}"
+    try:
+        # The whole copy is one call: its chunks go straight from the spooled body to disk
+        await file.seek(0)
+        stored = await thread_pool.run(_store_file, file.file, directory, filename, max_bytes)
+    finally:
+        await file.close()
+    log.info("Stored upload", path=stored.path, bytes=stored.size, duplicate=stored.duplicate)
+    return stored
+
+
+def request_too_large(content_length: Optional[str], limit: int = UPLOAD_MAX_REQUEST_BYTES) -> bool:
+    """True when a declared Content-Length already exceeds the per-request limit."""
+    try:
+        return content_length is not None and int(content_length) > limit
+    except ValueError:
+        return False
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware answering 413 to upload requests whose body is over the limit.
+
+    A declared Content-Length over the limit is refused before any of the body
+    is read. Otherwise (chunked requests included) the bytes are counted as the
+    app receives them, and the request is cut off with 413 as soon as they pass
+    the limit; whatever the app tries to send after that is dropped.
+    """
+
+    def __init__(self, app, paths=(), limit: int = UPLOAD_MAX_REQUEST_BYTES):
+        self.app = app
+        self.paths = tuple(paths)
+        self.limit = limit
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Request larger than {self.limit} bytes"}).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode("latin-1")),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if request_too_large(content_length.decode("latin-1") if content_length else None, self.limit):
+            await self._reject(send)
+            return
+        received = 0
+        rejected = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.limit:
+                    if not rejected:
+                        log.warning("Upload request cut off", path=scope["path"], received=received,
+                                    limit=self.limit)
+                        if not response_started:
+                            await self._reject(send)
+                    rejected = True
+                    raise UploadTooLarge(f"Request larger than {self.limit} bytes")
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            if not rejected:
+                raise
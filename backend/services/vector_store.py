@@ -1,6 +1,10 @@
 import os
-from chromadb import PersistentClient
-from typing import List, Dict
+import re
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, List, Dict
 import structlog
 
 # Ensure the vector store directory exists
@@ -10,35 +14,244 @@ log = structlog.get_logger()
 DB_DIR = "vector_store"
 os.makedirs(DB_DIR, exist_ok=True)
 
-client = PersistentClient(path=DB_DIR)
-collection = client.get_or_create_collection(name="documents")
+# "chroma" (default) or "numpy" (services/numpy_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+COLLECTION_NAME = "documents"
+# Rewritten with a fresh token on every change to the collection, so caches of
+# derived results (in this or any other process) can tell when they went stale
+COLLECTION_VERSION_PATH = os.path.join(DB_DIR, "collection_version")
 
+# Documents live in namespaces (one per tenant or team): each has its own
+# collection, manifest, lexical index, answer cache and version token, and a
+# query only searches its own namespace. The default namespace keeps the
+# original locations above, so existing stores are picked up unchanged;
+# others live under DB_DIR/namespaces/<name>. At most MAX_LOADED_NAMESPACES
+# stores (and lexical indexes) are kept open, least recently used first out.
+# Chroma collections share one client, which keeps segments loaded on its own;
+# its segment cache is an LRU capped at CHROMA_MEMORY_LIMIT_BYTES instead.
+DEFAULT_NAMESPACE = os.getenv("DEFAULT_NAMESPACE", "default")
+NAMESPACES_DIR = os.path.join(DB_DIR, "namespaces")
+MAX_LOADED_NAMESPACES = int(os.getenv("MAX_LOADED_NAMESPACES", "16"))
+CHROMA_MEMORY_LIMIT_BYTES = int(os.getenv("CHROMA_MEMORY_LIMIT_BYTES", str(2 * 1024 ** 3)))
+_NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?$")
 
-def collection_exists() -> bool:
-    collections = client.list_collections()
-    print("Collections in DB:", collections)
-    return "documents" in collections
 
+def validate_namespace(namespace: str) -> str:
+    """namespace itself, or ValueError; the name becomes a directory and a Chroma collection name."""
+    if not isinstance(namespace, str) or not _NAMESPACE_PATTERN.match(namespace):
+        raise ValueError(f"Invalid namespace {namespace!r}: use 1-48 letters, digits, '-' or '_', "
+                         "starting and ending with a letter or digit")
+    return namespace
 
-def collection_is_empty() -> bool:
-    if "documents" not in client.list_collections():
-        return True
-    count = collection.count()
-    return count == 0
 
-def add_embeddings(vectors: List[Dict]):
-    
-    log.info("Adding embeddings", count=len(vectors))
+def namespace_dir(namespace: str = DEFAULT_NAMESPACE) -> str:
+    """Directory holding the namespace's files (DB_DIR itself for the default namespace)."""
+    if namespace == DEFAULT_NAMESPACE:
+        return DB_DIR
+    return os.path.join(NAMESPACES_DIR, validate_namespace(namespace))
+
+
+def list_namespaces() -> List[str]:
+    names = {DEFAULT_NAMESPACE}
+    if os.path.isdir(NAMESPACES_DIR):
+        names.update(n for n in os.listdir(NAMESPACES_DIR)
+                     if _NAMESPACE_PATTERN.match(n) and os.path.isdir(os.path.join(NAMESPACES_DIR, n)))
+    return sorted(names)
+
+
+class NamespaceLRU:
+    """Per-namespace objects built by factory(namespace) on first use.
+
+    Beyond max_loaded the least recently used one is dropped; callers still
+    holding it finish their work with it, the next get() opens it afresh.
+    """
+
+    def __init__(self, factory: Callable[[str], object], max_loaded: int = MAX_LOADED_NAMESPACES,
+                 kind: str = "store"):
+        self.factory = factory
+        self.max_loaded = max_loaded
+        self.kind = kind
+        self._items: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str = DEFAULT_NAMESPACE):
+        with self._lock:
+            item = self._items.get(namespace)
+            if item is not None:
+                self._items.move_to_end(namespace)
+                return item
+            validate_namespace(namespace)
+            item = self._items[namespace] = self.factory(namespace)
+            while len(self._items) > self.max_loaded:
+                evicted, _ = self._items.popitem(last=False)
+                log.info("Unloaded namespace", kind=self.kind, namespace=evicted)
+            return item
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._items)
+
+
+class VectorStore(ABC):
+    """Interface implemented by the vector store backends.
+
+    query() returns Chroma-shaped results: {"ids": [[...]], "documents": [[...]],
+    "metadatas": [[...]], "distances": [[...]]} for the single query vector,
+    plus "embeddings": [[...]] with include_embeddings=True. Distances rank
+    within one backend only: ChromaStore returns Chroma's default squared L2,
+    NumpyStore cosine distance.
+    """
+
+    @abstractmethod
+    def add(self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict], documents: List[str]):
+        ...
+
+    @abstractmethod
+    def query(self, query_emb: List[float], top_k: int, include_embeddings: bool = False) -> Dict:
+        ...
+
+    @abstractmethod
+    def get_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        """Stored vectors of the given chunk ids; ids not in the store are left out."""
+
+    @abstractmethod
+    def delete_document(self, doc_id: str):
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    def refresh(self):
+        """Pick up changes written by another process; a no-op where the backend does that itself."""
+
+
+_chroma_clients: Dict[str, object] = {}
+
+
+class ChromaStore(VectorStore):
+    def __init__(self, path: str = DB_DIR, name: str = COLLECTION_NAME):
+        from chromadb import PersistentClient
+        from chromadb.config import Settings
+
+        self.name = name
+        # One client per directory, shared by every namespace's collection; unloading
+        # a ChromaStore frees nothing, the client evicts segments past the memory limit
+        if path not in _chroma_clients:
+            settings = Settings(chroma_segment_cache_policy="LRU",
+                                chroma_memory_limit_bytes=CHROMA_MEMORY_LIMIT_BYTES)
+            _chroma_clients[path] = PersistentClient(path=path, settings=settings)
+        self.client = _chroma_clients[path]
+        self.collection = self.client.get_or_create_collection(name=name)
+
+    def add(self, ids, embeddings, metadatas, documents):
+        self.collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=documents)
+
+    def query(self, query_emb, top_k, include_embeddings=False):
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        return self.collection.query(query_embeddings=[query_emb], n_results=top_k, include=include)
+
+    def get_embeddings(self, ids):
+        results = self.collection.get(ids=ids, include=["embeddings"])
+        return {id_: list(emb) for id_, emb in zip(results["ids"], results["embeddings"])}
+
+    def delete_document(self, doc_id):
+        self.collection.delete(where={"doc_id": doc_id})
+
+    def count(self):
+        if self.name not in self.client.list_collections():
+            return 0
+        return self.collection.count()
+
+    def clear(self):
+        self.client.delete_collection(name=self.name)
+        self.collection = self.client.get_or_create_collection(name=self.name)
+
+
+def _open_store(namespace: str) -> VectorStore:
+    if VECTOR_BACKEND == "numpy":
+        from services.numpy_store import NumpyStore
+        store = NumpyStore(os.path.join(namespace_dir(namespace), "numpy_index"))
+    elif VECTOR_BACKEND == "chroma":
+        name = COLLECTION_NAME if namespace == DEFAULT_NAMESPACE else f"{COLLECTION_NAME}-{namespace}"
+        store = ChromaStore(DB_DIR, name)
+    else:
+        raise ValueError(f"Unknown VECTOR_BACKEND: {VECTOR_BACKEND}")
+    log.info("Opened vector store", backend=VECTOR_BACKEND, namespace=namespace)
+    return store
+
+
+_stores = NamespaceLRU(_open_store, kind="vector_store")
+
+
+def get_store(namespace: str = DEFAULT_NAMESPACE) -> VectorStore:
+    """The configured backend for namespace, opened on first use."""
+    return _stores.get(namespace)
+
+
+def loaded_namespaces() -> List[str]:
+    return _stores.loaded()
+
+
+def collection_version_path(namespace: str = DEFAULT_NAMESPACE) -> str:
+    if namespace == DEFAULT_NAMESPACE:
+        return COLLECTION_VERSION_PATH
+    return os.path.join(namespace_dir(namespace), "collection_version")
+
+
+def collection_version(namespace: str = DEFAULT_NAMESPACE) -> str:
+    try:
+        with open(collection_version_path(namespace), encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_collection_version(namespace: str = DEFAULT_NAMESPACE):
+    path = collection_version_path(namespace)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+
+def collection_is_empty(namespace: str = DEFAULT_NAMESPACE) -> bool:
+    return get_store(namespace).count() == 0
+
+def add_embeddings(vectors: List[Dict], namespace: str = DEFAULT_NAMESPACE):
+    """Store one batch of a document's chunks.
+
+    Leaves the collection version alone: each bump flushes every worker's
+    answer cache, so the caller bumps once the whole document is written.
+    """
+    log.info("Adding embeddings", count=len(vectors), namespace=namespace)
     ids = [v["id"] for v in vectors]
     embs = [v["embedding"] for v in vectors]
     metas = [v["metadata"] for v in vectors]
     docs = [v["text"] for v in vectors]
-    collection.add(ids=ids, embeddings=embs, metadatas=metas, documents=docs)
+    get_store(namespace).add(ids=ids, embeddings=embs, metadatas=metas, documents=docs)
+
+def query_embeddings(query_emb: List[float], top_k: int = 5, include_embeddings: bool = False,
+                     namespace: str = DEFAULT_NAMESPACE) -> Dict:
+    log.info("Querying embeddings", top_k=top_k, namespace=namespace)
+    return get_store(namespace).query(query_emb, top_k, include_embeddings=include_embeddings)
+
+def get_embeddings(ids: List[str], namespace: str = DEFAULT_NAMESPACE) -> Dict[str, List[float]]:
+    return get_store(namespace).get_embeddings(ids)
 
-def query_embeddings(query_emb: List[float], top_k: int = 5) -> Dict:
-    log.info("Querying embeddings", top_k=top_k)
-    return collection.query(query_embeddings=[query_emb], n_results=top_k)
+def delete_document(doc_id: str, namespace: str = DEFAULT_NAMESPACE):
+    log.info("Deleting document embeddings", doc_id=doc_id, namespace=namespace)
+    get_store(namespace).delete_document(doc_id)
+    bump_collection_version(namespace)
 
-def clear_collection():
-    log.info("Clearing collection")
-    client.delete_collection(name="documents")
+def clear_collection(namespace: str = DEFAULT_NAMESPACE):
+    log.info("Clearing collection", namespace=namespace)
+    get_store(namespace).clear()
+    bump_collection_version(namespace)
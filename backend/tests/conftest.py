@@ -0,0 +1,35 @@
+import os
+import re
+import sys
+import tempfile
+
+import pytest
+
+# Imported the way the app runs them: from backend/, as top-level "services" etc.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Services keep their state under paths relative to the working directory (vector_store/...)
+os.chdir(tempfile.mkdtemp(prefix="rag-chatbot-tests-"))
+
+
+class CharEncoder:
+    """One token per character, except "..." (one token in cl100k too): an offline stand-in for tiktoken."""
+
+    ELLIPSIS = -1
+
+    def encode(self, text):
+        return [self.ELLIPSIS if token == "..." else ord(token) for token in re.findall(r"\.\.\.|.", text, re.S)]
+
+    def decode(self, tokens):
+        return "".join("..." if token == self.ELLIPSIS else chr(token) for token in tokens)
+
+
+@pytest.fixture
+def char_encoder(monkeypatch):
+    import services.chunker
+    import services.conversations
+    import services.prompt
+
+    encoder = CharEncoder()
+    for module in (services.chunker, services.conversations, services.prompt):
+        monkeypatch.setattr(module, "get_encoder", lambda: encoder)
+    return encoder
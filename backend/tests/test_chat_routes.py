@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+
+import pytest
+
+from api import routes
+from api.routes import ChatRequest, Message
+from services.conversations import conversation_store
+
+
+class StubPipeline:
+    """astream stand-in: yields tokens, then waits on `block` (if given) before finishing."""
+
+    def __init__(self, tokens, block=None):
+        self.tokens = tokens
+        self.block = block
+        self.started = asyncio.Event()
+
+    async def astream(self, query_text, history=None, retrieval_query=None):
+        async def tokens():
+            for token in self.tokens:
+                yield token
+            self.started.set()
+            if self.block is not None:
+                await self.block.wait()
+
+        return [{"document": "text", "metadata": {"doc_id": "a.pdf"}}], tokens()
+
+
+@pytest.fixture
+def pipeline(monkeypatch, char_encoder):
+    holder = {}
+
+    async def get_pipeline(namespace):
+        return holder["pipeline"]
+
+    monkeypatch.setattr(routes, "get_pipeline", get_pipeline)
+    return holder
+
+
+def request(question):
+    return ChatRequest(conversation_id=uuid.uuid4().hex, messages=[Message(role="user", content=question)])
+
+
+def stored(conversation_id):
+    conversation = conversation_store.get(conversation_id)
+    return [] if conversation is None else [(m.role, m.content) for m in conversation.messages]
+
+
+def test_chat_keeps_the_question_and_the_cleaned_answer(pipeline):
+    async def main():
+        pipeline["pipeline"] = StubPipeline(["Paris ", "[geo.pdf:1-9]", "is the capital."])
+        req = request(f"capital {uuid.uuid4().hex}?")
+        response = await routes.chat(req)
+        assert response.response == "Paris is the capital."
+        return req
+
+    req = asyncio.run(main())
+    assert stored(req.conversation_id) == [("user", req.messages[0].content), ("bot", "Paris is the capital.")]
+
+
+def test_chat_rolls_back_the_question_when_the_client_disconnects(pipeline):
+    async def main():
+        stub = pipeline["pipeline"] = StubPipeline(["partial"], block=asyncio.Event())
+        req = request(f"slow {uuid.uuid4().hex}?")
+        task = asyncio.create_task(routes.chat(req))
+        await asyncio.wait_for(stub.started.wait(), 5)
+        assert stored(req.conversation_id) == [("user", req.messages[0].content)]
+        task.cancel()  # what the server does when the client goes away
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return req
+
+    req = asyncio.run(main())
+    assert stored(req.conversation_id) == []
+
+
+def test_chat_rolls_back_the_question_when_generation_fails(pipeline):
+    class Failing(StubPipeline):
+        async def astream(self, query_text, history=None, retrieval_query=None):
+            raise RuntimeError("LLM down")
+
+    async def main():
+        pipeline["pipeline"] = Failing([])
+        req = request(f"fails {uuid.uuid4().hex}?")
+        with pytest.raises(routes.HTTPException) as error:
+            await routes.chat(req)
+        assert error.value.status_code == 500
+        return req
+
+    req = asyncio.run(main())
+    assert stored(req.conversation_id) == []
+
+
+def test_abandoned_stream_rolls_back_the_question(pipeline):
+    async def main():
+        stub = pipeline["pipeline"] = StubPipeline(["partial"], block=asyncio.Event())
+        req = request(f"stream {uuid.uuid4().hex}?")
+        response = await routes.chat_stream(req)
+        events = response.body_iterator
+        assert (await events.__anext__()).startswith("event: sources")
+        assert (await events.__anext__()).startswith("event: token")
+        await asyncio.wait_for(stub.started.wait(), 5)
+        await events.aclose()  # the client went away mid-stream
+        return req
+
+    req = asyncio.run(main())
+    assert stored(req.conversation_id) == []
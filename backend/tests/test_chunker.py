@@ -0,0 +1,58 @@
+import pytest
+
+from services.chunker import MAX_TOKENS, OVERLAP, chunk_text, iter_chunks
+
+STEP = MAX_TOKENS - OVERLAP
+
+
+def pages(sizes):
+    return ["".join(chr(ord("a") + (p + i) % 26) for i in range(size)) for p, size in enumerate(sizes)]
+
+
+def as_tuples(chunks):
+    return [(c.text, c.metadata) for c in chunks]
+
+
+@pytest.mark.parametrize("sizes", [
+    [10],
+    [MAX_TOKENS],
+    [MAX_TOKENS - 1, 1],
+    [MAX_TOKENS + 1],
+    [5, 500, 0, 37],
+    [STEP] * 7,
+    [1000],
+])
+def test_iter_chunks_matches_chunk_text_over_joined_pages(char_encoder, sizes):
+    texts = pages(sizes)
+    streamed = as_tuples(iter_chunks(texts, "doc"))
+    assert streamed == as_tuples(chunk_text("\n".join(texts), "doc"))
+
+
+def test_iter_chunks_accepts_a_generator(char_encoder):
+    texts = pages([300, 300])
+    assert as_tuples(iter_chunks(iter(texts), "doc")) == as_tuples(iter_chunks(texts, "doc"))
+
+
+def test_windows_overlap_and_cover_the_text(char_encoder):
+    text = pages([1000])[0]
+    chunks = chunk_text(text, "doc")
+    assert [c.metadata["start"] for c in chunks] == list(range(0, 1000, STEP))
+    for chunk in chunks:
+        start, end = chunk.metadata["start"], chunk.metadata["end"]
+        assert end == min(start + MAX_TOKENS, 1000)
+        assert chunk.text == text[start:end]
+        assert chunk.metadata["doc_id"] == "doc"
+
+
+def test_empty_input_has_no_chunks(char_encoder):
+    assert list(iter_chunks([], "doc")) == []
+    assert chunk_text("", "doc") == []
+
+
+def test_chunk_text_logs_the_token_count(char_encoder, monkeypatch):
+    from services import chunker
+
+    events = []
+    monkeypatch.setattr(chunker.log, "info", lambda event, **fields: events.append((event, fields)))
+    chunk_text(pages([1000])[0], "doc")
+    assert events[-1] == ("Generated chunks", {"doc_id": "doc", "chunks": 7, "total_tokens": 1000})
@@ -0,0 +1,51 @@
+import pytest
+
+from services.citations import CitationStripper, clean_response
+
+ANSWERS = [
+    "Revenue grew 10% [reports/q1.pdf:10-50] in Q1.",
+    "  Leading space and [a.pdf:1-2][b.pdf:3-4] two citations.  ",
+    "Keeps [plain brackets] and [notes.pdf page 3] drops PDF ones.",
+    "Nested [see [doc.pdf:5-9] above] stays partly.",
+    "No citations at all.",
+    "Ends with a citation [x.pdf:0-200]",
+]
+
+
+def stream(stripper, tokens):
+    return "".join(stripper.feed(token) for token in tokens) + stripper.flush()
+
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_whole_text_matches_clean_response(answer):
+    assert stream(CitationStripper(), [answer]) == clean_response(answer)
+
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_every_two_token_split_matches_clean_response(answer):
+    for cut in range(len(answer) + 1):
+        assert stream(CitationStripper(), [answer[:cut], answer[cut:]]) == clean_response(answer), cut
+
+
+@pytest.mark.parametrize("answer", ANSWERS)
+def test_character_tokens_match_clean_response(answer):
+    assert stream(CitationStripper(), list(answer)) == clean_response(answer)
+
+
+def test_text_before_a_bracket_is_not_held_back():
+    stripper = CitationStripper()
+    assert stripper.feed("See ") == "See"  # trailing space waits for more text
+    assert stripper.feed("the [report") == " the"
+    assert stripper.feed(".pdf:1-9] now") == "  now"
+
+
+def test_unclosed_bracket_is_released_past_the_limit():
+    stripper = CitationStripper()
+    text = "[" + "x" * (CitationStripper.MAX_PENDING + 1)
+    assert stripper.feed(text) == text
+
+
+def test_unclosed_bracket_is_released_on_flush():
+    stripper = CitationStripper()
+    assert stripper.feed("open [bracket") == "open"
+    assert stripper.flush() == " [bracket"
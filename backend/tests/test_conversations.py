@@ -0,0 +1,161 @@
+import multiprocessing
+import os
+
+import pytest
+
+from services import conversations
+from services.conversations import Conversation, ConversationStore
+
+
+@pytest.fixture
+def budgets(monkeypatch, char_encoder):
+    """Small budgets, counted in characters (see CharEncoder)."""
+    monkeypatch.setattr(conversations, "HISTORY_TOKEN_BUDGET", 30)
+    monkeypatch.setattr(conversations, "SUMMARY_TOKEN_BUDGET", 12)
+    monkeypatch.setattr(conversations, "SUMMARY_LINE_TOKENS", 5)
+
+
+@pytest.fixture
+def store(tmp_path, char_encoder):
+    return ConversationStore(state_dir=str(tmp_path))
+
+
+def touched(store, conversation_id):
+    """Moves a conversation file's mtime on, as coarse filesystem timestamps may not have."""
+    path = store._path(conversation_id)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_old_turns_fold_into_a_summary_of_the_questions(budgets):
+    conversation = Conversation("c")
+    for i in range(3):
+        conversation.add("user", f"question {i}")
+        conversation.add("bot", f"answer {i}")
+
+    assert conversation.history_tokens <= 30
+    assert [m.content for m in conversation.messages] == ["answer 1", "question 2", "answer 2"]
+    assert conversation.summary == ["quest", "quest"]
+    assert conversation.summary_tokens == 10
+
+
+def test_summary_keeps_the_latest_questions_within_its_budget(budgets):
+    conversation = Conversation("c")
+    for i in range(6):
+        conversation.add("user", f"q{i} " + "x" * 30)
+
+    assert conversation.summary == ["q3 xx", "q4 xx"]
+    assert [m.content[:2] for m in conversation.messages] == ["q5"]
+
+
+def test_history_leaves_out_the_latest_question(budgets):
+    conversation = Conversation("c")
+    for i in range(2):
+        conversation.add("user", f"question {i}")
+        conversation.add("bot", f"answer {i}")
+    conversation.add("user", "next")
+
+    assert conversation.history() == [
+        {"role": "system", "content": "Earlier in this conversation the user asked:\n- quest"},
+        {"role": "assistant", "content": "answer 0"},
+        {"role": "user", "content": "question 1"},
+        {"role": "assistant", "content": "answer 1"},
+    ]
+    assert conversation.latest_question() == "next"
+
+
+def test_short_follow_up_borrows_the_previous_question(budgets, monkeypatch):
+    monkeypatch.setattr(conversations, "RETRIEVAL_QUERY_MAX_TOKENS", 20)
+    conversation = Conversation("c")
+    assert conversation.retrieval_query() is None
+    conversation.add("user", "what does the pump cost")
+    assert conversation.retrieval_query() == "what does the pump c"
+    conversation.add("bot", "100")
+    conversation.add("user", "and its weight?")
+    assert conversation.retrieval_query() == "and its weight?"
+    conversation.add("user", "weight?")
+
+    assert conversation.retrieval_query() == "and its weight?\nweig"
+
+
+def test_round_trips_through_a_dict(budgets):
+    conversation = Conversation("c")
+    for i in range(3):
+        conversation.add("user", f"question {i}")
+
+    restored = Conversation.from_dict(conversation.to_dict())
+
+    assert restored == conversation
+
+
+def test_another_process_sees_and_continues_a_conversation(tmp_path, char_encoder):
+    first, second = ConversationStore(state_dir=str(tmp_path)), ConversationStore(state_dir=str(tmp_path))
+    first.add_messages("c", [{"role": "user", "content": "hi"}, {"role": "bot", "content": "hello"}])
+    assert first.get("c").messages[-1].content == "hello"
+
+    second.add_messages("c", [{"role": "user", "content": "again"}])
+    touched(second, "c")
+
+    assert [m.content for m in first.get("c").messages] == ["hi", "hello", "again"]
+    assert first.get("missing") is None
+
+
+def _add_turns(state_dir, worker, count):
+    store = ConversationStore(state_dir=state_dir)
+    for i in range(count):
+        store.add_messages("shared", [{"role": "user", "content": f"{worker}-{i}"}])
+
+
+def test_messages_added_from_several_processes_are_all_kept(tmp_path, char_encoder):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_turns, args=(str(tmp_path), worker, 20)) for worker in "abc"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+    contents = [m.content for m in ConversationStore(state_dir=str(tmp_path)).get("shared").messages]
+    assert sorted(contents) == sorted(f"{worker}-{i}" for worker in "abc" for i in range(20))
+
+
+def test_rollback_removes_only_the_latest_messages(store):
+    store.add_messages("c", [{"role": "user", "content": "first"}, {"role": "bot", "content": "answer"}])
+    turn = [{"role": "user", "content": "second"}]
+    store.add_messages("c", turn)
+    store.add_messages("c", [{"role": "user", "content": "third"}])
+
+    store.rollback("c", turn)  # no longer the latest: kept
+    assert [m.content for m in store.get("c").messages] == ["first", "answer", "second", "third"]
+
+    store.rollback("c", [{"role": "user", "content": "third"}])
+    assert [m.content for m in store.get("c").messages] == ["first", "answer", "second"]
+
+
+def test_rolling_back_the_only_turn_removes_the_conversation(store):
+    turn = [{"role": "user", "content": "hi"}]
+    store.add_messages("c", turn)
+
+    store.rollback("c", turn)
+
+    assert store.get("c") is None
+    assert not os.path.exists(store._path("c"))
+
+
+def test_idle_conversations_expire(tmp_path, char_encoder):
+    store = ConversationStore(ttl=60, state_dir=str(tmp_path))
+    conversation = store.add_messages("c", [{"role": "user", "content": "hi"}])
+    conversation.last_active -= 120
+    store._save(conversation)
+
+    assert store.get("c") is None
+
+
+def test_memory_bound_drops_cached_conversations_not_saved_ones(tmp_path, char_encoder):
+    size = conversations.MESSAGE_OVERHEAD_BYTES + len("hi")
+    store = ConversationStore(max_bytes=size * 2, state_dir=str(tmp_path))
+    for conversation_id in "abc":
+        store.add_messages(conversation_id, [{"role": "user", "content": "hi"}])
+
+    assert store.stats() == {"cached_conversations": 2, "cached_bytes": size * 2}
+    assert store.get("a").messages[0].content == "hi"
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+from services import vector_store
+from services.coordination import VersionWatcher, WorkerRole
+from services.lexical_index import get_lexical_index
+from services.vector_store import add_embeddings, bump_collection_version, get_store
+
+
+def _lead(path, elected, release):
+    role = WorkerRole(path)
+    elected.put(role.elect())
+    release.wait(30)
+    # Exits without resigning: the kernel drops the flock with the process
+
+
+@pytest.fixture
+def leader(tmp_path):
+    """Starts another process that elects itself leader and exits once released."""
+    context = multiprocessing.get_context("fork")
+    elected, release = context.Queue(), context.Event()
+    path = str(tmp_path / "leader.lock")
+    process = context.Process(target=_lead, args=(path, elected, release))
+    process.start()
+    assert elected.get(timeout=10) is True
+    yield path, process, release
+    release.set()
+    process.join(10)
+
+
+def test_only_one_process_is_leader(leader):
+    path, process, _ = leader
+    role = WorkerRole(path)
+
+    assert role.elect() is False
+    assert not role.is_leader
+    assert role.leader_pid() == process.pid
+    assert role.to_dict() == {"pid": os.getpid(), "role": "follower", "leader_pid": process.pid}
+
+
+def test_a_follower_takes_over_when_the_leader_exits(leader):
+    path, process, release = leader
+    role = WorkerRole(path)
+    assert role.elect() is False
+
+    release.set()
+    process.join(10)
+
+    assert role.elect() is True
+    assert role.is_leader
+    assert role.leader_pid() == os.getpid()
+    assert role.elect() is True
+
+
+def test_resigning_lets_another_worker_lead(tmp_path):
+    path = str(tmp_path / "leader.lock")
+    first, second = WorkerRole(path), WorkerRole(path)
+    assert first.elect() is True
+    assert second.elect() is False
+
+    first.resign()
+
+    assert not first.is_leader
+    assert second.elect() is True
+    second.resign()
+
+
+@pytest.fixture
+def namespace(monkeypatch):
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "numpy")
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def vectors(doc_id, count):
+    return [{"id": f"{doc_id}-{i}", "embedding": [float(i + 1), 1.0, 0.5], "metadata": {"doc_id": doc_id},
+             "text": f"{doc_id} chunk {i}"} for i in range(count)]
+
+
+def _write_document(namespace, doc_id, count):
+    add_embeddings(vectors(doc_id, count), namespace=namespace)
+    get_lexical_index(namespace).add(vectors(doc_id, count))
+    bump_collection_version(namespace)
+
+
+def test_watcher_reloads_what_another_process_wrote(namespace, monkeypatch):
+    _write_document(namespace, "a", 2)
+    store, lexical = get_store(namespace), get_lexical_index(namespace)
+    refreshed, store_refresh = [], store.refresh
+
+    def refresh():
+        refreshed.append(namespace)
+        store_refresh()
+
+    monkeypatch.setattr(store, "refresh", refresh)
+    watcher = VersionWatcher()
+    assert watcher.poll() == []
+    assert watcher.poll() == []
+
+    context = multiprocessing.get_context("fork")
+    writer = context.Process(target=_write_document, args=(namespace, "b", 3))
+    writer.start()
+    writer.join(30)
+    assert writer.exitcode == 0
+
+    assert len(lexical) == 2
+    assert namespace in watcher.poll()
+    assert refreshed == [namespace]
+    assert store.count() == 5
+    assert len(lexical) == 5
+    assert namespace not in watcher.poll()
+
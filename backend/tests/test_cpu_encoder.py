@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from services.cpu_encoder import length_buckets, padded_tokens
+
+
+def random_lengths(seed, n=500):
+    rng = random.Random(seed)
+    return [rng.choice([rng.randint(5, 40), rng.randint(100, 512)]) for _ in range(n)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("batch_tokens, max_batch, min_fill", [(8192, 64, 0.0), (2048, 16, 0.5), (512, 128, 0.9)])
+def test_buckets_cover_every_text_within_their_limits(seed, batch_tokens, max_batch, min_fill):
+    lengths = random_lengths(seed)
+    buckets = length_buckets(lengths, batch_tokens, max_batch, min_fill)
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    # Shortest first, within and across buckets
+    flat = [lengths[i] for bucket in buckets for i in bucket]
+    assert flat == sorted(flat)
+    for bucket in buckets:
+        longest = max(lengths[i] for i in bucket)
+        assert len(bucket) <= max_batch
+        if len(bucket) > 1:
+            assert len(bucket) * longest <= batch_tokens
+            assert sum(lengths[i] for i in bucket) >= min_fill * len(bucket) * longest
+
+
+def test_bucketing_pads_less_than_fixed_batches():
+    lengths = random_lengths(0)
+    fixed = [list(range(start, min(start + 32, len(lengths)))) for start in range(0, len(lengths), 32)]
+    assert padded_tokens(lengths, length_buckets(lengths, 8192, 32, 0.0)) < padded_tokens(lengths, fixed) / 2
+
+
+def test_a_text_longer_than_the_budget_gets_its_own_bucket():
+    assert length_buckets([10, 5000, 10], batch_tokens=100, max_batch=8, min_fill=0.0) == [[0, 2], [1]]
+
+
+def test_min_fill_splits_mixed_lengths():
+    lengths = [10, 10, 10, 100]
+    assert length_buckets(lengths, batch_tokens=1000, max_batch=8, min_fill=0.0) == [[0, 1, 2, 3]]
+    assert length_buckets(lengths, batch_tokens=1000, max_batch=8, min_fill=0.5) == [[0, 1, 2], [3]]
+
+
+def test_padded_tokens():
+    assert padded_tokens([3, 7, 5], [[0, 2], [1]]) == 2 * 5 + 7
+    assert length_buckets([]) == []
@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from services.embedding_cache import EmbeddingCache
+
+DIM = 8
+
+
+def vector(i):
+    return np.full(DIM, i, dtype=np.float32)
+
+
+def texts(*numbers):
+    return [f"text {i}" for i in numbers]
+
+
+def touched(cache):
+    """Moves index.json's mtime on, as coarse filesystem timestamps may not have."""
+    stat = os.stat(cache.index_path)
+    os.utime(cache.index_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return cache
+
+
+@pytest.fixture
+def root(tmp_path):
+    return str(tmp_path)
+
+
+def test_put_then_get(root):
+    cache = EmbeddingCache("some/model", root=root)
+    cache.put_many(texts(1, 2), np.stack([vector(1), vector(2)]))
+
+    hits = EmbeddingCache("some/model", root=root).get_many(texts(2, 3, 1))
+
+    assert hits[1] is None
+    np.testing.assert_array_equal(hits[0], vector(2))
+    np.testing.assert_array_equal(hits[2], vector(1))
+
+
+def test_full_cache_evicts_least_recently_used(root):
+    cache = EmbeddingCache("model", root=root, max_entries=10)
+    for i in range(10):
+        cache.put_many(texts(i), vector(i)[None])
+    cache.get_many(texts(0))
+
+    cache.put_many(texts(10), vector(10)[None])
+
+    assert len(cache) == 10
+    hits = cache.get_many(texts(0, 1, 10))
+    assert hits[1] is None
+    np.testing.assert_array_equal(hits[0], vector(0))
+    np.testing.assert_array_equal(hits[2], vector(10))
+
+
+def test_hits_survive_another_process_writing(root):
+    reader = EmbeddingCache("model", root=root, max_entries=10)
+    writer = EmbeddingCache("model", root=root, max_entries=10)
+    for i in range(9):
+        reader.put_many(texts(i), vector(i)[None])
+    reader.get_many(texts(0))
+    # Rewrites the index before the reader saves its hit: the reader reloads it first
+    writer.put_many(texts(9), vector(9)[None])
+    touched(writer)
+    reader.flush()
+    touched(reader)
+
+    writer.put_many(texts(10), vector(10)[None])
+
+    hits = writer.get_many(texts(0, 1))
+    assert hits[1] is None
+    np.testing.assert_array_equal(hits[0], vector(0))
+
+
+def test_flush_without_hits_leaves_index_alone(root):
+    cache = EmbeddingCache("model", root=root)
+    cache.put_many(texts(1), vector(1)[None])
+    mtime = os.stat(cache.index_path).st_mtime_ns
+    cache.get_many(texts(2))
+
+    cache.flush()
+
+    assert os.stat(cache.index_path).st_mtime_ns == mtime
+
+
+def _use_cache(root, seed, rounds, errors):
+    cache = EmbeddingCache("model", root=root, max_entries=16)
+    rng = np.random.default_rng(seed)
+    for _ in range(rounds):
+        numbers = rng.choice(40, size=3, replace=False).tolist()
+        for number, hit in zip(numbers, cache.get_many(texts(*numbers))):
+            if hit is not None and not np.array_equal(hit, vector(number)):
+                errors.put((number, hit[0].item()))
+        missing = [n for n, hit in zip(numbers, cache.get_many(texts(*numbers))) if hit is None]
+        if missing:
+            cache.put_many(texts(*missing), np.stack([vector(n) for n in missing]))
+        else:
+            cache.flush()
+
+
+def test_processes_sharing_a_cache_read_their_own_vectors(root):
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [context.Process(target=_use_cache, args=(root, seed, 200, errors)) for seed in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+    assert errors.empty()
+    assert len(EmbeddingCache("model", root=root, max_entries=16)) <= 16
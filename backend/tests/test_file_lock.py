@@ -0,0 +1,110 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from services.file_lock import InterProcessLock
+
+
+def _hold(path, shared, locked, release):
+    with InterProcessLock(path, shared=shared):
+        locked.set()
+        release.wait(30)
+
+
+@pytest.fixture
+def holder(tmp_path):
+    """Starts another process holding the lock on path (shared or not) until the test ends."""
+    context = multiprocessing.get_context("fork")
+    processes = []
+    release = context.Event()
+
+    def start(path, shared=False):
+        locked = context.Event()
+        process = context.Process(target=_hold, args=(path, shared, locked, release))
+        process.start()
+        processes.append(process)
+        assert locked.wait(10)
+
+    yield start
+    release.set()
+    for process in processes:
+        process.join(10)
+    assert [process.exitcode for process in processes] == [0] * len(processes)
+
+
+def acquired_within(lock, timeout):
+    """Acquires lock on another thread; True if that took less than timeout.
+
+    The thread releases the lock at once; one still waiting for it does so
+    whenever it gets it.
+    """
+    done = threading.Event()
+
+    def take():
+        with lock:
+            done.set()
+
+    thread = threading.Thread(target=take, daemon=True)
+    thread.start()
+    if not done.wait(timeout):
+        return False
+    thread.join(10)
+    return True
+
+
+def test_exclusive_lock_waits_for_another_process(tmp_path, holder):
+    path = str(tmp_path / "a.lock")
+    holder(path)
+
+    assert not acquired_within(InterProcessLock(path), 0.3)
+    assert not acquired_within(InterProcessLock(path, shared=True), 0.3)
+    assert acquired_within(InterProcessLock(str(tmp_path / "other.lock")), 5)
+
+
+def test_exclusive_lock_is_taken_once_the_other_process_releases(tmp_path):
+    path = str(tmp_path / "a.lock")
+    context = multiprocessing.get_context("fork")
+    locked, release = context.Event(), context.Event()
+    process = context.Process(target=_hold, args=(path, False, locked, release))
+    process.start()
+    assert locked.wait(10)
+    taken = threading.Event()
+
+    def take():
+        with InterProcessLock(path):
+            taken.set()
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    assert not taken.wait(0.3)
+
+    release.set()
+
+    assert taken.wait(10)
+    thread.join(10)
+    process.join(10)
+
+
+def test_shared_locks_of_two_processes_hold_together(tmp_path, holder):
+    path = str(tmp_path / "a.lock")
+    holder(path, shared=True)
+
+    assert acquired_within(InterProcessLock(path, shared=True), 5)
+    assert not acquired_within(InterProcessLock(path), 0.3)
+
+
+def test_reentrant_within_a_thread_exclusive_across_threads(tmp_path):
+    lock = InterProcessLock(str(tmp_path / "a.lock"))
+    with lock:
+        with lock:
+            assert not acquired_within(lock, 0.3)
+        assert not acquired_within(lock, 0.3)
+    assert acquired_within(lock, 5)
+
+
+def test_lock_file_is_created_with_its_directory(tmp_path):
+    path = tmp_path / "missing" / "dir" / "a.lock"
+    with InterProcessLock(str(path)):
+        assert path.exists()
+    assert path.exists()
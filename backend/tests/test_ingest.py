@@ -0,0 +1,157 @@
+import hashlib
+import multiprocessing
+import threading
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from factory import rag_factory
+from factory.rag_factory import RAGPipeline
+from services import vector_store
+from services.lexical_index import get_lexical_index
+from services.manifest import ingest_lock, load_manifest
+from services.vector_store import get_store
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def stub_embed(chunks, start_index=0):
+    results = []
+    for idx, chunk in enumerate(chunks, start_index):
+        seed = int.from_bytes(hashlib.sha256(chunk.text.encode()).digest()[:8], "little")
+        results.append({
+            "id": f"{chunk.metadata['doc_id']}-{idx}",
+            "embedding": np.random.default_rng(seed).normal(size=8).tolist(),
+            "metadata": chunk.metadata,
+            "text": chunk.text,
+        })
+    return results
+
+
+@pytest.fixture
+def namespace(monkeypatch, char_encoder):
+    monkeypatch.setattr(vector_store, "VECTOR_BACKEND", "numpy")
+    monkeypatch.setattr(rag_factory, "PARALLEL_PDF_LOADING", False)
+    monkeypatch.setattr(rag_factory, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(rag_factory, "embed_chunks", stub_embed)
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def write_doc(tmp_path, name, size=1000):
+    path = tmp_path / name
+    path.write_text(" ".join(WORDS[(i * 7 + len(name)) % len(WORDS)] for i in range(size // 6)))
+    return str(path)
+
+
+def expected_chunks(path):
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for _ in rag_factory.iter_chunks([f.read()], path))
+
+
+def run_all(*targets):
+    errors = []
+
+    def run(target):
+        try:
+            target()
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(target,)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    return errors
+
+
+def test_ingest_is_incremental(tmp_path, namespace):
+    doc = write_doc(tmp_path, "a.txt")
+    RAGPipeline([doc], namespace).ingest()
+    chunks = get_store(namespace).count()
+    assert chunks == expected_chunks(doc) > 1
+    assert load_manifest(namespace)[doc]["chunks"] == chunks
+
+    stages = []
+    RAGPipeline([doc], namespace).ingest(progress=lambda path, stage, **counts: stages.append(stage))
+    assert stages == ["skipped"]
+    assert get_store(namespace).count() == chunks
+
+
+def test_ingests_of_one_namespace_run_one_at_a_time(tmp_path, namespace, monkeypatch):
+    active, overlaps = set(), []
+    guard = threading.Lock()
+
+    def slow_embed(chunks, start_index=0):
+        doc_id = chunks[0].metadata["doc_id"]
+        with guard:
+            active.add(doc_id)
+            overlaps.append(len(active))
+        time.sleep(0.005)
+        with guard:
+            active.discard(doc_id)
+        return stub_embed(chunks, start_index)
+
+    monkeypatch.setattr(rag_factory, "embed_chunks", slow_embed)
+    docs = [write_doc(tmp_path, f"{name}.txt") for name in "abc"]
+    errors = run_all(*(lambda doc=doc: RAGPipeline([doc], namespace).ingest() for doc in docs))
+    assert errors == []
+    assert max(overlaps) == 1
+    # Each started on an empty namespace; none reset the manifest entries of the others
+    manifest = load_manifest(namespace)
+    assert sorted(manifest) == sorted(docs)
+    assert get_store(namespace).count() == sum(expected_chunks(doc) for doc in docs)
+
+
+def test_a_failed_ingest_keeps_what_another_ingest_wrote(tmp_path, namespace):
+    doc = write_doc(tmp_path, "shared.txt")
+
+    def cancel(path, stage, **counts):
+        if stage == "writing":
+            raise RuntimeError("cancelled")
+
+    errors = run_all(lambda: RAGPipeline([doc], namespace).ingest(),
+                     lambda: RAGPipeline([doc], namespace).ingest(progress=cancel))
+    # The cancelled run either went first and cleaned up after itself, or found the document ingested
+    assert [str(e) for e in errors] in ([], ["cancelled"])
+    assert get_store(namespace).count() == expected_chunks(doc)
+    assert len(get_lexical_index(namespace)) == expected_chunks(doc)
+    assert doc in load_manifest(namespace)
+
+
+def _hold_ingest_lock(namespace, locked, release):
+    with ingest_lock(namespace):
+        locked.set()
+        release.wait(30)
+
+
+def test_ingest_waits_for_another_process(tmp_path, namespace):
+    context = multiprocessing.get_context("fork")
+    locked, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_ingest_lock, args=(namespace, locked, release))
+    holder.start()
+    try:
+        assert locked.wait(10)
+        doc = write_doc(tmp_path, "a.txt")
+        done = threading.Event()
+        ingest = threading.Thread(target=lambda: (RAGPipeline([doc], namespace).ingest(), done.set()))
+        ingest.start()
+        assert not done.wait(0.3)
+        assert get_store(namespace).count() == 0
+        release.set()
+        assert done.wait(10)
+        assert get_store(namespace).count() == expected_chunks(doc)
+    finally:
+        release.set()
+        holder.join(10)
+
+
+def test_collection_version_changes_once_per_document(tmp_path, namespace, monkeypatch):
+    bumps = []
+    monkeypatch.setattr(rag_factory, "bump_collection_version", bumps.append)
+    docs = [write_doc(tmp_path, "a.txt"), write_doc(tmp_path, "b.txt")]
+    RAGPipeline(docs, namespace).ingest()
+    assert expected_chunks(docs[0]) > rag_factory.INGEST_BATCH_SIZE
+    assert bumps == [namespace, namespace]
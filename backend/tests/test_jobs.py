@@ -0,0 +1,195 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from services import jobs
+from services.jobs import IngestJobManager, JobQueueFull
+
+
+class StubIngest:
+    """ingest_fn reporting each file through the stages; waits for release first when given one."""
+
+    def __init__(self, release: threading.Event = None, error: Exception = None):
+        self.release = release
+        self.error = error
+        self.started = threading.Event()
+        self.calls = []
+
+    def __call__(self, files, progress, namespace):
+        self.calls.append((files, namespace))
+        self.started.set()
+        for path in files:
+            progress(path, "parsing", pages=1)
+        while self.release is not None and not self.release.wait(0.01):
+            progress(files[0], "parsing", pages=1)
+        if self.error is not None:
+            raise self.error
+        for path in files:
+            progress(path, "written", vectors_written=3)
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_STATE_INTERVAL", 0)
+    return str(tmp_path / "jobs")
+
+
+async def wait_for(manager, job_id, statuses=jobs.FINISHED_STATES):
+    for _ in range(500):
+        state = manager.status(job_id)
+        if state["status"] in statuses:
+            return state
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} still {state['status']}")
+
+
+def test_job_runs_to_completion(state_dir):
+    ingest = StubIngest()
+
+    async def main():
+        manager = IngestJobManager(ingest, workers=1, state_dir=state_dir)
+        job = manager.submit(["a.txt", "b.txt"], namespace="docs")
+        state = await wait_for(manager, job.job_id)
+        await manager.shutdown()
+        return state
+
+    state = asyncio.run(main())
+    assert state["status"] == "completed"
+    assert ingest.calls == [(["a.txt", "b.txt"], "docs")]
+    assert {path: p["stage"] for path, p in state["files"].items()} == {"a.txt": "written", "b.txt": "written"}
+    assert state["files"]["a.txt"]["pages"] == 1
+    assert state["files"]["a.txt"]["vectors_written"] == 3
+
+
+def test_failed_job_reports_the_error(state_dir):
+    async def main():
+        manager = IngestJobManager(StubIngest(error=RuntimeError("bad pdf")), workers=1, state_dir=state_dir)
+        job = manager.submit(["a.pdf"])
+        state = await wait_for(manager, job.job_id)
+        await manager.shutdown()
+        return state
+
+    state = asyncio.run(main())
+    assert (state["status"], state["error"]) == ("failed", "bad pdf")
+
+
+def test_cancel_queued_and_running_jobs(state_dir):
+    release = threading.Event()
+    ingest = StubIngest(release=release)
+
+    async def main():
+        manager = IngestJobManager(ingest, workers=1, state_dir=state_dir)
+        running = manager.submit(["a.txt"])
+        queued = manager.submit(["b.txt"])
+        try:
+            await asyncio.to_thread(ingest.started.wait, 5)
+            assert manager.cancel(queued.job_id)["status"] == "cancelled"
+            manager.cancel(running.job_id)
+            return [await wait_for(manager, job.job_id) for job in (running, queued)]
+        finally:
+            release.set()
+            await manager.shutdown()
+
+    states = asyncio.run(main())
+    assert [state["status"] for state in states] == ["cancelled", "cancelled"]
+    # The queued job never reached ingest_fn
+    assert [files for files, _ in ingest.calls] == [["a.txt"]]
+
+
+def test_full_queue_refuses_jobs(state_dir):
+    release = threading.Event()
+    ingest = StubIngest(release=release)
+
+    async def main():
+        manager = IngestJobManager(ingest, workers=1, max_queued=1, state_dir=state_dir)
+        manager.submit(["a.txt"])
+        try:
+            await asyncio.to_thread(ingest.started.wait, 5)
+            manager.submit(["b.txt"])
+            with pytest.raises(JobQueueFull):
+                manager.submit(["c.txt"])
+            assert manager.queue_depth() == 1
+        finally:
+            release.set()
+            await manager.shutdown()
+
+    asyncio.run(main())
+
+
+def _watch_and_cancel(state_dir, job_id, results):
+    """Another worker process: sees the job through state_dir, cancels it and waits for it to stop."""
+    other = IngestJobManager(StubIngest(), state_dir=state_dir)
+    cancelled = False
+    for _ in range(500):
+        state = other.status(job_id)
+        if state["status"] == "running" and not cancelled:
+            results.put([state["job_id"] for state in other.list()])
+            other.cancel(job_id)
+            cancelled = True
+        if state["status"] in jobs.FINISHED_STATES:
+            break
+        time.sleep(0.01)
+    results.put(state)
+
+
+def test_another_worker_sees_and_cancels_a_job(state_dir):
+    release = threading.Event()
+    ingest = StubIngest(release=release)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    async def main():
+        manager = IngestJobManager(ingest, workers=1, state_dir=state_dir)
+        job = manager.submit(["a.txt"])
+        try:
+            await asyncio.to_thread(ingest.started.wait, 5)
+            watcher = context.Process(target=_watch_and_cancel, args=(state_dir, job.job_id, results))
+            watcher.start()
+            await asyncio.to_thread(watcher.join, 30)
+            assert watcher.exitcode == 0
+            return job, manager.status(job.job_id)
+        finally:
+            release.set()
+            await manager.shutdown()
+
+    job, state = asyncio.run(main())
+    assert results.get(timeout=5) == [job.job_id]
+    seen = results.get(timeout=5)
+    assert (seen["status"], seen["worker_pid"]) == ("cancelled", os.getpid())
+    assert state["status"] == "cancelled"
+
+
+def test_job_of_an_exited_worker_is_failed(state_dir):
+    manager = IngestJobManager(StubIngest(), state_dir=state_dir)
+    context = multiprocessing.get_context("fork")
+    worker = context.Process(target=lambda: None)
+    worker.start()
+    worker.join(10)
+    job = jobs.IngestJob(files=["a.txt"], status="running", worker_pid=worker.pid)
+    manager._save(job)
+    with open(manager._state_path(job.job_id), encoding="utf-8") as f:
+        assert json.load(f)["status"] == "running"
+
+    state = manager.status(job.job_id)
+
+    assert (state["status"], state["error"]) == ("failed", "The worker running the job exited")
+    assert manager.status("0" * 32) is None
+
+
+def test_finished_jobs_expire(state_dir, monkeypatch):
+    async def main():
+        manager = IngestJobManager(StubIngest(), workers=1, state_dir=state_dir)
+        job = manager.submit(["a.txt"])
+        await wait_for(manager, job.job_id)
+        monkeypatch.setattr(time, "time", lambda: job.finished_at + jobs.JOB_RETENTION + 10)
+        manager.submit(["b.txt"])
+        expired = manager.status(job.job_id)
+        await manager.shutdown()
+        return expired
+
+    assert asyncio.run(main()) is None
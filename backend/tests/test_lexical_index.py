@@ -0,0 +1,150 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from services import lexical_index
+from services.lexical_index import LexicalIndex, bm25_top, reciprocal_rank_fusion, tokenize
+
+CORPUS = {
+    "a1": ("a", "The invoice AB-1234 was paid late."),
+    "a2": ("a", "Late payments incur a fee on every invoice."),
+    "b1": ("b", "Release v2.3.1 fixes the login bug."),
+    "b2": ("b", "The login page was redesigned."),
+    "c1": ("c", "Quarterly revenue grew while fees fell."),
+}
+
+
+def chunk(id_, doc_id, text):
+    return {"id": id_, "text": text, "metadata": {"doc_id": doc_id}}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical"))
+    index.add([chunk(id_, doc_id, text) for id_, (doc_id, text) in CORPUS.items()])
+    return index
+
+
+def brute_force_bm25(corpus, query):
+    docs = {id_: Counter(tokenize(text)) for id_, (_, text) in corpus.items()}
+    n = len(docs)
+    avg = sum(sum(tf.values()) for tf in docs.values()) / n
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(term in tf for tf in docs.values())
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for id_, tf in docs.items():
+            if term in tf:
+                norm = lexical_index.BM25_K1 * (1 - lexical_index.BM25_B + lexical_index.BM25_B * sum(tf.values()) / avg)
+                scores[id_] = scores.get(id_, 0.0) + idf * tf[term] * (lexical_index.BM25_K1 + 1) / (tf[term] + norm)
+    return scores
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("See AB-1234, v2.3.1!") == ["see", "ab-1234", "ab", "1234", "v2.3.1", "v2", "3", "1"]
+
+
+@pytest.mark.parametrize("query", ["late invoice", "login", "AB-1234", "fees revenue login"])
+def test_search_matches_brute_force_bm25(index, query):
+    expected = brute_force_bm25(CORPUS, query)
+    results = index.search(query, top_k=10)
+    assert {r["id"] for r in results} == set(expected)
+    for result in results:
+        assert result["score"] == pytest.approx(expected[result["id"]], rel=1e-5)
+    assert [r["score"] for r in results] == sorted((r["score"] for r in results), reverse=True)
+
+
+def test_search_returns_documents_and_metadata(index):
+    [best] = index.search("v2.3.1", top_k=1)
+    assert best["id"] == "b1"
+    assert best["document"] == CORPUS["b1"][1]
+    assert best["metadata"] == {"doc_id": "b"}
+
+
+def test_search_without_matches(index, tmp_path):
+    assert index.search("zebra", top_k=3) == []
+    assert LexicalIndex(str(tmp_path / "empty")).search("invoice") == []
+
+
+def test_common_terms_are_skipped(index, monkeypatch):
+    # "the" is in 3 of 5 chunks, "login" in 2
+    monkeypatch.setattr(lexical_index, "LEXICAL_MAX_DF", 0.5)
+    assert {r["id"] for r in index.search("the login", top_k=10)} == {"b1", "b2"}
+
+
+def test_rarest_term_is_kept_when_all_are_common(index, monkeypatch):
+    monkeypatch.setattr(lexical_index, "LEXICAL_MAX_DF", 0.1)
+    assert {r["id"] for r in index.search("the login", top_k=10)} == {"b1", "b2"}
+
+
+def test_delete_and_replace(index):
+    index.delete_document("b")
+    assert index.search("login", top_k=5) == []
+    index.add([chunk("a1", "a", "Now about login only.")])
+    assert [r["id"] for r in index.search("login invoice", top_k=5)] == ["a1", "a2"]
+    assert len(index) == 3
+
+
+def test_other_instances_catch_up_across_compaction(index, monkeypatch):
+    other = LexicalIndex(index.path)
+    assert len(other) == len(CORPUS)
+    monkeypatch.setattr(lexical_index, "COMPACT_MIN_DEAD", 1)
+    index.delete_document("a")
+    index.delete_document("b")  # dead chunks now outnumber live ones: the log is rewritten
+    assert index._dead == 0
+    assert [r["id"] for r in other.search("revenue fees", top_k=5)] == ["c1"]
+    assert other.search("invoice", top_k=5) == []
+    assert len(LexicalIndex(index.path)) == 1
+
+
+def test_bm25_top_breaks_ties_by_slot():
+    postings = [(1.0, np.array([3, 1, 2]), np.ones(3, dtype=np.float32))]
+    best = bm25_top(postings, np.ones(4, dtype=np.float32), 1.0, top_k=2)
+    assert [slot for slot, _ in best] == [1, 2]
+    assert bm25_top(postings, np.ones(4, dtype=np.float32), 1.0, top_k=0) == []
+
+
+def test_reciprocal_rank_fusion_sums_reciprocal_ranks():
+    dense = [{"id": "x", "distance": 0.1}, {"id": "y", "distance": 0.2}]
+    lexical = [{"id": "y", "score": 3.0}, {"id": "z", "score": 1.0}]
+    fused = reciprocal_rank_fusion([dense, lexical], top_k=3, k=60)
+    assert [item["id"] for item in fused] == ["y", "x", "z"]
+    assert fused[0]["fusion_score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1]["fusion_score"] == pytest.approx(1 / 61)
+    assert fused[2]["fusion_score"] == pytest.approx(1 / 62)
+
+
+def test_reciprocal_rank_fusion_merges_fields_earlier_lists_win():
+    fused = reciprocal_rank_fusion(
+        [[{"id": "x", "document": "dense", "distance": 0.1}],
+         [{"id": "x", "document": "lexical", "score": 2.0}]],
+        top_k=5,
+    )
+    assert fused == [{"id": "x", "document": "dense", "distance": 0.1, "score": 2.0,
+                      "fusion_score": pytest.approx(2 / 61)}]
+
+
+def test_reciprocal_rank_fusion_top_k():
+    ranking = [{"id": str(i)} for i in range(10)]
+    assert [item["id"] for item in reciprocal_rank_fusion([ranking], top_k=3)] == ["0", "1", "2"]
+    assert reciprocal_rank_fusion([], top_k=3) == []
+
+
+def test_search_reads_the_log_it_replayed_while_another_process_compacts(index, monkeypatch):
+    index.refresh()
+    monkeypatch.setattr(lexical_index, "COMPACT_MIN_DEAD", 1)
+    other = LexicalIndex(index.path)
+    other.delete_document("a")
+    other.delete_document("b")
+    other.compact()
+    # A compaction landing after this instance's last refresh: it still searches what it replayed
+    monkeypatch.setattr(index, "refresh", lambda: None)
+    results = index.search("login", top_k=5)
+    assert {r["id"]: r["document"] for r in results} == {"b1": CORPUS["b1"][1], "b2": CORPUS["b2"][1]}
+    monkeypatch.undo()
+    assert index.search("login", top_k=5) == []
+    assert [r["id"] for r in index.search("revenue", top_k=5)] == ["c1"]
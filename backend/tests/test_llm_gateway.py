@@ -0,0 +1,142 @@
+import asyncio
+import functools
+import json
+
+import httpx
+import pytest
+
+from services import llm_gateway as llm_gateway_module
+from services.llm_gateway import LLMGateway, LLMOverloaded, LLMTimeout
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def ndjson(*parts):
+    return "".join(json.dumps(part) + "\n" for part in parts).encode("utf-8")
+
+
+def token(content, done=False):
+    return {"message": {"role": "assistant", "content": content}, "done": done}
+
+
+class StubOllama:
+    """httpx transport answering /api/chat with the given parts; waits for release first when given one."""
+
+    def __init__(self, *parts, status=200, release: asyncio.Event = None, token_delay: float = 0):
+        self.parts = parts
+        self.status = status
+        self.release = release
+        self.token_delay = token_delay
+        self.requests = []
+
+    async def _body(self):
+        if self.release is not None:
+            await self.release.wait()
+        for part in self.parts:
+            await asyncio.sleep(self.token_delay)
+            yield ndjson(part)
+        yield b"\n"
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(self.status, content=self._body())
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    """gateway(stub, **limits): an LLMGateway whose HTTP client talks to stub."""
+    def make(stub, **limits):
+        transport = httpx.MockTransport(stub)
+        monkeypatch.setattr(llm_gateway_module.httpx, "AsyncClient",
+                            functools.partial(httpx.AsyncClient, transport=transport))
+        return LLMGateway(base_url="http://ollama", **limits)
+    return make
+
+
+async def answer(gateway, deadline=None):
+    return [t async for t in gateway.stream_chat("model", MESSAGES, deadline=deadline)]
+
+
+def test_streams_tokens_until_done(gateway):
+    stub = StubOllama(token("Hel"), token(""), token("lo"), token("", done=True), token("ignored"))
+    llm = gateway(stub)
+
+    async def main():
+        try:
+            return await answer(llm)
+        finally:
+            await llm.aclose()
+
+    assert asyncio.run(main()) == ["Hel", "lo"]
+    assert stub.requests == [("/api/chat", {"model": "model", "messages": MESSAGES, "stream": True})]
+    assert llm.stats()["inflight"] == 0
+
+
+def test_errors_release_the_slot(gateway):
+    async def main(stub):
+        llm = gateway(stub, max_inflight=1)
+        try:
+            await answer(llm)
+        finally:
+            stats = llm.stats()
+            await llm.aclose()
+            assert stats["inflight"] == 0
+
+    with pytest.raises(RuntimeError, match="model not found"):
+        asyncio.run(main(StubOllama({"error": "model not found"})))
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(main(StubOllama(status=500)))
+
+
+def test_requests_beyond_the_waiting_room_are_rejected(gateway):
+    async def main():
+        release = asyncio.Event()
+        llm = gateway(StubOllama(token("ok", done=True), release=release), max_inflight=1, max_waiting=1)
+        try:
+            running = asyncio.create_task(answer(llm))
+            waiting = asyncio.create_task(answer(llm))
+            await asyncio.sleep(0.05)
+            assert (llm.inflight, llm.waiting) == (1, 1)
+            with pytest.raises(LLMOverloaded):
+                await answer(llm)
+            release.set()
+            return await running, await waiting, llm.stats()
+        finally:
+            await llm.aclose()
+
+    running, waiting, stats = asyncio.run(main())
+    assert running == waiting == ["ok"]
+    assert (stats["inflight"], stats["waiting"], stats["rejected"]) == (0, 0, 1)
+
+
+def test_deadline_while_waiting_for_a_slot(gateway):
+    async def main():
+        release = asyncio.Event()
+        llm = gateway(StubOllama(token("ok", done=True), release=release), max_inflight=1)
+        try:
+            running = asyncio.create_task(answer(llm))
+            await asyncio.sleep(0.05)
+            with pytest.raises(LLMTimeout, match="waiting"):
+                await answer(llm, deadline=0.05)
+            release.set()
+            await running
+            return llm.stats()
+        finally:
+            await llm.aclose()
+
+    stats = asyncio.run(main())
+    assert (stats["inflight"], stats["waiting"], stats["timed_out"]) == (0, 0, 1)
+
+
+def test_deadline_during_generation(gateway):
+    async def main():
+        llm = gateway(StubOllama(token("slow"), token("er", done=True), token_delay=0.2))
+        try:
+            with pytest.raises(LLMTimeout, match="deadline"):
+                await answer(llm, deadline=0.1)
+            return llm.stats()
+        finally:
+            await llm.aclose()
+
+    stats = asyncio.run(main())
+    assert (stats["inflight"], stats["timed_out"]) == (0, 1)
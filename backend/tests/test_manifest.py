@@ -0,0 +1,104 @@
+import hashlib
+import multiprocessing
+import os
+import uuid
+
+import pytest
+
+from services import manifest as manifest_module
+from services.manifest import file_entry, load_manifest, manifest_path, plan_ingest, update_manifest
+
+
+@pytest.fixture
+def namespace():
+    return f"test-{uuid.uuid4().hex[:12]}"
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_file_entry_hashes_the_content(tmp_path):
+    path = write(tmp_path, "a.txt", "alpha")
+
+    entry = file_entry(path)
+
+    assert entry["sha256"] == hashlib.sha256(b"alpha").hexdigest()
+    assert entry["size"] == 5
+
+
+def test_file_entry_reuses_the_hash_of_an_untouched_file(tmp_path, monkeypatch):
+    path = write(tmp_path, "a.txt", "alpha")
+    previous = file_entry(path)
+    monkeypatch.setattr(manifest_module, "file_hash", lambda path: pytest.fail("hashed again"))
+
+    assert file_entry(path, previous) == previous
+
+
+def test_plan_ingest_sorts_files_by_what_changed(tmp_path):
+    same, changed, new = (write(tmp_path, name, name) for name in ("same.txt", "changed.txt", "new.txt"))
+    manifest = {same: file_entry(same), changed: file_entry(changed), "gone.txt": {"sha256": "0"}}
+    write(tmp_path, "changed.txt", "other content")
+
+    to_ingest, to_remove, unchanged = plan_ingest(manifest, [same, changed, new])
+
+    assert sorted(to_ingest) == sorted([changed, new])
+    assert to_ingest[changed]["sha256"] == hashlib.sha256(b"other content").hexdigest()
+    assert to_remove == [changed]
+    assert unchanged == {same: manifest[same]}
+
+
+def test_plan_ingest_prunes_files_no_longer_listed(tmp_path):
+    kept = write(tmp_path, "kept.txt", "kept")
+    manifest = {kept: file_entry(kept), "gone.txt": {"sha256": "0"}}
+
+    assert plan_ingest(manifest, [kept], prune=True) == ({}, ["gone.txt"], {kept: manifest[kept]})
+
+
+def test_plan_ingest_keeps_the_hash_of_a_touched_file(tmp_path):
+    path = write(tmp_path, "a.txt", "alpha")
+    previous = file_entry(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    to_ingest, to_remove, unchanged = plan_ingest({path: previous}, [path])
+
+    assert (to_ingest, to_remove) == ({}, [])
+    assert unchanged[path]["sha256"] == previous["sha256"]
+    assert unchanged[path]["mtime"] == os.stat(path).st_mtime
+
+
+def test_update_manifest_adds_removes_and_resets(namespace):
+    update_manifest({"a": {"sha256": "1"}, "b": {"sha256": "2"}}, namespace=namespace)
+    update_manifest({"c": {"sha256": "3"}}, removed=["a"], namespace=namespace)
+    assert load_manifest(namespace) == {"b": {"sha256": "2"}, "c": {"sha256": "3"}}
+
+    update_manifest({"d": {"sha256": "4"}}, reset=True, namespace=namespace)
+    assert load_manifest(namespace) == {"d": {"sha256": "4"}}
+
+
+def test_unreadable_manifest_starts_fresh(namespace):
+    update_manifest({"a": {"sha256": "1"}}, namespace=namespace)
+    with open(manifest_path(namespace), "w", encoding="utf-8") as f:
+        f.write("{not json")
+
+    assert load_manifest(namespace) == {}
+
+
+def _update_many(namespace, prefix, count):
+    for i in range(count):
+        update_manifest({f"{prefix}{i}": {"sha256": str(i)}}, namespace=namespace)
+
+
+def test_updates_from_several_processes_are_all_kept(namespace):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_update_many, args=(namespace, prefix, 30)) for prefix in "abc"]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert [worker.exitcode for worker in workers] == [0, 0, 0]
+    assert sorted(load_manifest(namespace)) == sorted(f"{prefix}{i}" for prefix in "abc" for i in range(30))
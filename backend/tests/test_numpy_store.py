@@ -0,0 +1,194 @@
+import os
+
+import numpy as np
+import pytest
+
+from services import numpy_store
+from services.numpy_store import NumpyStore
+
+DIM = 48  # not a multiple of 64: binary codes are padded
+ROWS = 300
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(ROWS, DIM)).astype(np.float32)
+    queries = rng.normal(size=(10, DIM)).astype(np.float32)
+    return vectors, queries
+
+
+def fill(store, vectors, docs=10):
+    ids = [f"c{i}" for i in range(len(vectors))]
+    store.add(ids, vectors, [{"doc_id": f"d{i % docs}"} for i in range(len(vectors))], [f"text {i}" for i in ids])
+    return ids
+
+
+def touched(store):
+    """Moves header.json's mtime on, as coarse filesystem timestamps may not have."""
+    header = store._file("header.json")
+    stat = os.stat(header)
+    os.utime(header, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    return store
+
+
+def brute_force(vectors, query, top_k, alive=None):
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = unit @ (query / np.linalg.norm(query))
+    if alive is not None:
+        scores[~alive] = -np.inf
+    top = np.argsort(-scores)[:top_k]
+    return top, scores[top]
+
+
+def test_exact_search_matches_brute_force(tmp_path, data):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization="none")
+    fill(store, vectors)
+    for query in queries:
+        top, scores = store.search(query, top_k=5)
+        expected_top, expected_scores = brute_force(vectors, query, 5)
+        assert top.tolist() == expected_top.tolist()
+        assert scores == pytest.approx(expected_scores, abs=1e-5)
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_rescoring_every_candidate_matches_exact_search(tmp_path, data, quantization):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization=quantization)
+    fill(store, vectors)
+    for query in queries:
+        top, scores = store.search(query, top_k=5, rescore_factor=ROWS)
+        expected_top, expected_scores = brute_force(vectors, query, 5)
+        assert top.tolist() == expected_top.tolist()
+        assert scores == pytest.approx(expected_scores, abs=1e-5)
+        assert store.search(query, top_k=5, exact=True)[0].tolist() == expected_top.tolist()
+
+
+@pytest.mark.parametrize("quantization, min_recall", [("int8", 1.0), ("binary", 0.8)])
+def test_quantized_first_pass_recall(tmp_path, data, quantization, min_recall):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization=quantization)
+    fill(store, vectors)
+    hits = 0
+    for query in queries:
+        top, scores = store.search(query, top_k=5)
+        expected_top, _ = brute_force(vectors, query, 5)
+        hits += len(set(top.tolist()) & set(expected_top.tolist()))
+        # Whatever the first pass found is scored exactly
+        assert scores == pytest.approx(brute_force(vectors[top], query, 5)[1], abs=1e-5)
+    assert hits / (5 * len(queries)) >= min_recall
+
+
+def test_codes_are_built_when_reopened_with_quantization(tmp_path, data):
+    vectors, queries = data
+    fill(NumpyStore(str(tmp_path), quantization="none"), vectors)
+    store = NumpyStore(str(tmp_path), quantization="int8")
+    assert np.array_equal(store._codes[:ROWS], numpy_store.quantize_int8(np.asarray(store._vectors[:ROWS]))[0])
+    assert store.search(queries[0], top_k=5)[0].tolist() == brute_force(vectors, queries[0], 5)[0].tolist()
+
+
+def test_query_returns_records_and_cosine_distances(tmp_path, data):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization="none")
+    ids = fill(store, vectors)
+    results = store.query(queries[0], top_k=3, include_embeddings=True)
+    top, scores = brute_force(vectors, queries[0], 3)
+    assert results["ids"] == [[ids[row] for row in top]]
+    assert results["documents"] == [[f"text {ids[row]}" for row in top]]
+    assert results["metadatas"] == [[{"doc_id": f"d{row % 10}"} for row in top]]
+    assert results["distances"][0] == pytest.approx(1 - scores, abs=1e-5)
+    assert np.asarray(results["embeddings"][0]) == pytest.approx(
+        vectors[top] / np.linalg.norm(vectors[top], axis=1, keepdims=True), abs=1e-6)
+
+
+def test_delete_and_replace(tmp_path, data):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization="int8")
+    fill(store, vectors)
+    store.delete_document("d0")
+    store.add(["c1"], -vectors[1:2], [{"doc_id": "d1"}], ["replaced"])
+    assert store.count() == ROWS - ROWS // 10
+    for query in queries:
+        assert all(meta["doc_id"] != "d0" for meta in store.query(query, top_k=20)["metadatas"][0])
+    results = store.query(-vectors[1], top_k=1)
+    assert (results["ids"], results["documents"]) == ([["c1"]], [["replaced"]])
+    assert results["distances"][0][0] == pytest.approx(0, abs=1e-5)
+    assert "c1" not in store.query(vectors[1], top_k=5)["ids"][0]
+
+
+def test_get_embeddings(tmp_path, data):
+    vectors, _ = data
+    store = NumpyStore(str(tmp_path))
+    fill(store, vectors[:5])
+    embeddings = store.get_embeddings(["c3", "missing"])
+    assert list(embeddings) == ["c3"]
+    assert embeddings["c3"] == pytest.approx(vectors[3] / np.linalg.norm(vectors[3]), abs=1e-6)
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8", "binary"])
+def test_compaction_starts_a_new_generation(tmp_path, data, monkeypatch, quantization):
+    vectors, queries = data
+    monkeypatch.setattr(numpy_store, "COMPACT_MIN_DEAD", 1)
+    monkeypatch.setattr(numpy_store, "RESCORE_FACTOR", ROWS)  # compare rows, not first-pass recall
+    store = NumpyStore(str(tmp_path), quantization=quantization)
+    ids = fill(store, vectors)
+    other = NumpyStore(str(tmp_path), quantization=quantization)
+    for doc in range(6):  # dead rows outnumber live ones after the sixth
+        store.delete_document(f"d{doc}")
+    assert store.generation == 1
+    assert store.count() == 4 * ROWS // 10
+    assert not os.path.exists(tmp_path / "vectors.npy")
+    assert os.path.exists(tmp_path / "vectors.1.npy")
+
+    alive = np.array([i % 10 >= 6 for i in range(ROWS)])
+    for reader in (store, touched(other), NumpyStore(str(tmp_path), quantization=quantization)):
+        for query in queries:
+            results = reader.query(query, top_k=5)
+            expected, scores = brute_force(vectors, query, 5, alive)
+            assert results["ids"] == [[ids[row] for row in expected]]
+            assert results["distances"][0] == pytest.approx(1 - scores, abs=1e-5)
+        assert reader.generation == 1
+        if quantization != "none":
+            # Codes were rewritten for the compacted rows
+            compacted = np.asarray(reader._vectors[:reader.count_rows], dtype=np.float32)
+            codes = numpy_store.quantize_binary(compacted) if quantization == "binary" else \
+                numpy_store.quantize_int8(compacted)[0]
+            assert np.array_equal(reader._codes[:reader.count_rows], codes)
+
+    store.add(["new"], vectors[:1], [{"doc_id": "d0"}], ["new text"])
+    assert touched(other).query(vectors[0], top_k=1)["ids"] == [["new"]]
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_other_instances_catch_up_without_reloading(tmp_path, data, monkeypatch, quantization):
+    vectors, queries = data
+    store = NumpyStore(str(tmp_path), quantization=quantization)
+    fill(store, vectors[:100])
+    other = NumpyStore(str(tmp_path), quantization=quantization)
+    # Past the initial capacity, so the files are replaced by larger ones
+    store.add([f"c{i}" for i in range(100, 2000)], np.tile(vectors, (7, 1))[100:2000],
+              [{"doc_id": "big"}] * 1900, ["more"] * 1900)
+    store.delete_document("d3")
+
+    def reload():
+        raise AssertionError("reloaded instead of catching up")
+
+    monkeypatch.setattr(other, "_load", reload)
+    touched(other).refresh()
+    assert other.count() == store.count()
+    assert other._rows_by_id == store._rows_by_id
+    assert other._rows_by_doc.keys() == store._rows_by_doc.keys()
+    for query in queries:
+        assert other.query(query, top_k=5) == store.query(query, top_k=5)
+
+
+def test_clear_is_picked_up_by_other_instances(tmp_path, data):
+    vectors, _ = data
+    store = NumpyStore(str(tmp_path))
+    fill(store, vectors[:10])
+    other = NumpyStore(str(tmp_path))
+    store.clear()
+    fill(store, vectors[10:13])
+    assert touched(other).count() == 3
+    assert other.query(vectors[10], top_k=1)["ids"] == [["c0"]]
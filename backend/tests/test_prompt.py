@@ -0,0 +1,86 @@
+import re
+
+from services import prompt
+from services.chunker import chunk_text
+from services.prompt import MIN_PARTIAL_TOKENS, merge_spans, pack_context
+
+TEXT = "".join(chr(ord("a") + i % 26) for i in range(600))
+
+
+def retrieved(chunk):
+    return {"id": f"{chunk.metadata['doc_id']}:{chunk.metadata['start']}", "document": chunk.text,
+            "metadata": chunk.metadata}
+
+
+def windows(doc_id, text=TEXT):
+    return [retrieved(c) for c in chunk_text(text, doc_id)]
+
+
+def test_overlapping_windows_merge_into_one_span(char_encoder):
+    first, second, third, _ = windows("doc")  # 0-200, 150-350, 300-500, 450-600
+    [span] = merge_spans([third, first, second])
+    assert (span["doc_id"], span["start"], span["end"], span["rank"]) == ("doc", 0, 500, 0)
+    assert char_encoder.decode(span["tokens"]) == TEXT[:500]
+
+
+def test_separate_documents_and_gaps_stay_apart(char_encoder):
+    first, _, third, _ = windows("a")  # 0-200 and 300-500: a gap between them
+    other = windows("b")[0]
+    spans = merge_spans([other, third, first])
+    assert [(s["doc_id"], s["start"], s["end"], s["rank"]) for s in spans] == [
+        ("b", 0, 200, 0), ("a", 300, 500, 1), ("a", 0, 200, 2)]
+
+
+def test_contained_chunk_keeps_the_span_and_best_rank(char_encoder):
+    first = windows("doc")[0]
+    inner = {"document": TEXT[50:100], "metadata": {"doc_id": "doc", "start": 50, "end": 100}}
+    [span] = merge_spans([inner, first])
+    assert (span["start"], span["end"], span["rank"]) == (0, 200, 0)
+    assert char_encoder.decode(span["tokens"]) == TEXT[:200]
+
+
+def test_chunks_without_offsets_or_with_mismatched_tokens_are_not_merged(char_encoder):
+    first, second = windows("doc")[:2]
+    bare = {"text": "no offsets", "metadata": {"doc_id": "doc"}}
+    # The text does not re-encode to end - start tokens, so splicing by offset is unsafe
+    inexact = {"document": TEXT[150:340], "metadata": second["metadata"]}
+    spans = merge_spans([first, bare, inexact])
+    assert [(s["start"], s["end"]) for s in spans] == [(0, 200), (None, None), (150, 350)]
+
+
+def test_pack_context_fits_whole_spans_best_first(char_encoder):
+    a, b = windows("a")[0], windows("b")[0]
+    context = pack_context([b, a], budget=10_000)
+    assert re.findall(r"Document ID: (\w+), Span: (\d+)-(\d+)", context) == [("b", "0", "200"), ("a", "0", "200")]
+    assert f"Content: {TEXT[:200]}\n" in context
+
+
+def test_pack_context_truncates_the_last_span_to_the_budget(char_encoder):
+    a, b = windows("a")[0], windows("b")[0]
+    whole = pack_context([a], budget=10_000)
+    budget = len(char_encoder.encode(whole)) + 150
+    context = pack_context([a, b], budget=budget)
+    assert len(char_encoder.encode(context)) <= budget
+    assert context.startswith(whole)
+    partial = context[len(whole):]
+    keep = int(re.search(r"Span: 0-(\d+)", partial).group(1))
+    assert MIN_PARTIAL_TOKENS <= keep < 200
+    # The cited span covers exactly the text that was kept
+    assert f"Content: {TEXT[:keep]}...\n" in partial
+    assert len(char_encoder.encode(context)) == budget
+
+
+def test_pack_context_skips_spans_that_would_be_cut_too_short(char_encoder):
+    a, b = windows("a")[0], windows("b")[0]
+    small = {"document": "tiny", "metadata": {"doc_id": "c", "start": 0, "end": 4}}
+    whole = pack_context([a], budget=10_000)
+    small_entry = pack_context([small], budget=10_000)
+    budget = len(char_encoder.encode(whole + small_entry)) + MIN_PARTIAL_TOKENS // 2
+    assert pack_context([a, b, small], budget=budget) == whole + small_entry
+
+
+def test_build_prompt_uses_the_packed_context(char_encoder):
+    chunk = windows("doc")[0]
+    rendered = prompt.build_prompt([chunk], "What is it?", budget=10_000)
+    assert pack_context([chunk], budget=10_000) in rendered
+    assert "Question: What is it?" in rendered
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from services.reranker import cosine_scores, mmr, normalize_rows, rerank
+
+QUERY = np.array([1.0, 0.0, 0.0])
+EMBEDDINGS = np.array([
+    [0.9, 0.1, 0.0],    # 0: relevant
+    [0.9, 0.11, 0.0],   # 1: near-duplicate of 0
+    [0.7, 0.0, 0.7],    # 2: less relevant, different direction
+    [0.0, 1.0, 0.0],    # 3: irrelevant
+])
+
+
+def test_cosine_scores_match_normalized_dot_products():
+    expected = [float(np.dot(row, QUERY) / np.linalg.norm(row)) for row in EMBEDDINGS]
+    assert cosine_scores(QUERY, EMBEDDINGS) == pytest.approx(expected, abs=1e-6)
+
+
+def test_normalize_rows_leaves_zero_rows_finite():
+    rows = normalize_rows([[3.0, 4.0], [0.0, 0.0]])
+    assert rows.ravel().tolist() == pytest.approx([0.6, 0.8, 0.0, 0.0])
+
+
+def test_mmr_with_lambda_one_is_relevance_order():
+    order = list(np.argsort(-cosine_scores(QUERY, EMBEDDINGS)))
+    assert mmr(QUERY, EMBEDDINGS, top_k=4, lambda_=1.0) == order
+
+
+def test_mmr_prefers_a_diverse_chunk_over_a_near_duplicate():
+    assert mmr(QUERY, EMBEDDINGS, top_k=2, lambda_=0.5) == [0, 2]
+
+
+def test_mmr_selects_each_row_once():
+    selected = mmr(QUERY, EMBEDDINGS, top_k=10, lambda_=0.3)
+    assert sorted(selected) == [0, 1, 2, 3]
+
+
+def test_mmr_ranks_by_given_relevance():
+    relevance = np.array([0.1, 0.2, 0.3, 1.0])
+    assert mmr(QUERY, EMBEDDINGS, top_k=1, lambda_=0.7, relevance=relevance) == [3]
+
+
+def candidates():
+    return [{"id": str(i), "embedding": row.tolist()} for i, row in enumerate(EMBEDDINGS)]
+
+
+def test_rerank_modes():
+    ids = lambda items: [item["id"] for item in items]
+    assert ids(rerank(QUERY, candidates()[::-1], top_k=2, mode="none")) == ["3", "2"]
+    assert ids(rerank(QUERY, candidates()[::-1], top_k=2, mode="cosine")) == ["0", "1"]
+    assert ids(rerank(QUERY, candidates(), top_k=3, mode="mmr")) == [str(i) for i in mmr(QUERY, EMBEDDINGS, 3)]
+    assert ids(rerank(QUERY, candidates(), top_k=1, mode="mmr", relevance=[0, 0, 0, 1])) == ["3"]
+    assert rerank(QUERY, [], top_k=2, mode="mmr") == []
+
+
+def test_rerank_rejects_unknown_modes():
+    with pytest.raises(ValueError):
+        rerank(QUERY, candidates(), top_k=2, mode="cross-encoder")
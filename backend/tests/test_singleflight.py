@@ -0,0 +1,135 @@
+import asyncio
+import uuid
+
+import pytest
+
+from services.singleflight import SingleFlight, flight_key
+from services.vector_store import bump_collection_version
+
+
+class StubGeneration:
+    """start() for SingleFlight.join: returns docs and yields the tokens fed to it (None ends), counting its runs."""
+
+    def __init__(self, docs=("doc",), error: Exception = None):
+        self.docs = list(docs)
+        self.error = error
+        self.runs = 0
+        self.closed = False
+        self.queue = asyncio.Queue()
+
+    def feed(self, *tokens):
+        for token in tokens:
+            self.queue.put_nowait(token)
+
+    async def __call__(self):
+        self.runs += 1
+        if self.error is not None:
+            raise self.error
+
+        async def tokens():
+            try:
+                while (token := await self.queue.get()) is not None:
+                    yield token
+            finally:
+                self.closed = True
+
+        return self.docs, tokens()
+
+
+async def collect(flight):
+    return [token async for token in flight.stream()]
+
+
+def test_key_ignores_case_spacing_and_trailing_punctuation():
+    namespace = f"test-{uuid.uuid4().hex[:12]}"
+    key = flight_key("What is  the price?", None, None, namespace)
+
+    assert flight_key("what is the price", None, [], namespace) == key
+    assert flight_key("what is the price", "what is the price.", None, namespace) == key
+    assert flight_key("what is the price", "price", None, namespace) != key
+    assert flight_key("what is the price", None, [{"role": "user", "content": "hi"}], namespace) != key
+    assert flight_key("what is the price", None, None, f"{namespace}-other") != key
+    bump_collection_version(namespace)
+    assert flight_key("what is the price", None, None, namespace) != key
+
+
+def test_identical_queries_share_one_generation():
+    async def main():
+        coalescer, generation = SingleFlight(), StubGeneration()
+        first = coalescer.join("k", generation)
+        first_tokens = asyncio.create_task(collect(first))
+        assert await first.docs() == ["doc"]
+        generation.feed("Hello", " there")
+        await asyncio.sleep(0)
+
+        second = coalescer.join("k", generation)  # attaches mid-answer
+        second_tokens = asyncio.create_task(collect(second))
+        generation.feed("!", None)
+        results = await first_tokens, await second_tokens, await second.docs()
+        coalescer.leave(first)
+        coalescer.leave(second)
+        return coalescer, generation, results
+
+    coalescer, generation, (first, second, docs) = asyncio.run(main())
+    assert first == second == ["Hello", " there", "!"]
+    assert docs == ["doc"]
+    assert generation.runs == 1
+    assert coalescer.stats() == {"in_flight": 0, "started": 1, "coalesced": 1}
+
+
+def test_a_finished_flight_is_not_joined_again():
+    async def main():
+        coalescer, generation = SingleFlight(), StubGeneration()
+        first = coalescer.join("k", generation)
+        generation.feed("a", None)
+        await collect(first)
+        coalescer.leave(first)
+        second = coalescer.join("k", generation)
+        generation.feed("b", None)
+        tokens = await collect(second)
+        coalescer.leave(second)
+        return generation, tokens
+
+    generation, tokens = asyncio.run(main())
+    assert generation.runs == 2
+    assert tokens == ["b"]
+
+
+def test_the_leader_error_reaches_every_subscriber():
+    async def main():
+        coalescer = SingleFlight()
+        generation = StubGeneration(error=RuntimeError("LLM overloaded"))
+        flights = [coalescer.join("k", generation) for _ in range(2)]
+        for flight in flights:
+            with pytest.raises(RuntimeError, match="LLM overloaded"):
+                await flight.docs()
+            with pytest.raises(RuntimeError, match="LLM overloaded"):
+                await collect(flight)
+            coalescer.leave(flight)
+        return coalescer, generation
+
+    coalescer, generation = asyncio.run(main())
+    assert generation.runs == 1
+    assert coalescer.stats()["in_flight"] == 0
+
+
+def test_generation_stops_once_every_subscriber_left():
+    async def main():
+        coalescer, generation = SingleFlight(), StubGeneration()
+        flights = [coalescer.join("k", generation) for _ in range(2)]
+        await flights[0].docs()
+        generation.feed("partial")
+        await asyncio.sleep(0)
+
+        coalescer.leave(flights[0])
+        assert not flights[0].task.done()
+        coalescer.leave(flights[1])
+        await asyncio.gather(flights[1].task, return_exceptions=True)
+        with pytest.raises(RuntimeError, match="cancelled"):
+            await collect(flights[1])
+        return coalescer, generation, flights[1]
+
+    coalescer, generation, flight = asyncio.run(main())
+    assert flight.task.cancelled()
+    assert generation.closed
+    assert coalescer.stats()["in_flight"] == 0
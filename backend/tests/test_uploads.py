@@ -0,0 +1,83 @@
+import asyncio
+import errno
+import hashlib
+import io
+import os
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from services import uploads
+from services.uploads import UploadTooLarge, _store_file, request_too_large, store_upload
+
+
+def store(directory, name, content, max_bytes=1024):
+    return _store_file(io.BytesIO(content), str(directory), name, max_bytes)
+
+
+def listing(directory):
+    return sorted(name for name in os.listdir(directory) if not name.startswith(".upload_index.json."))
+
+
+def test_identical_content_resolves_to_the_stored_file(tmp_path):
+    first = store(tmp_path, "report.pdf", b"content")
+    again = store(tmp_path, "renamed.pdf", b"content")
+    assert (first.duplicate, again.duplicate) == (False, True)
+    assert again.path == first.path == str(tmp_path / "report.pdf")
+    assert first.sha256 == hashlib.sha256(b"content").hexdigest()
+    assert listing(tmp_path) == [".upload_index.json", "report.pdf"]
+
+
+def test_a_name_clash_keeps_both_files(tmp_path):
+    first = store(tmp_path, "report.pdf", b"v1")
+    second = store(tmp_path, "report.pdf", b"v2")
+    assert second.path == str(tmp_path / f"report_{second.sha256[:12]}.pdf")
+    assert (tmp_path / "report.pdf").read_bytes() == b"v1"
+    assert open(second.path, "rb").read() == b"v2"
+    # A file another writer put at the next name is not overwritten either
+    third_sha = hashlib.sha256(b"v3").hexdigest()
+    (tmp_path / f"report_{third_sha[:12]}.pdf").write_bytes(b"someone else's")
+    third = store(tmp_path, "report.pdf", b"v3")
+    assert third.path == str(tmp_path / f"report_{third_sha[:12]}_2.pdf")
+    assert first.path == str(tmp_path / "report.pdf")
+
+
+@pytest.mark.parametrize("error", [errno.EPERM, errno.EXDEV, errno.ENOTSUP])
+def test_filesystems_without_hard_links(tmp_path, monkeypatch, error):
+    def no_link(src, dst):
+        raise OSError(error, os.strerror(error))
+
+    monkeypatch.setattr(uploads.os, "link", no_link)
+    first = store(tmp_path, "report.pdf", b"v1")
+    second = store(tmp_path, "report.pdf", b"v2")
+    assert (tmp_path / "report.pdf").read_bytes() == b"v1"
+    assert open(second.path, "rb").read() == b"v2"
+    assert first.path != second.path
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_too_large_uploads_leave_nothing_behind(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        store(tmp_path, "big.pdf", b"x" * 2048, max_bytes=1024)
+    assert os.listdir(tmp_path) == []
+
+
+def test_index_is_rebuilt_from_existing_files(tmp_path):
+    (tmp_path / "old.txt").write_bytes(b"old")
+    (tmp_path / "notes.md").write_bytes(b"old")  # not a supported document
+    again = store(tmp_path, "new.txt", b"old")
+    assert again.duplicate and again.path == str(tmp_path / "old.txt")
+
+
+def test_store_upload_closes_the_upload(tmp_path):
+    upload = UploadFile(io.BytesIO(b"data"), filename="../../escape.txt")
+    stored = asyncio.run(store_upload(upload, str(tmp_path)))
+    assert stored.path == str(tmp_path / "escape.txt")
+    assert upload.file.closed
+
+
+def test_request_too_large():
+    assert request_too_large("2000", limit=1000)
+    assert not request_too_large("1000", limit=1000)
+    assert not request_too_large(None, limit=1000)
+    assert not request_too_large("garbage", limit=1000)
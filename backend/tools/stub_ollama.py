@@ -0,0 +1,117 @@
+"""Minimal Ollama-compatible HTTP server for exercising the LLM gateway offline.
+
+Implements POST /api/chat (streamed NDJSON or a single JSON reply) and
+GET /api/tags with canned output and configurable latency. Run from backend/:
+
+    python -m tools.stub_ollama --port 11434 --tokens 50 --token-delay 0.02
+    OLLAMA_HOST=http://localhost:11434 uvicorn app:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = "Based on the provided documents the answer is described in detail here".split()
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled clients reuse connections
+    server_version = "StubOllama/0.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": self.server.model}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", self.server.model)
+        with self.server.counter_lock:
+            self.server.active += 1
+            self.server.peak_active = max(self.server.peak_active, self.server.active)
+        try:
+            time.sleep(self.server.first_token_delay)
+            tokens = [WORDS[i % len(WORDS)] + " " for i in range(self.server.tokens)]
+            if not request.get("stream", True):
+                time.sleep(self.server.token_delay * len(tokens))
+                self._send_json(200, {
+                    "model": model,
+                    "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                    "done": True,
+                })
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for token in tokens:
+                part = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+                self._write_chunk(json.dumps(part).encode("utf-8") + b"\n")
+                time.sleep(self.server.token_delay)
+            done = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True}
+            self._write_chunk(json.dumps(done).encode("utf-8") + b"\n")
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client went away mid-stream
+        finally:
+            with self.server.counter_lock:
+                self.server.active -= 1
+
+
+def make_server(host: str = "127.0.0.1", port: int = 11434, tokens: int = 50, token_delay: float = 0.02,
+                first_token_delay: float = 0.1, model: str = "llama3", verbose: bool = False) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StubOllamaHandler)
+    server.daemon_threads = True
+    server.tokens = tokens
+    server.token_delay = token_delay
+    server.first_token_delay = first_token_delay
+    server.model = model
+    server.verbose = verbose
+    server.counter_lock = threading.Lock()
+    server.active = 0
+    server.peak_active = 0  # most generations seen at once, to check client-side limits
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--tokens", type=int, default=50, help="tokens per answer")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    parser.add_argument("--first-token-delay", type=float, default=0.1, help="seconds before the first token")
+    parser.add_argument("--model", default="llama3")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.tokens, args.token_delay, args.first_token_delay,
+                         args.model, args.verbose)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -46,14 +46,21 @@
 #         st.error(f"API Error: {resp.text}")
 
 
+import json
+import time
+
 import streamlit as st
 import requests
 
 API_URL = "http://localhost:8000/api"
+JOB_POLL_INTERVAL = 1.0  # seconds
 
 st.set_page_config(page_title="RAG Chat", page_icon="📄")
 st.title("📄 You assistant can help ...")
 
+# Documents are ingested into, and questions answered from, one namespace at a time
+namespace = st.sidebar.text_input("Namespace", value="default")
+
 uploaded_files = st.sidebar.file_uploader(
     "Upload your docs", accept_multiple_files=True, type=["pdf", "docx", "txt"]
 )
@@ -66,16 +73,47 @@ if uploaded_files:
                 ("files", (f.name, f, f.type or "application/octet-stream"))
                 for f in uploaded_files
             ]
-            resp = requests.post(f"{API_URL}/ingest", files=files)
+            resp = requests.post(f"{API_URL}/ingest", files=files, data={"namespace": namespace})
 
-        if resp.ok:
-            st.sidebar.success("Ingestion successful!")
-        else:
+        if not resp.ok:
             st.sidebar.error(f"Error: {resp.text}")
+        else:
+            # Ingestion runs as a background job; poll its status until it finishes
+            job_id = resp.json()["job_id"]
+            status_box = st.sidebar.empty()
+            while True:
+                job = requests.get(f"{API_URL}/ingest/jobs/{job_id}").json()
+                lines = [f"**Job {job['status']}**"]
+                for path, p in job["files"].items():
+                    lines.append(
+                        f"- {path.split('/')[-1]}: {p['stage']} "
+                        f"({p['pages']} pages, {p['chunks_embedded']}/{p['chunks']} chunks, "
+                        f"{p['vectors_written']} vectors)"
+                    )
+                status_box.markdown("\n".join(lines))
+                if job["status"] in ("completed", "failed", "cancelled"):
+                    break
+                time.sleep(JOB_POLL_INTERVAL)
+            if job["status"] == "completed":
+                st.sidebar.success("Ingestion successful!")
+            else:
+                st.sidebar.error(f"Ingestion {job['status']}: {job.get('error') or ''}")
+
+def read_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+            event = "message"
 
 # Initialize chat history
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []  # List of {"role": "user"/"bot", "content": str}
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = None  # assigned by the API on the first reply
 
 # Chat UI
 for msg in st.session_state.chat_history:
@@ -90,21 +128,38 @@ user_input = st.text_input("Your message", key="chat_input")
 if st.button("Send") and user_input:
     st.session_state.chat_history.append({"role": "user", "content": user_input})
 
-    # Prepare full conversation for API
+    # The API keeps the history per conversation_id, so only the new message is sent
     chat_payload = {
-        "messages": [
-            {"role": m["role"], "content": m["content"]}
-            for m in st.session_state.chat_history
-        ]
+        "conversation_id": st.session_state.conversation_id,
+        "namespace": namespace,
+        "messages": [{"role": "user", "content": user_input}],
     }
 
+    # Stream the answer over Server-Sent Events and render tokens as they arrive
+    reply = ""
+    error = None
+    placeholder = st.empty()
     with st.spinner("Thinking…"):
-        response = requests.post(f"{API_URL}/chat", json=chat_payload)
+        response = requests.post(f"{API_URL}/chat/stream", json=chat_payload, stream=True)
+        if response.ok:
+            for event, data in read_sse(response):
+                if event == "sources":
+                    st.session_state.conversation_id = data["conversation_id"]
+                elif event == "token":
+                    reply += data["text"]
+                    placeholder.markdown(f"🤖 **Bot:** {reply}▌")
+                elif event == "error":
+                    error = data["detail"]
+                    break
+        else:
+            error = response.text
 
-    if response.ok:
-        reply = response.json()["response"]
+    if error is None:
         st.session_state.chat_history.append({"role": "bot", "content": reply})
         st.rerun()
     else:
-        st.error(f"API Error: {response.text}")
+        # The API dropped the question from the conversation too, so it can simply be asked again
+        placeholder.empty()
+        st.session_state.chat_history.pop()
+        st.error(f"API Error: {error}")
 